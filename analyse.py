@@ -0,0 +1,1852 @@
+import os
+import re
+import sys
+import csv
+import json
+import time
+import hashlib
+import zipfile
+import sqlite3
+import multiprocessing
+import tempfile
+import threading
+import importlib
+import cProfile
+import marshal
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from collections import OrderedDict, deque
+from functools import cached_property
+from io import BytesIO, TextIOWrapper
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+# Verwerking van kwalificatiedossiers zonder Streamlit: extractie, parser, koppelen, exports, cache, index en corpusmodel.
+# Alles wat naar een worker-proces gaat staat hier en niet in app.py: Streamlit voert app.py bij elke interactie opnieuw
+# uit als een nieuwe __main__-module, waarna functies en klassen uit een eerdere run niet meer te picklen zijn.
+
+
+# scikit-learn, pdfplumber en openpyxl worden pas geïmporteerd in de stap die ze nodig heeft, zodat het starten
+# van de server of een batch-worker niet op die imports wacht; opwarmen() laadt ze vooraf in de achtergrond
+ZWARE_MODULES = ("pdfplumber", "pdfminer.pdftypes", "pdfminer.psparser", "openpyxl", "sklearn.feature_extraction.text", "sklearn.preprocessing")
+
+# Onder dit aantal pagina's wordt serieel geëxtraheerd (een procespool opstarten kost dan meer dan het oplevert)
+PARALLEL_MIN_PAGINAS = 40
+# Aantal workers voor parallelle extractie (None = aantal CPU-kernen)
+PARALLEL_WORKERS = None
+
+# Regex voor een kerntaakcode in een bladwijzer (bijv. "B1-K1: Bereidt het werk voor")
+KERNTAAK_TITEL_PATTERN = re.compile(r"\b[BP]\d+-K\d+\b")
+# Bladwijzers van secties waarvan de eerste pagina altijd gelezen wordt (de parser gebruikt de sectiekop)
+SECTIE_TITELS = ("Basisdeel", "Profieldeel")
+
+# Functie om een PDF-bron om te zetten naar iets dat naar een worker-proces gestuurd kan worden
+def _pdf_bron(pdf_file):
+    # Paden kunnen direct doorgegeven worden, bestandsobjecten (zoals een Streamlit-upload) als bytes
+    if isinstance(pdf_file, (str, os.PathLike)):
+        return pdf_file
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+# Functie om de tekst van een pagina te extraheren en daarna direct de layoutcache van de pagina vrij te geven;
+# anders houdt pdfplumber de objecten van elke gelezen pagina vast tot de PDF gesloten wordt (Page.close() vanaf pdfplumber 0.10.4)
+def _pagina_tekst(page):
+    try:
+        return page.extract_text()
+    finally:
+        page.close()
+
+# Functie om de tekst van een lijst pagina's te extraheren (draait in een worker-proces)
+def _extract_paginas(bron, paginas):
+    import pdfplumber
+    with pdfplumber.open(BytesIO(bron) if isinstance(bron, bytes) else bron) as pdf:
+        return [_pagina_tekst(pdf.pages[i]) for i in paginas]
+
+# PDF-bron van de parallelle extractie, per worker-proces één keer gezet door de initializer van de pool, zodat niet
+# elk blok pagina's de hele PDF opnieuw naar de worker stuurt
+_EXTRACTIE_BRON = None
+
+def _init_extractieworker(bron):
+    global _EXTRACTIE_BRON
+    _EXTRACTIE_BRON = bron
+
+# Functie om de tekst van een blok pagina's uit de bron van deze worker te extraheren (draait in een worker-proces)
+def _extract_blok(paginas):
+    return _extract_paginas(_EXTRACTIE_BRON, paginas)
+
+# Functie om de paginanummer (0-based) van een bladwijzer te bepalen; None als de bestemming niet te herleiden is
+def _bladwijzer_pagina(pdf, pagina_ids, bestemming, actie):
+    from pdfminer.pdftypes import PDFObjRef, resolve1
+    from pdfminer.psparser import PSLiteral
+    if bestemming is None and actie is not None:
+        actie = resolve1(actie)
+        if isinstance(actie, dict):
+            bestemming = actie.get("D")
+    bestemming = resolve1(bestemming)
+    if isinstance(bestemming, (bytes, str, PSLiteral)):
+        # Benoemde bestemming
+        naam = bestemming.name if isinstance(bestemming, PSLiteral) else bestemming
+        bestemming = resolve1(pdf.doc.get_dest(naam))
+    if isinstance(bestemming, dict):
+        bestemming = resolve1(bestemming.get("D"))
+    if isinstance(bestemming, list) and bestemming and isinstance(bestemming[0], PDFObjRef):
+        return pagina_ids.get(bestemming[0].objid)
+    return None
+
+# Functie om via de bladwijzers (inhoudsopgave) van de PDF te bepalen welke pagina's bij de kerntaken en
+# werkprocessen horen. Geeft None terug als er geen bruikbare bladwijzers zijn; dan worden alle pagina's gelezen.
+def kerntaak_paginas(pdf):
+    try:
+        pagina_ids = {page.page_obj.pageid: idx for idx, page in enumerate(pdf.pages)}
+        bladwijzers = []
+        for niveau, titel, bestemming, actie, _ in pdf.doc.get_outlines():
+            pagina = _bladwijzer_pagina(pdf, pagina_ids, bestemming, actie)
+            if pagina is not None:
+                bladwijzers.append((niveau, (titel or "").strip(), pagina))
+    except Exception:
+        return None  # Geen of onleesbare bladwijzers
+
+    geselecteerd = set()
+    heeft_kerntaken = False
+    for positie, (niveau, titel, pagina) in enumerate(bladwijzers):
+        if titel.startswith(SECTIE_TITELS):
+            geselecteerd.add(pagina)
+        elif KERNTAAK_TITEL_PATTERN.search(titel):
+            heeft_kerntaken = True
+            # Tot en met de pagina waarop de volgende bladwijzer van hetzelfde of een hoger niveau begint
+            eind = next((p for n, _, p in bladwijzers[positie + 1:] if n <= niveau), len(pdf.pages) - 1)
+            geselecteerd.update(range(pagina, max(pagina, eind) + 1))
+    return sorted(geselecteerd) if heeft_kerntaken else None
+
+# Functie om (paginanummer, tekst)-paren op te vullen tot één tekst per pagina, met None voor overgeslagen pagina's.
+# Meldt na elke pagina de voortgang als voortgang(pagina's klaar, totaal).
+def _vul_overgeslagen(paren, aantal_paginas, voortgang=None):
+    volgende = 0
+    for idx, tekst in paren:
+        while volgende <= idx:
+            volgende += 1
+            if voortgang is not None:
+                voortgang(volgende, aantal_paginas)
+            yield tekst if volgende > idx else None
+    while volgende < aantal_paginas:
+        volgende += 1
+        if voortgang is not None:
+            voortgang(volgende, aantal_paginas)
+        yield None
+
+# Functie om de startmethode voor een procespool te kiezen. Een fork van een proces met meerdere threads (zoals de
+# Streamlit-server) kan het kindproces laten vastlopen op een lock die een andere thread op dat moment vasthield, bijv.
+# de importlock; start de workers dan via een forkserver die deze module al geladen heeft.
+def procespool_context():
+    if threading.active_count() > 1 and "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context()
+
+# Functie om een lijst in aaneengesloten blokken te verdelen; een paar blokken per worker voor een gelijkmatige verdeling
+def _verdeel_in_blokken(items, workers):
+    aantal_blokken = min(len(items), workers * 4)
+    grenzen = [len(items) * i // aantal_blokken for i in range(aantal_blokken + 1)]
+    return [items[grenzen[i]:grenzen[i + 1]] for i in range(aantal_blokken)]
+
+# Functie die de (paginanummer, tekst)-paren van de gekozen pagina's parallel over meerdere processen oplevert
+def _iter_parallel(bron, paginas, workers):
+    blokken = _verdeel_in_blokken(paginas, workers)
+    klaar = 0
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=procespool_context(), initializer=_init_extractieworker, initargs=(bron,)
+        ) as executor:
+            # Houd maar een beperkt aantal blokken tegelijk in behandeling zodat het geheugen begrensd blijft
+            wachtrij = deque()
+            volgend_blok = 0
+            while volgend_blok < len(blokken) and len(wachtrij) < workers * 2:
+                wachtrij.append(executor.submit(_extract_blok, blokken[volgend_blok]))
+                volgend_blok += 1
+            while wachtrij:
+                # Lever de paginateksten op in de oorspronkelijke volgorde
+                teksten = wachtrij.popleft().result()
+                if volgend_blok < len(blokken):
+                    wachtrij.append(executor.submit(_extract_blok, blokken[volgend_blok]))
+                    volgend_blok += 1
+                for tekst in teksten:
+                    yield paginas[klaar], tekst
+                    klaar += 1
+    except (BrokenProcessPool, OSError):
+        # Geen procespool beschikbaar (bijv. beperkte omgeving), ga serieel verder vanaf de eerste ontbrekende pagina
+        yield from zip(paginas[klaar:], _extract_paginas(bron, paginas[klaar:]))
+
+# Functie die de tekst van alle pagina's in volgorde oplevert, parallel over meerdere processen bij grote PDF's.
+# Met paginafilter worden alleen de kerntaakhoofdstukken gelezen (volgens de bladwijzers); overgeslagen pagina's
+# leveren None op, zodat de positie het paginanummer blijft.
+def iter_page_texts(pdf_file, workers=None, min_paginas=None, paginafilter=False, voortgang=None):
+    if workers is None:
+        workers = PARALLEL_WORKERS or os.cpu_count() or 1
+    if min_paginas is None:
+        min_paginas = PARALLEL_MIN_PAGINAS
+    bron = _pdf_bron(pdf_file)
+
+    import pdfplumber
+    with pdfplumber.open(BytesIO(bron) if isinstance(bron, bytes) else bron) as pdf:
+        aantal_paginas = len(pdf.pages)
+        paginas = (kerntaak_paginas(pdf) if paginafilter else None) or list(range(aantal_paginas))
+        if workers <= 1 or len(paginas) < min_paginas:
+            yield from _vul_overgeslagen(((idx, _pagina_tekst(pdf.pages[idx])) for idx in paginas), aantal_paginas, voortgang)
+            return
+
+    yield from _vul_overgeslagen(_iter_parallel(bron, paginas, workers), aantal_paginas, voortgang)
+
+# Regex om ongewenste tekst (zoals "7 van 18" of "P2-K1 Organiseert...") te verwijderen
+CLEANUP_PATTERN = re.compile(r"\d+ van \d+|(?:B|P)\d+-K\d+(?:-W\d+)?(?:[^\n]*Organiseert[^\n]*)?$")
+TARGET_WORDS = ["heeft", "kan", "kent", "weet", "past", "bezit"]  # Aangepast om "bezit" toe te voegen
+# Indicatoren om het einde van een "Vakkennis en vaardigheden"-blok te detecteren
+END_BLOCK_INDICATORS = [
+    "Complexiteit", "Verantwoordelijkheid en zelfstandigheid", "Omschrijving",
+    "Profieldeel", "Mbo-niveau", "Typering van het beroep", "Beroepsvereisten",
+    "Generieke onderdelen", "Inhoudsopgave", "Leeswijzer", "Overzicht van het kwalificatiedossier",
+    "Basisdeel", "Resultaat", "Gedrag"
+]
+# Indicatoren om het einde van een werkprocesbeschrijving te detecteren
+WERKPROCES_END_INDICATORS = [
+    "Complexiteit", "Verantwoordelijkheid en zelfstandigheid", "Omschrijving",
+    "Profieldeel", "Mbo-niveau", "Typering van het beroep", "Beroepsvereisten",
+    "Generieke onderdelen", "Inhoudsopgave", "Leeswijzer", "Overzicht van het kwalificatiedossier",
+    "Basisdeel", "Resultaat", "Gedrag", "Vakkennis en vaardigheden",
+    "Voor Metselaar geldt aanvullend:"
+]
+AANVULLEND_INDICATOR = "Voor Metselaar geldt aanvullend:"
+# Maximaal aantal regels dat in de debug-log bewaard blijft (de oudste vallen eruit)
+DEBUG_LOG_MAX = 5000
+
+# Bits voor de indicatoren die in een regel kunnen voorkomen
+_BASISDEEL, _PROFIELDEEL, _VAKKENNIS_START, _AANVULLEND, _EINDE_BLOK, _EINDE_WERKPROCES = (1 << i for i in range(6))
+
+# Herkent alle indicatoren en kerntaak- en werkproces-ID's van een regel in één doorgang met één voorgecompileerde
+# regex, en bepaalt daaruit het regeltype waarop de toestandsmachine schakelt. De indicatorlijsten en
+# startwoorden zijn per dossiertype in te stellen; de regex wordt één keer per classifier gebouwd.
+class RegelClassifier:
+    def __init__(self, end_block_indicators=END_BLOCK_INDICATORS, werkproces_end_indicators=WERKPROCES_END_INDICATORS,
+                 target_words=TARGET_WORDS, aanvullend_indicator=AANVULLEND_INDICATOR):
+        bits = {}
+        for indicator, bit in [("Basisdeel", _BASISDEEL), ("Profieldeel", _PROFIELDEEL),
+                               ("Vakkennis en vaardigheden", _VAKKENNIS_START), (aanvullend_indicator, _AANVULLEND)]:
+            bits[indicator] = bits.get(indicator, 0) | bit
+        for indicator in end_block_indicators:
+            bits[indicator] = bits.get(indicator, 0) | _EINDE_BLOK
+        for indicator in werkproces_end_indicators:
+            bits[indicator] = bits.get(indicator, 0) | _EINDE_WERKPROCES
+        if any(re.search(r"[BP]\d", indicator) for indicator in bits):
+            raise ValueError("Indicatoren mogen geen kerntaak- of werkprocescode bevatten")
+
+        # Een gevonden indicator betekent dat ook alle kortere indicatoren die erin voorkomen in de regel staan
+        self._bits = {}
+        for x in bits:
+            self._bits[x] = 0
+            for y in bits:
+                if y in x:
+                    self._bits[x] |= bits[y]
+        alternatieven = "|".join(re.escape(indicator) for indicator in sorted(bits, key=len, reverse=True))
+        patroon = rf"(?P<ind>{alternatieven})|(?P<wp>[BP]\d+-K\d+-W\d+):|(?P<kt>[BP]\d+-K\d+):"
+        if _overlappen(bits):
+            # Indicatoren kunnen elkaar gedeeltelijk overlappen; zoek dan op elke positie (lookahead)
+            patroon = f"(?=(?:{patroon}))"
+        self._pattern = re.compile(patroon)
+        # Snelle voorfilter: de meeste regels bevatten geen enkel teken waarmee een indicator of ID kan beginnen
+        self._eerste_tekens = re.compile("[" + "".join(re.escape(teken) for teken in sorted({indicator[0] for indicator in bits} | {"B", "P"})) + "]")
+        # Een uitspraak begint met een van de startwoorden gevolgd door een spatie
+        self.startwoord_pattern = re.compile("(?:" + "|".join(re.escape(word) for word in target_words) + ") ")
+
+    # Geef de bits van de gevonden indicatoren en de eerste kerntaak- en werkproces-ID in de regel terug
+    def scan(self, line):
+        vlaggen = 0
+        kerntaak = werkproces = None
+        kandidaat = self._eerste_tekens.search(line)
+        if kandidaat:
+            for indicator, wp, kt in self._pattern.findall(line, kandidaat.start()):
+                if indicator:
+                    vlaggen |= self._bits[indicator]
+                elif kt:
+                    kerntaak = kerntaak or kt
+                else:
+                    werkproces = werkproces or wp
+        return vlaggen, kerntaak, werkproces
+
+    # Bepaal het regeltype (met de bijbehorende ID) in dezelfde volgorde als de toestandsmachine de regel toetst
+    def regel_type(self, line, heeft_kerntaak, in_werkproces_block):
+        vlaggen, kerntaak, werkproces = self.scan(line)
+        if not (vlaggen or kerntaak or werkproces):
+            return "tekst", None
+        if vlaggen & _BASISDEEL:
+            return "sectie", "Basisdeel"
+        if vlaggen & _PROFIELDEEL:
+            return "sectie", "Profieldeel"
+        if kerntaak:
+            return "kerntaak", kerntaak
+        if vlaggen & _VAKKENNIS_START:
+            return "vakkennis_start", None
+        if werkproces and heeft_kerntaak:
+            return "werkproces", werkproces
+        if vlaggen & _AANVULLEND and heeft_kerntaak:
+            return "aanvullend", None
+        if vlaggen & _EINDE_BLOK:
+            return "einde_blok", None
+        if vlaggen & _EINDE_WERKPROCES and in_werkproces_block:
+            return "einde_werkproces", None
+        return "tekst", None
+
+# Functie om te bepalen of een indicator kan beginnen binnen een andere (het einde van de ene is het begin van de andere)
+def _overlappen(indicatoren):
+    for x in indicatoren:
+        for y in indicatoren:
+            if x != y and any(x.endswith(y[:k]) for k in range(1, min(len(x), len(y)))):
+                return True
+    return False
+
+STANDAARD_CLASSIFIER = RegelClassifier()
+
+# Toestandsmachine die regel voor regel een kwalificatiedossier verwerkt.
+# feed() geeft per regel de gebeurtenissen terug die de regel oplevert:
+# ("kerntaak", kerntaak, sectie), ("werkproces", kerntaak, werkproces),
+# ("uitspraak", kerntaak, uitspraak) en ("beschrijving", werkproces, beschrijving).
+class DossierParser:
+    def __init__(self, classifier=None):
+        self.classifier = classifier or STANDAARD_CLASSIFIER
+        self.vakkennis_dict = {}  # Voor kennis/vaardigheden per kerntaak
+        self.werkprocessen_dict = {}  # Voor werkprocessen per kerntaak
+        self.werkprocessen_beschrijvingen = {}  # Voor beschrijvingen van werkprocessen
+        self.debug_log = deque(maxlen=DEBUG_LOG_MAX)  # Voor extra debugging-informatie
+        self.aantal_paginas = 0
+        self.aantal_regels = 0
+        self.current_kerntaak = None
+        self.in_vakkennis_block = False
+        self.in_werkproces_block = False
+        self.aanvullend_block = False
+        self.current_uitspraak = ""  # Voor uitspraken die over meerdere regels lopen
+        self.current_werkproces = None  # Huidig werkproces
+        self.current_werkproces_beschrijving = ""  # Beschrijving van het huidige werkproces
+        self.current_section = None  # Houd bij of we in "Basisdeel" of "Profieldeel" zitten
+        # Meest recente kerntaak per sectie (vervangt het terugzoeken in de volledige kerntaakgeschiedenis)
+        self.laatste_kerntaak_per_sectie = {}
+        self._uitspraken_gezien = {}  # Per kerntaak de set van al toegevoegde uitspraken
+        self._events = []
+
+    # Sla de huidige uitspraak op (indien het een geldige uitspraak is)
+    def _bewaar_uitspraak(self, melding="Uitspraak toegevoegd aan"):
+        if self.classifier.startwoord_pattern.match(self.current_uitspraak):
+            cleaned_uitspraak = CLEANUP_PATTERN.sub("", self.current_uitspraak).strip()
+            gezien = self._uitspraken_gezien.setdefault(self.current_kerntaak, set())
+            if cleaned_uitspraak not in gezien:
+                gezien.add(cleaned_uitspraak)
+                self.vakkennis_dict[self.current_kerntaak].append(cleaned_uitspraak)
+                self.debug_log.append(f"{melding} {self.current_kerntaak}: {cleaned_uitspraak}")
+                self._events.append(("uitspraak", self.current_kerntaak, cleaned_uitspraak))
+
+    # Sla de huidige werkprocesbeschrijving op (indien aanwezig)
+    def _bewaar_beschrijving(self, melding="Werkprocesbeschrijving toegevoegd aan"):
+        if self.current_werkproces and self.current_werkproces_beschrijving:
+            beschrijving = self.current_werkproces_beschrijving.strip()
+            self.debug_log.append(f"{melding} {self.current_werkproces}: {self.current_werkproces_beschrijving}")
+            if not beschrijving:
+                self.debug_log.append(f"Waarschuwing: Geen beschrijving gevonden voor {self.current_werkproces}, gebruik titel als fallback")
+                beschrijving = self.current_werkproces
+            self.werkprocessen_beschrijvingen[self.current_werkproces] = beschrijving
+            self._events.append(("beschrijving", self.current_werkproces, beschrijving))
+
+    # Verwerk alle regels van één pagina
+    def feed_page(self, page_text):
+        self.aantal_paginas += 1
+        events = []
+        for line in page_text.split("\n"):
+            events.extend(self.feed(line))
+        return events
+
+    # Verwerk één regel en geef de gebeurtenissen terug die deze regel opleverde
+    def feed(self, line):
+        self._events = []
+        self.aantal_regels += 1
+        self._verwerk_regel(line.strip())
+        return self._events
+
+    def _verwerk_regel(self, line):
+        self.debug_log.append(f"Verwerk regel: {line}")
+        regel_type, code = self.classifier.regel_type(line, bool(self.current_kerntaak), self.in_werkproces_block)
+
+        # Detecteer secties (Basisdeel of Profieldeel)
+        if regel_type == "sectie":
+            self.current_section = code
+            self.debug_log.append(f"Sectie gedetecteerd: {code}")
+            return
+
+        # Detecteer kerntaak
+        if regel_type == "kerntaak":
+            # Sla de huidige uitspraak en werkprocesbeschrijving op (indien aanwezig)
+            if self.current_uitspraak and self.current_kerntaak and self.in_vakkennis_block:
+                self._bewaar_uitspraak()
+            self._bewaar_beschrijving()
+            self.current_uitspraak = ""
+            self.current_werkproces = None
+            self.current_werkproces_beschrijving = ""
+            self.current_kerntaak = code
+            self.laatste_kerntaak_per_sectie[self.current_section] = self.current_kerntaak
+            if self.current_kerntaak not in self.vakkennis_dict:
+                self.vakkennis_dict[self.current_kerntaak] = []
+            if self.current_kerntaak not in self.werkprocessen_dict:
+                self.werkprocessen_dict[self.current_kerntaak] = []
+            self.debug_log.append(f"Nieuwe kerntaak gedetecteerd: {self.current_kerntaak} (sectie: {self.current_section})")
+            self._events.append(("kerntaak", self.current_kerntaak, self.current_section))
+            self.in_vakkennis_block = False
+            self.in_werkproces_block = False
+            self.aanvullend_block = False
+            return
+
+        # Detecteer start van "Vakkennis en vaardigheden"
+        if regel_type == "vakkennis_start":
+            # Gebruik de meest recente kerntaak uit dezelfde sectie
+            relevant_kerntaak = self.laatste_kerntaak_per_sectie.get(self.current_section)
+            if relevant_kerntaak:
+                self.current_kerntaak = relevant_kerntaak
+                self.in_vakkennis_block = True
+                self.in_werkproces_block = False
+                self.debug_log.append(f"Vakkennis en vaardigheden-blok gestart voor {self.current_kerntaak} (sectie: {self.current_section})")
+            else:
+                self.debug_log.append("Vakkennis en vaardigheden-blok gedetecteerd, maar geen relevante kerntaak gevonden")
+            return
+
+        # Detecteer werkproces
+        if regel_type == "werkproces":
+            # Sla de huidige werkprocesbeschrijving op (indien aanwezig)
+            self._bewaar_beschrijving()
+            self.current_werkproces_beschrijving = ""
+            self.current_werkproces = code
+            if self.current_kerntaak not in self.werkprocessen_dict:
+                self.werkprocessen_dict[self.current_kerntaak] = []
+            if self.current_werkproces not in self.werkprocessen_dict[self.current_kerntaak]:
+                self.werkprocessen_dict[self.current_kerntaak].append(self.current_werkproces)
+                self._events.append(("werkproces", self.current_kerntaak, self.current_werkproces))
+            self.in_werkproces_block = True
+            self.in_vakkennis_block = False
+            self.debug_log.append(f"Werkproces gedetecteerd: {self.current_werkproces} onder {self.current_kerntaak}")
+            # Voeg de huidige regel (minus de ID) toe aan de beschrijving
+            werkproces_title = line.replace(self.current_werkproces + ":", "").strip()
+            if werkproces_title:
+                self.current_werkproces_beschrijving += werkproces_title + " "
+            return
+
+        # Detecteer aanvullend blok
+        if regel_type == "aanvullend":
+            self.aanvullend_block = True
+            self.debug_log.append("Aanvullend blok voor Metselaar gestart")
+            return
+
+        # Detecteer einde van "Vakkennis en vaardigheden"-blok
+        if regel_type == "einde_blok":
+            if self.current_uitspraak and self.current_kerntaak and self.in_vakkennis_block:
+                self._bewaar_uitspraak()
+            self.current_uitspraak = ""
+            self.in_vakkennis_block = False
+            self.aanvullend_block = False
+            self.debug_log.append(f"Vakkennis en vaardigheden-blok beëindigd door indicator: {line}")
+            return
+
+        # Detecteer einde van werkprocesbeschrijving
+        if regel_type == "einde_werkproces":
+            self._bewaar_beschrijving()
+            self.current_werkproces_beschrijving = ""
+            self.in_werkproces_block = False
+            return
+
+        # Verwerk werkprocesbeschrijving
+        if self.in_werkproces_block and self.current_werkproces:
+            if line and not line.isspace():  # Alleen niet-lege regels toevoegen
+                self.current_werkproces_beschrijving += " " + line
+
+        # Verwerk kennis/vaardigheden
+        if self.in_vakkennis_block and self.current_kerntaak:
+            cleaned_line = line.lstrip("-§ ").strip()
+            if not cleaned_line:  # Lege regel, sla op en reset
+                if self.current_uitspraak:
+                    self._bewaar_uitspraak()
+                    self.current_uitspraak = ""
+                return
+
+            # Controleer of de regel begint met een target-woord
+            if self.classifier.startwoord_pattern.match(cleaned_line):
+                # Sla de vorige uitspraak op (indien aanwezig)
+                if self.current_uitspraak:
+                    self._bewaar_uitspraak()
+                self.current_uitspraak = cleaned_line
+            else:
+                # Voeg toe aan de huidige uitspraak (voor meerregelige uitspraken)
+                if self.current_uitspraak:
+                    self.current_uitspraak += " " + cleaned_line
+
+    # Rond de verwerking af: sla de laatste uitspraak en werkprocesbeschrijving op
+    def close(self):
+        # Laatste lege regel, zoals die na de laatste pagina in de samengevoegde tekst stond
+        events = self.feed("")
+        self._events = []
+        if self.current_uitspraak and self.current_kerntaak and self.in_vakkennis_block:
+            self._bewaar_uitspraak("Laatste uitspraak toegevoegd aan")
+        self._bewaar_beschrijving("Laatste werkprocesbeschrijving toegevoegd aan")
+        return events + self._events
+
+# Bestand waarin per run een JSON-record met de prestaties (inclusief bestandsnamen) wordt geschreven; alleen als het
+# ingesteld is, standaard wordt er niets weggeschreven
+PRESTATIES_LOG = os.environ.get("KRUISTABEL_PRESTATIES_LOG", "")
+
+# Meet per verwerkingsstap de wandkloktijd en CPU-tijd, plus tellers zoals pagina's en regels.
+# Met geheugen=True wordt ook de Python-geheugenpiek per stap gemeten via tracemalloc (trager); de app zet dit aan
+# als de prestaties getoond of een profiel opgenomen wordt.
+class Prestaties:
+    def __init__(self, geheugen=False):
+        self.stappen = []
+        self.geheugen = geheugen
+        self._tracemalloc_gestart = geheugen and not tracemalloc.is_tracing()
+        if self._tracemalloc_gestart:
+            tracemalloc.start()
+
+    # Stop tracemalloc als deze meting het gestart heeft
+    def stop(self):
+        if self._tracemalloc_gestart:
+            tracemalloc.stop()
+            self._tracemalloc_gestart = False
+
+    # Meet een aaneengesloten stap; de meegegeven dict met tellers kan binnen het blok bijgewerkt worden
+    @contextmanager
+    def stap(self, naam, **tellers):
+        self.reset_piek()
+        start_wand, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield tellers
+        finally:
+            self.voeg_toe(naam, time.perf_counter() - start_wand, time.process_time() - start_cpu, **tellers)
+
+    def reset_piek(self):
+        if self.geheugen and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    # Voeg een stap toe waarvan de tijden elders opgeteld zijn (bijv. stappen die door elkaar heen lopen)
+    def voeg_toe(self, naam, wandtijd, cputijd, **tellers):
+        record = {
+            "stap": naam,
+            "wandtijd_s": round(wandtijd, 4),
+            "cputijd_s": round(cputijd, 4),
+            "piek_geheugen_mb": round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1) if self.geheugen and tracemalloc.is_tracing() else None,
+        }
+        record.update(tellers)
+        self.stappen.append(record)
+
+    def als_record(self, **context):
+        return {"tijdstip": datetime.now().isoformat(timespec="seconds"), **context, "stappen": self.stappen}
+
+    # Schrijf de metingen als één JSON-regel weg
+    def schrijf(self, pad=None, **context):
+        pad = PRESTATIES_LOG if pad is None else pad
+        if not pad:
+            return
+        try:
+            with open(pad, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.als_record(**context), ensure_ascii=False) + "\n")
+        except OSError:
+            pass  # Metingen mogen de verwerking nooit laten mislukken
+
+# Functie om een functie-aanroep te profileren; gebruikt pyinstrument als dat geïnstalleerd is, anders cProfile.
+# Geeft het resultaat terug plus de profieldata als bytes, een bestandsnaam en het MIME-type voor een download.
+def profileer(functie, *args, **kwargs):
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            resultaat = functie(*args, **kwargs)
+        finally:
+            profiler.stop()
+        return resultaat, profiler.output_html().encode("utf-8"), "profiel.html", "text/html"
+    profiler = cProfile.Profile()
+    resultaat = profiler.runcall(functie, *args, **kwargs)
+    profiler.create_stats()
+    # Zelfde formaat als Profile.dump_stats, te openen met pstats of snakeviz
+    return resultaat, marshal.dumps(profiler.stats), "profiel.prof", "application/octet-stream"
+
+# Markering voor het einde van de paginastroom
+_EINDE = object()
+
+# Functie die een dossier als stroom van gebeurtenissen verwerkt, zodat de eerste resultaten
+# bruikbaar zijn voordat de laatste pagina gelezen is. Geeft ook ("pagina", nummer, tekst) per pagina met tekst.
+# PDF-extractie en regelverwerking lopen door elkaar; met prestaties worden hun tijden apart opgeteld.
+def iter_dossier_events(pdf_file, workers=None, parser=None, prestaties=None, paginafilter=False, voortgang=None):
+    if parser is None:
+        parser = DossierParser()
+    pages = iter_page_texts(pdf_file, workers=workers, paginafilter=paginafilter, voortgang=voortgang)
+    extractie_wand = extractie_cpu = parser_wand = parser_cpu = 0.0
+    overgeslagen = 0
+    if prestaties is not None:
+        prestaties.reset_piek()
+    while True:
+        start_wand, start_cpu = time.perf_counter(), time.process_time()
+        page_text = next(pages, _EINDE)
+        midden_wand, midden_cpu = time.perf_counter(), time.process_time()
+        extractie_wand += midden_wand - start_wand
+        extractie_cpu += midden_cpu - start_cpu
+        if page_text is _EINDE:
+            break
+        if page_text is None:
+            overgeslagen += 1  # Buiten de kerntaakhoofdstukken (paginafilter)
+        elif page_text:
+            events = parser.feed_page(page_text)
+            parser_wand += time.perf_counter() - midden_wand
+            parser_cpu += time.process_time() - midden_cpu
+            yield ("pagina", parser.aantal_paginas, page_text)
+            yield from events
+    events = parser.close()
+    if prestaties is not None:
+        # De CPU-tijd van worker-processen telt bij parallelle extractie niet mee
+        prestaties.voeg_toe("pdf_extractie", extractie_wand, extractie_cpu, paginas=parser.aantal_paginas, overgeslagen=overgeslagen)
+        prestaties.voeg_toe("regelparser", parser_wand, parser_cpu, regels=parser.aantal_regels,
+                            uitspraken=sum(len(uitspraken) for uitspraken in parser.vakkennis_dict.values()))
+    yield from events
+
+# Functie om een melding zonder interface op stderr te tonen (niveau is "warning" of "error")
+def stderr_melding(niveau, tekst):
+    print(f"{niveau}: {tekst}", file=sys.stderr)
+
+# Functie om "Vakkennis en vaardigheden" en werkprocessen te extraheren.
+# Meldingen gaan via melding(niveau, tekst); standaard naar stderr, de app geeft st_melding mee.
+def extract_vakkennis_en_werkprocessen(pdf_file, workers=None, parser=None, bewaar_ruwe_tekst=True, melding=stderr_melding, prestaties=None, paginafilter=False, voortgang=None):
+    if parser is None:
+        parser = DossierParser()
+    raw_text = []  # Voor debugging
+    heeft_tekst = False
+
+    try:
+        for event in iter_dossier_events(pdf_file, workers=workers, parser=parser, prestaties=prestaties, paginafilter=paginafilter, voortgang=voortgang):
+            if event[0] == "pagina":
+                heeft_tekst = heeft_tekst or not event[2].isspace()
+                if bewaar_ruwe_tekst:
+                    raw_text.append(event[2])
+
+        if not heeft_tekst:
+            melding("warning", "Geen tekst gevonden in de PDF. Is het bestand leeg of gescand?")
+            return {}, {}, {}, raw_text, list(parser.debug_log)
+
+    except Exception as e:
+        melding("error", f"Fout bij het verwerken van de PDF: {e}")
+        return {}, {}, {}, raw_text, list(parser.debug_log)
+
+    return parser.vakkennis_dict, parser.werkprocessen_dict, parser.werkprocessen_beschrijvingen, raw_text, list(parser.debug_log)
+
+# Melding van scikit-learn wanneer er na het filteren van stopwoorden geen woorden overblijven
+LEGE_VOCABULAIRE_MELDING = "empty vocabulary; perhaps the documents only contain stop words"
+
+# Functie om de TF-IDF cosine-similarity van alle uitspraken met alle werkprocessen van een kerntaak te berekenen.
+# De scores zijn gelijk aan die van een TfidfVectorizer die per uitspraak opnieuw gefit wordt op
+# [uitspraak] + werkprocesbeschrijvingen: de (smooth) IDF van een term hangt dan alleen af van het aantal
+# werkprocessen met die term en van de vraag of de uitspraak de term bevat. Beide varianten worden hier
+# vooraf berekend, zodat alle scores uit een paar sparse matrixproducten volgen.
+def batch_similarities(uitspraak_counts, werkproces_counts):
+    n_docs = 1 + werkproces_counts.shape[0]
+    df_werkprocessen = np.asarray((werkproces_counts > 0).sum(axis=0)).ravel()
+    idf_zonder = np.log((1 + n_docs) / (1 + df_werkprocessen)) + 1  # Term komt niet in de uitspraak voor
+    idf_met = np.log((1 + n_docs) / (2 + df_werkprocessen)) + 1  # Term komt ook in de uitspraak voor
+
+    werkproces_kwadraten = werkproces_counts.multiply(werkproces_counts).tocsr()
+    uitspraak_termen = (uitspraak_counts > 0).astype(np.float64)
+    # Inproduct: alleen termen die in de uitspraak voorkomen tellen mee, met idf_met in beide vectoren
+    inproduct = (uitspraak_counts @ sparse.diags(idf_met ** 2) @ werkproces_counts.T).toarray()
+    # Kwadratische norm van elk werkproces, gecorrigeerd voor de termen die de uitspraak met het werkproces deelt
+    norm_werkprocessen = werkproces_kwadraten @ (idf_zonder ** 2)
+    norm_werkprocessen = norm_werkprocessen[np.newaxis, :] + (uitspraak_termen @ sparse.diags(idf_met ** 2 - idf_zonder ** 2) @ werkproces_kwadraten.T).toarray()
+    norm_uitspraken = uitspraak_counts.multiply(uitspraak_counts).tocsr() @ (idf_met ** 2)
+
+    noemer = np.sqrt(norm_uitspraken[:, np.newaxis] * norm_werkprocessen)
+    return np.divide(inproduct, noemer, out=np.zeros_like(inproduct), where=noemer > 0)
+
+# Compacte kern van de kruistabel: uitspraken met integer-ID's, kolommen (kerntaken en daarna werkprocessen)
+# en een sparse booleaanse incidentiematrix. De weergave-, sorteer- en fallbacktabellen worden pas bij gebruik
+# afgeleid en daarna bewaard; UI en exports gebruiken deze ene structuur.
+class Kruistabel:
+    def __init__(self, uitspraken, kolommen, koppelingen, fallback_koppelingen=(), koppeling_details=()):
+        self.uitspraken = list(uitspraken)
+        self.uitspraak_ids = {uitspraak: idx for idx, uitspraak in enumerate(self.uitspraken)}
+        self.kolommen = list(kolommen)
+        self.kolom_ids = {kolom: idx for idx, kolom in enumerate(self.kolommen)}
+        self.matrix = self._incidentie(koppelingen)
+        self.fallback = self._incidentie(fallback_koppelingen)  # Koppelingen die via de fallback zijn gemaakt
+        self.koppeling_details = list(koppeling_details)  # Uitspraak-werkproceskoppelingen met methode en similarity
+
+    # Bouw een sparse booleaanse matrix uit (uitspraak_id, kolom_id)-paren
+    def _incidentie(self, paren):
+        paren = np.asarray(list(paren), dtype=np.int64).reshape(-1, 2)
+        return sparse.csr_matrix(
+            (np.ones(len(paren), dtype=bool), (paren[:, 0], paren[:, 1])),
+            shape=(len(self.uitspraken), len(self.kolommen)),
+            dtype=bool,
+        )
+
+    # Laat de afgeleide tabellen weg bij het opslaan (bijv. in de cache); ze worden bij gebruik opnieuw gemaakt
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in ("display_df", "fallback_masker")}
+
+    @property
+    def leeg(self):
+        return not self.uitspraken
+
+    def _als_dataframe(self, waarden, uitspraak_kolom, kolommen=None):
+        df = pd.DataFrame(waarden, columns=self.kolommen if kolommen is None else kolommen)
+        df.insert(0, "Uitspraak", uitspraak_kolom)
+        return df
+
+    @cached_property
+    def display_df(self):
+        return self._als_dataframe(np.where(self.matrix.toarray(), "×", "").astype(object), self.uitspraken)
+
+    # True in de werkproceskolom waar een uitspraak via de fallback gekoppeld is
+    @cached_property
+    def fallback_masker(self):
+        return self._als_dataframe(self.fallback.multiply(self.matrix).toarray().astype(bool), False)
+
+    # Weergave en fallback-masker van een deel van de tabel (lijsten met rij- en kolomnummers), bijv. één pagina
+    # van een grote samengevoegde tabel; alleen dat deel wordt dicht gemaakt
+    def deel(self, rijen, kolommen):
+        matrix = self.matrix[rijen][:, kolommen]
+        fallback = self.fallback[rijen][:, kolommen].multiply(matrix)
+        namen = [self.kolommen[kolom] for kolom in kolommen]
+        uitspraken = [self.uitspraken[rij] for rij in rijen]
+        display_df = self._als_dataframe(np.where(matrix.toarray(), "×", "").astype(object), uitspraken, namen)
+        return display_df, self._als_dataframe(fallback.toarray().astype(bool), False, namen)
+
+# Vaste stopwoorden voor de tekstanalyse; de werkproces-ID's van het dossier komen er per dossier bij
+STOPWOORDEN = {
+    "en", "de", "het", "een", "voor", "met", "in", "op", "aan", "van", "bij", "is", "zijn",
+    "hij", "zo", "nodig", "of", "werkplek", "allround", "metselaar", "voor", "n", "v", "t",
+    "volgens", "aanbrengen", "materialen", "middelen", "veiligheidsregels", "voorschriften",
+    "wettelijke", "richtlijnen", "gedrag", "resultaat", "omschrijving", "voor", "metselaar",
+    "geldt", "aanvullend", "de", "onderliggende", "competenties", "zijn", "toepassen"
+}
+
+# Functie om de stopwoorden voor een werkproces-ID te bepalen: met en zonder streepjes (bijv. "b1k1w1")
+def werkproces_stopwoorden(wp):
+    return {wp.lower(), wp.lower().replace("-", "")}
+
+# Functie om per kerntaak een vingerafdruk te bepalen van alles waar de koppelingen van afhangen: de uitspraken,
+# de werkprocessen met hun beschrijvingen, de stopwoorden (inclusief die van alle werkproces-ID's in het dossier),
+# de parserversie en het eventuele corpusmodel
+def blok_vingerafdrukken(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, model_versie=None):
+    stopwoorden = set(STOPWOORDEN)
+    for wp in set(wp for wps in werkprocessen_dict.values() for wp in wps):
+        stopwoorden.update(werkproces_stopwoorden(wp))
+    basis = [PARSER_VERSIE, model_versie, woorden_hash(stopwoorden)]
+    vingerafdrukken = {}
+    for kerntaak, uitspraken in vakkennis_dict.items():
+        werkprocessen = [[wp, werkprocessen_beschrijvingen.get(wp, wp)] for wp in werkprocessen_dict.get(kerntaak, [])]
+        inhoud = json.dumps(basis + [kerntaak, uitspraken, werkprocessen], ensure_ascii=False)
+        vingerafdrukken[kerntaak] = hashlib.sha256(inhoud.encode("utf-8")).hexdigest()[:16]
+    return vingerafdrukken
+
+# Functie om de kerntaakblokken te bepalen waarvan de opgeslagen koppelingen uit vorige ({vingerafdruk: koppeling_details})
+# hergebruikt kunnen worden; geeft {kerntaak: koppeling_details} terug
+def herbruikbare_blokken(vakkennis_dict, werkprocessen_dict, vingerafdrukken, vorige):
+    aantal_kerntaken = {}
+    for wps in werkprocessen_dict.values():
+        for wp in set(wps):
+            aantal_kerntaken[wp] = aantal_kerntaken.get(wp, 0) + 1
+    herbruikbaar = {}
+    for kerntaak, vingerafdruk in vingerafdrukken.items():
+        opgeslagen = vorige.get(vingerafdruk)
+        # Alleen volledig gekoppelde blokken; de vingerafdruk garandeert dezelfde uitspraken in dezelfde volgorde.
+        # Werkprocessen die ook bij een andere kerntaak horen delen de ronde-robin-teller, dus die blokken worden opnieuw gekoppeld.
+        if (
+            opgeslagen and len(opgeslagen) == len(vakkennis_dict[kerntaak]) and all(detail[2] is not None for detail in opgeslagen)
+            and all(aantal_kerntaken[wp] == 1 for wp in werkprocessen_dict.get(kerntaak, []))
+        ):
+            herbruikbaar[kerntaak] = opgeslagen
+    return herbruikbaar
+
+# Functie om de compacte kruistabel op te bouwen en uitspraken aan werkprocessen te koppelen.
+# Met een corpusmodel worden vocabulaire en IDF niet per dossier gefit maar uit het model gehaald (alleen transform).
+# Met vorige ({vingerafdruk: koppeling_details}, bijv. van een eerdere versie van het dossier) worden de koppelingen
+# van ongewijzigde kerntaakblokken hergebruikt en wordt alleen voor gewijzigde blokken opnieuw gekoppeld.
+# extra_stopwoorden zijn de werkproces-stopwoorden van de rest van het dossier als maar een deel wordt gekoppeld.
+def bouw_kruistabel(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, model=None, vorige=None, extra_stopwoorden=()):
+    if not vakkennis_dict:
+        return None, ["Geen vakkennis_dict beschikbaar"], {}
+
+    # Verzamel alle kerntaken en werkprocessen
+    kerntaken = list(vakkennis_dict.keys())
+    alle_werkprocessen = []
+    for kerntaak in werkprocessen_dict:
+        alle_werkprocessen.extend(werkprocessen_dict[kerntaak])
+    alle_werkprocessen = sorted(list(set(alle_werkprocessen)))  # Unieke werkprocessen, gesorteerd
+
+    # Verzamel alle unieke uitspraken en sorteer ze alfabetisch; de positie is het ID van de uitspraak
+    uitspraken = sorted(set(uitspraak for kerntaak in vakkennis_dict for uitspraak in vakkennis_dict[kerntaak]))
+    uitspraak_rijen = {uitspraak: idx for idx, uitspraak in enumerate(uitspraken)}
+
+    # Kolommen: eerst de kerntaken, dan de werkprocessen
+    kolom_ids = {kolom: idx for idx, kolom in enumerate(kerntaken + alle_werkprocessen)}
+    koppelingen = []  # (uitspraak_id, kolom_id)-paren voor de incidentiematrix
+    details = []  # (uitspraak, kerntaak, werkproces, methode, fallback, similarity) per koppeling, voor de export
+
+    # Markeer de uitspraken van elke kerntaak
+    for kerntaak in kerntaken:
+        for uitspraak in vakkennis_dict[kerntaak]:
+            koppelingen.append((uitspraak_rijen[uitspraak], kolom_ids[kerntaak]))
+
+    # Lijst om koppelingen op te slaan voor debugging
+    koppelingen_log = []
+    # Dictionary om fallback-koppelingen bij te houden: {uitspraak: werkproces}
+    fallback_koppelingen = {}
+
+    # Dynamische stopwoorden genereren op basis van werkproces-ID's
+    stopwoorden = set(STOPWOORDEN)
+    for wp in alle_werkprocessen:
+        stopwoorden.update(werkproces_stopwoorden(wp))
+    stopwoorden.update(extra_stopwoorden)
+
+    # Extraheer trefwoorden uit werkprocesbeschrijvingen voor de fallback
+    werkproces_trefwoorden = {}
+    for werkproces in alle_werkprocessen:
+        beschrijving = werkprocessen_beschrijvingen.get(werkproces, werkproces)
+        # Normaliseer de tekst: verwijder leestekens en converteer naar lowercase
+        beschrijving = re.sub(r'[^\w\s]', '', beschrijving.lower())
+        woorden = beschrijving.split()
+        trefwoorden = [woord for woord in woorden if woord not in stopwoorden and len(woord) > 3]
+        werkproces_trefwoorden[werkproces] = trefwoorden
+
+    # Voor contextuele fallback: geef prioriteit aan werkprocessen met bepaalde trefwoorden
+    contextuele_prioriteiten = {
+        "veiligheid": ["B1-K1-W1", "B1-K1-W8", "B1-K2-W1", "B1-K2-W5"],  # Werkplek inrichten en opruimen
+        "voegwerk": ["B1-K1-W5", "B1-K1-W6"],  # Gevel voegrijp maken en voegwerk aanbrengen
+        "spouwmuren": ["B1-K1-W3", "B1-K1-W4", "B1-K2-W4"],  # Maken van metselwerk, bouwkundige voorzieningen, maken van lijmwerk
+        "tijdelijke ondersteuningen": ["B1-K1-W2", "B1-K1-W3", "B1-K2-W2", "B1-K2-W4"],  # Stelwerk en maken van constructies
+        "kim": ["B1-K2-W2"],  # Stellen van de kim
+    }
+
+    # Kerntaakblokken die sinds de vorige versie niet veranderd zijn: hun opgeslagen koppelingen worden hergebruikt
+    herbruikbaar = {}
+    if vorige:
+        vingerafdrukken = blok_vingerafdrukken(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, model.versie if model else None)
+        herbruikbaar = herbruikbare_blokken(vakkennis_dict, werkprocessen_dict, vingerafdrukken, vorige)
+    te_koppelen = [kerntaak for kerntaak in kerntaken if kerntaak not in herbruikbaar and werkprocessen_dict.get(kerntaak) and vakkennis_dict[kerntaak]]
+
+    # Tel de woorden van alle uitspraken en werkprocesbeschrijvingen in één keer voor het hele dossier
+    uitspraken_normalized = [re.sub(r'[^\w\s]', '', uitspraak.lower()) for uitspraak in uitspraken]
+    werkproces_rijen = {wp: idx for idx, wp in enumerate(alle_werkprocessen)}
+    # Normaliseer de werkprocesbeschrijvingen
+    werkproces_texts = [re.sub(r'[^\w\s]', '', werkprocessen_beschrijvingen.get(wp, wp).lower()) for wp in alle_werkprocessen]
+    if not te_koppelen:
+        uitspraak_termen = werkproces_termen = None  # Alles hergebruikt; geen tekstanalyse nodig
+    elif model is not None:
+        uitspraak_termen = model.transform(uitspraken_normalized, stopwoorden)
+        werkproces_termen = model.transform(werkproces_texts, stopwoorden)
+    else:
+        from sklearn.feature_extraction.text import CountVectorizer
+        vectorizer = CountVectorizer(stop_words=list(stopwoorden), min_df=1)
+        try:
+            vectorizer.fit(uitspraken_normalized + werkproces_texts)
+            uitspraak_termen = vectorizer.transform(uitspraken_normalized)
+            werkproces_termen = vectorizer.transform(werkproces_texts)
+        except ValueError:
+            # Geen enkel woord over na het filteren van stopwoorden; tekstanalyse is voor geen enkele uitspraak mogelijk
+            uitspraak_termen = werkproces_termen = None
+
+    # Koppel uitspraken aan werkprocessen
+    fallback_counter = {wp: 0 for wp in alle_werkprocessen}  # Voor ronde-robin fallback
+    for kerntaak in kerntaken:
+        if kerntaak not in werkprocessen_dict or not werkprocessen_dict[kerntaak]:
+            koppelingen_log.append(f"Geen werkprocessen voor kerntaak {kerntaak}")
+            continue  # Geen werkprocessen voor deze kerntaak
+
+        # Verzamel alle uitspraken voor deze kerntaak
+        kerntaak_uitspraken = vakkennis_dict[kerntaak]
+        # Verzamel alle werkprocessen voor deze kerntaak
+        kerntaak_werkprocessen = werkprocessen_dict[kerntaak]
+        if not kerntaak_uitspraken:
+            continue
+
+        if kerntaak in herbruikbaar:
+            for uitspraak, _, best_werkproces, methode, used_fallback, max_similarity in herbruikbaar[kerntaak]:
+                if used_fallback:
+                    fallback_koppelingen[uitspraak] = best_werkproces
+                    fallback_counter[best_werkproces] += 1
+                koppelingen.append((uitspraak_rijen[uitspraak], kolom_ids[best_werkproces]))
+                details.append((uitspraak, kerntaak, best_werkproces, methode, used_fallback, max_similarity))
+            koppelingen_log.append(f"Koppelingen van {kerntaak} hergebruikt uit de vorige versie (blok ongewijzigd)")
+            continue
+
+        # Bereken de similarities van alle uitspraken van deze kerntaak met één matrixproduct
+        if uitspraak_termen is not None:
+            kerntaak_uitspraak_termen = uitspraak_termen[[uitspraak_rijen[uitspraak] for uitspraak in kerntaak_uitspraken]]
+            kerntaak_werkproces_termen = werkproces_termen[[werkproces_rijen[wp] for wp in kerntaak_werkprocessen]]
+            if model is not None:
+                similarity_matrix = model.similarities(kerntaak_uitspraak_termen, kerntaak_werkproces_termen)
+            else:
+                similarity_matrix = batch_similarities(kerntaak_uitspraak_termen, kerntaak_werkproces_termen)
+
+        for rij, uitspraak in enumerate(kerntaak_uitspraken):
+            uitspraak_normalized = uitspraken_normalized[uitspraak_rijen[uitspraak]]
+            best_werkproces = None
+            used_fallback = False
+            max_similarity = None
+
+            # Probeer tekstanalyse; die is alleen onmogelijk als uitspraak en werkprocessen samen geen enkel woord bevatten
+            if uitspraak_termen is not None and (kerntaak_uitspraak_termen[rij].nnz or kerntaak_werkproces_termen.nnz):
+                similarities = similarity_matrix[rij]
+                max_similarity = max(similarities)
+                if max_similarity > 0.1:  # Verlaagde drempelwaarde voor een goede match
+                    # Scores binnen 1e-12 van het maximum verschillen alleen door afrondingsruis en gelden als gelijk,
+                    # zodat bij een gelijke stand altijd het eerste werkproces van de kerntaak gekozen wordt
+                    best_match_idx = np.flatnonzero(similarities >= max_similarity - 1e-12)[0]
+                    best_werkproces = kerntaak_werkprocessen[best_match_idx]
+                    koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (similarity: {max_similarity}, scores: {list(similarities)})")
+                    methode = "tekstanalyse"
+                else:
+                    # Geen goede match, gebruik fallback
+                    used_fallback = True
+            else:
+                # Tekstanalyse mislukt (bijvoorbeeld door lege teksten), gebruik fallback
+                used_fallback = True
+                koppelingen_log.append(f"Tekstanalyse mislukt voor {uitspraak}: {LEGE_VOCABULAIRE_MELDING}")
+
+            # Fallback: gebruik trefwoorden om een werkproces te kiezen
+            if used_fallback:
+                uitspraak_woorden = [woord for woord in uitspraak_normalized.split() if woord not in stopwoorden and len(woord) > 3]
+                beste_score = 0
+                best_werkproces = None
+
+                # Contextuele check: geef prioriteit aan werkprocessen met relevante trefwoorden
+                for context_trefwoord, prioriteit_werkprocessen in contextuele_prioriteiten.items():
+                    if context_trefwoord in uitspraak_normalized:
+                        for wp in prioriteit_werkprocessen:
+                            if wp in kerntaak_werkprocessen:
+                                best_werkproces = wp
+                                beste_score = 100  # Hoge score om prioriteit te geven
+                                koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (contextuele prioriteit: {context_trefwoord})")
+                                methode = "contextuele prioriteit"
+                                break
+                        if best_werkproces:
+                            break
+
+                # Als er geen contextuele match is, gebruik trefwoordovereenkomst
+                if not best_werkproces:
+                    for wp in kerntaak_werkprocessen:
+                        trefwoorden = werkproces_trefwoorden.get(wp, [])
+                        score = sum(1 for woord in uitspraak_woorden if woord in trefwoorden)
+                        if score > beste_score:
+                            beste_score = score
+                            best_werkproces = wp
+                            methode = "trefwoorden"
+
+                # Als er nog steeds geen match is, gebruik ronde-robin om werkprocessen te verdelen
+                if not best_werkproces or beste_score == 0:
+                    # Kies het werkproces met de minste toewijzingen (ronde-robin)
+                    werkproces_counts = {wp: fallback_counter[wp] for wp in kerntaak_werkprocessen}
+                    best_werkproces = min(werkproces_counts, key=werkproces_counts.get)
+                    koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (fallback, ronde-robin, geen trefwoordmatch)")
+                    methode = "ronde-robin"
+                else:
+                    koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (fallback, trefwoordscore: {beste_score})")
+
+                fallback_koppelingen[uitspraak] = best_werkproces
+                fallback_counter[best_werkproces] += 1
+
+            # Markeer de uitspraak in de kolom van het beste werkproces
+            koppelingen.append((uitspraak_rijen[uitspraak], kolom_ids[best_werkproces]))
+            details.append((uitspraak, kerntaak, best_werkproces, methode, used_fallback, None if max_similarity is None else float(max_similarity)))
+
+    # Fallback-cellen per (uitspraak, werkproces) uit de details: een uitspraak die in meerdere kerntaken via de
+    # fallback gekoppeld is, krijgt in elk van die werkprocessen een gele cel (fallback_koppelingen houdt er één per uitspraak)
+    fallback_paren = [(uitspraak_rijen[uitspraak], kolom_ids[wp]) for uitspraak, _, wp, _, via_fallback, _ in details if via_fallback]
+    kruistabel = Kruistabel(uitspraken, kerntaken + alle_werkprocessen, koppelingen, fallback_paren, details)
+    return kruistabel, koppelingen_log, fallback_koppelingen
+
+# Functie om fallback-koppelingen in de kruistabel geel te markeren op basis van het vooraf berekende masker
+def style_kruistabel(display_df, masker):
+    css = pd.DataFrame(np.where(masker.to_numpy(), "background-color: yellow", ""), index=display_df.index, columns=display_df.columns)
+    return display_df.style.apply(lambda _: css, axis=None)
+
+# Exportformaten: extensie, MIME-type en knoptekst
+EXPORT_FORMATEN = {
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "Download Excel-bestand"),
+    "csv": (".csv", "text/csv", "Download CSV-bestand"),
+    "parquet": (".parquet", "application/vnd.apache.parquet", "Download Parquet-bestand"),
+}
+# Aantal rijen dat bij CSV- en Parquet-export tegelijk dicht wordt gemaakt
+EXPORT_BLOK_RIJEN = 1000
+# Maximaal aantal kolommen van een Excel-werkblad; de kolom Uitspraak telt mee
+EXCEL_MAX_KOLOMMEN = 16384
+KOPPELINGEN_KOLOMMEN = ["Uitspraak", "Kerntaak", "Werkproces", "Methode", "Fallback", "Similarity"]
+
+# Functie om de kruistabel in blokken van rijen op te leveren als (uitspraken, 0/1-array), zonder de hele tabel dicht te maken
+def _iter_blokken(kruistabel, blok_rijen=EXPORT_BLOK_RIJEN):
+    for start in range(0, len(kruistabel.uitspraken), blok_rijen):
+        eind = start + blok_rijen
+        yield kruistabel.uitspraken[start:eind], kruistabel.matrix[start:eind].toarray().astype(np.int8)
+
+# Functie om een tekstbestand te openen op een pad of binair bestandsobject (bijv. BytesIO)
+@contextmanager
+def _open_tekst(doel):
+    if isinstance(doel, (str, os.PathLike)):
+        with open(doel, "w", newline="", encoding="utf-8-sig") as bestand:
+            yield bestand
+    else:
+        bestand = TextIOWrapper(doel, newline="", encoding="utf-8-sig")
+        try:
+            yield bestand
+        finally:
+            bestand.flush()
+            bestand.detach()  # Laat het onderliggende bestandsobject open voor de aanroeper
+
+# Functie om te bepalen of de kruistabel te breed is voor Excel (bijv. een samengevoegde tabel van veel dossiers);
+# geeft dan een melding terug, anders None
+def excel_te_breed(kruistabel):
+    if len(kruistabel.kolommen) + 1 <= EXCEL_MAX_KOLOMMEN:
+        return None
+    return (
+        f"De kruistabel heeft {len(kruistabel.kolommen)} kolommen en Excel ondersteunt er maximaal {EXCEL_MAX_KOLOMMEN - 1} "
+        "naast de uitspraken; gebruik CSV of Parquet."
+    )
+
+# Functie om de kruistabel als Excel-werkmap te schrijven: rij voor rij (write-only), met gele fallback-cellen en een blad met koppelingen
+def _schrijf_excel(kruistabel, doel):
+    melding = excel_te_breed(kruistabel)
+    if melding:
+        raise ValueError(melding)
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    werkmap = Workbook(write_only=True)
+    vet = Font(bold=True)
+    geel = PatternFill("solid", fgColor="FFFF00")
+
+    def kopregel(blad, koppen):
+        cellen = []
+        for kop in koppen:
+            cel = WriteOnlyCell(blad, value=kop)
+            cel.font = vet
+            cellen.append(cel)
+        blad.append(cellen)
+
+    blad = werkmap.create_sheet("Kruistabel")
+    blad.freeze_panes = "B2"
+    kopregel(blad, ["Uitspraak"] + kruistabel.kolommen)
+    matrix = kruistabel.matrix
+    fallback = kruistabel.fallback.multiply(matrix).tocsr()
+    for rij, uitspraak in enumerate(kruistabel.uitspraken):
+        waarden = [uitspraak] + [None] * len(kruistabel.kolommen)
+        for kolom in matrix.indices[matrix.indptr[rij]:matrix.indptr[rij + 1]]:
+            waarden[kolom + 1] = "×"
+        for kolom in fallback.indices[fallback.indptr[rij]:fallback.indptr[rij + 1]]:
+            cel = WriteOnlyCell(blad, value="×")
+            cel.fill = geel
+            waarden[kolom + 1] = cel
+        blad.append(waarden)
+
+    blad = werkmap.create_sheet("Koppelingen")
+    blad.freeze_panes = "A2"
+    kopregel(blad, KOPPELINGEN_KOLOMMEN)
+    for uitspraak, kerntaak, werkproces, methode, via_fallback, similarity in kruistabel.koppeling_details:
+        blad.append([uitspraak, kerntaak, werkproces, methode, "ja" if via_fallback else "nee", similarity])
+    werkmap.save(doel)
+
+# Functie om de numerieke 0/1-kruistabel als CSV te schrijven
+def _schrijf_csv(kruistabel, doel):
+    with _open_tekst(doel) as bestand:
+        schrijver = csv.writer(bestand)
+        schrijver.writerow(["Uitspraak"] + kruistabel.kolommen)
+        for uitspraken, blok in _iter_blokken(kruistabel):
+            schrijver.writerows([uitspraak, *rij] for uitspraak, rij in zip(uitspraken, blok.tolist()))
+
+# Functie om de numerieke 0/1-kruistabel als Parquet te schrijven, één rijgroep per blok
+def _schrijf_parquet(kruistabel, doel):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet-export vereist pyarrow (pip install pyarrow)")
+    schema = pa.schema([("Uitspraak", pa.string())] + [(kolom, pa.int8()) for kolom in kruistabel.kolommen])
+    with pq.ParquetWriter(doel, schema) as schrijver:
+        for uitspraken, blok in _iter_blokken(kruistabel):
+            kolommen = [pa.array(uitspraken, pa.string())] + [pa.array(blok[:, idx]) for idx in range(blok.shape[1])]
+            schrijver.write_table(pa.Table.from_arrays(kolommen, schema=schema))
+
+# Functie om de kruistabel te exporteren naar een pad of binair bestandsobject; zonder doel komt de BytesIO-buffer
+# zelf terug (bijv. voor st.download_button), zodat het hele bestand niet nog een keer gekopieerd wordt
+def exporteer_kruistabel(kruistabel, formaat="xlsx", doel=None):
+    schrijvers = {"xlsx": _schrijf_excel, "csv": _schrijf_csv, "parquet": _schrijf_parquet}
+    if formaat not in schrijvers:
+        raise ValueError(f"Onbekend exportformaat: {formaat} (kies uit {', '.join(schrijvers)})")
+    if doel is not None:
+        schrijvers[formaat](kruistabel, doel)
+        return None
+    output = BytesIO()
+    schrijvers[formaat](kruistabel, output)
+    output.seek(0)
+    return output
+
+# Versie van de parser en koppellogica; verhoog bij elke wijziging die de uitkomst beïnvloedt zodat oude cache-items vervallen
+PARSER_VERSIE = "5"
+# Maximaal aantal resultaten in het geheugen en maximale grootte van de cache op schijf
+CACHE_MAX_ITEMS = 32
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Standaard in de cachemap van de gebruiker (niet in de gedeelde tijdelijke map, waar andere gebruikers bestanden kunnen neerzetten)
+CACHE_DIR = os.environ.get("KRUISTABEL_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "kruistabel"
+)
+# Zoekindex en corpusmodel staan in de datamap van de gebruiker: ze moeten een herstart overleven (de tijdelijke map
+# wordt dan geleegd) en horen net als de cache niet in een map waar andere gebruikers bestanden kunnen neerzetten
+DATA_DIR = os.environ.get("KRUISTABEL_DATA_DIR") or os.path.join(
+    os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"), "kruistabel"
+)
+
+# Functie om de cachesleutel van een PDF te bepalen (hash van de inhoud plus parserversie, eventueel de versie van het
+# corpusmodel en of het paginafilter aan stond)
+def cache_sleutel(pdf_bytes, model_versie=None, paginafilter=False):
+    model_deel = model_versie.encode() + b"\0" if model_versie else b""
+    filter_deel = b"paginafilter\0" if paginafilter else b""
+    return hashlib.sha256(PARSER_VERSIE.encode() + b"\0" + model_deel + filter_deel + pdf_bytes).hexdigest()
+
+# Functie om te bepalen of een bestand of map van de huidige gebruiker is (op Windows zonder eigenaar altijd waar)
+def _van_gebruiker(stat):
+    return not hasattr(os, "getuid") or stat.st_uid == os.getuid()
+
+# Functie om een map aan te maken (alleen toegankelijk voor deze gebruiker) en te controleren dat een bestaande map
+# van deze gebruiker is en niet door anderen beschrijfbaar is
+def prive_map(pad):
+    try:
+        os.makedirs(pad, mode=0o700, exist_ok=True)
+        stat = os.stat(pad)
+    except OSError:
+        return False
+    return _van_gebruiker(stat) and not stat.st_mode & 0o022
+
+# Functie om een analyseresultaat als npz weg te schrijven: de incidentieparen van de kruistabel als integer-arrays en
+# de rest als JSON. Bewust geen pickle: het laden van een cachebestand kan zo nooit code uitvoeren.
+def schrijf_resultaat(resultaat, doel):
+    gegevens = dict(resultaat)
+    arrays = {}
+    kruistabel = resultaat["kruistabel"]
+    if kruistabel is not None:
+        gegevens["kruistabel"] = {"uitspraken": kruistabel.uitspraken, "kolommen": kruistabel.kolommen, "koppeling_details": kruistabel.koppeling_details}
+        for naam, matrix in (("koppelingen", kruistabel.matrix), ("fallback", kruistabel.fallback)):
+            paren = matrix.tocoo()
+            arrays[naam] = np.column_stack([paren.row, paren.col]).astype(np.int64)
+    json_bytes = json.dumps(gegevens, ensure_ascii=False).encode("utf-8")
+    np.savez(doel, gegevens=np.frombuffer(json_bytes, dtype=np.uint8), **arrays)
+
+# Functie om een met schrijf_resultaat opgeslagen analyseresultaat te lezen (zonder pickle)
+def lees_resultaat(bron):
+    with np.load(bron, allow_pickle=False) as npz:
+        resultaat = json.loads(npz["gegevens"].tobytes().decode("utf-8"))
+        kruistabel = resultaat["kruistabel"]
+        if kruistabel is not None:
+            resultaat["kruistabel"] = Kruistabel(
+                kruistabel["uitspraken"], kruistabel["kolommen"], npz["koppelingen"], npz["fallback"],
+                [tuple(detail) for detail in kruistabel["koppeling_details"]],
+            )
+    return resultaat
+
+# Cache voor geanalyseerde dossiers: een begrensde LRU in het geheugen met daaronder een begrensde opslag op schijf.
+# De map op schijf wordt alleen gebruikt als hij van deze gebruiker is en niet door anderen beschrijfbaar is.
+class ResultaatCache:
+    def __init__(self, max_items=CACHE_MAX_ITEMS, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._geheugen = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"geheugen_hits": 0, "schijf_hits": 0, "misses": 0}
+
+    def _pad(self, sleutel):
+        return os.path.join(self.cache_dir, sleutel + ".npz")
+
+    def _schijf_bruikbaar(self):
+        return bool(self.cache_dir) and prive_map(self.cache_dir)
+
+    def get(self, sleutel):
+        with self._lock:
+            if sleutel in self._geheugen:
+                self._geheugen.move_to_end(sleutel)
+                self.stats["geheugen_hits"] += 1
+                return self._geheugen[sleutel]
+        if self._schijf_bruikbaar():
+            pad = self._pad(sleutel)
+            try:
+                with open(pad, "rb") as f:
+                    if not _van_gebruiker(os.fstat(f.fileno())):
+                        raise PermissionError(pad)
+                    resultaat = lees_resultaat(f)
+                os.utime(pad)  # Markeer als recent gebruikt voor de eviction op schijf
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                resultaat = None
+            if resultaat is not None:
+                with self._lock:
+                    self.stats["schijf_hits"] += 1
+                    self._zet_in_geheugen(sleutel, resultaat)
+                return resultaat
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, sleutel, resultaat):
+        with self._lock:
+            self._zet_in_geheugen(sleutel, resultaat)
+        if self._schijf_bruikbaar():
+            try:
+                # Schrijf eerst naar een tijdelijk bestand zodat een gelijktijdige lezer nooit een half bestand ziet
+                fd, tmp_pad = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    schrijf_resultaat(resultaat, f)
+                os.replace(tmp_pad, self._pad(sleutel))
+                self._ruim_schijf_op()
+            except OSError:
+                pass  # De schijfcache is een optimalisatie; zonder schrijfrechten werkt alleen de geheugencache
+
+    def _zet_in_geheugen(self, sleutel, resultaat):
+        self._geheugen[sleutel] = resultaat
+        self._geheugen.move_to_end(sleutel)
+        while len(self._geheugen) > self.max_items:
+            self._geheugen.popitem(last=False)
+
+    def _ruim_schijf_op(self):
+        # Verwijder de minst recent gebruikte bestanden tot de cache onder de maximale grootte zit
+        bestanden = []
+        for naam in os.listdir(self.cache_dir):
+            if naam.endswith(".npz"):
+                stat = os.stat(os.path.join(self.cache_dir, naam))
+                bestanden.append((stat.st_mtime, stat.st_size, naam))
+        totaal = sum(grootte for _, grootte, _ in bestanden)
+        for _, grootte, naam in sorted(bestanden):
+            if totaal <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, naam))
+                totaal -= grootte
+            except OSError:
+                pass
+
+# Functie om een dossier volledig te analyseren: tekst extraheren en de kruistabel opbouwen
+def analyseer_dossier(pdf_file, workers=None, melding=stderr_melding, prestaties=None, model=None, paginafilter=False, voortgang=None, vorige=None):
+    if prestaties is None:
+        prestaties = Prestaties()
+    parser = DossierParser()
+    vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, raw_text, debug_log = extract_vakkennis_en_werkprocessen(pdf_file, workers=workers, parser=parser, bewaar_ruwe_tekst=False, melding=melding, prestaties=prestaties, paginafilter=paginafilter, voortgang=voortgang)
+    resultaat = {
+        "vakkennis_dict": vakkennis_dict,
+        "werkprocessen_dict": werkprocessen_dict,
+        "werkprocessen_beschrijvingen": werkprocessen_beschrijvingen,
+        "alle_werkprocessen": sorted(set(wp for wps in werkprocessen_dict.values() for wp in wps)),
+        "aantal_paginas": parser.aantal_paginas,
+        "kruistabel": None,
+        "koppelingen_log": [],
+        "fallback_koppelingen": {},
+        "model_versie": model.versie if model else None,
+        "vingerafdrukken": blok_vingerafdrukken(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, model.versie if model else None),
+    }
+    if vakkennis_dict:
+        with prestaties.stap("koppelen", uitspraken=sum(len(uitspraken) for uitspraken in vakkennis_dict.values())) as tellers:
+            kruistabel, koppelingen_log, fallback_koppelingen = bouw_kruistabel(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, model=model, vorige=vorige)
+            tellers["unieke_uitspraken"] = len(kruistabel.uitspraken)
+            tellers["fallback"] = int(kruistabel.fallback.nnz)
+            if vorige:
+                tellers["hergebruikte_kerntaken"] = len(herbruikbare_blokken(vakkennis_dict, werkprocessen_dict, resultaat["vingerafdrukken"], vorige))
+        resultaat["kruistabel"] = kruistabel
+        resultaat["koppelingen_log"] = koppelingen_log
+        resultaat["fallback_koppelingen"] = fallback_koppelingen
+    return resultaat
+
+# Onder dit aantal kerntaakgroepen wordt bij het samenvoegen van dossiers serieel gekoppeld
+SAMENVOEGEN_PARALLEL_MIN = 16
+
+# Functie om een uitspraak te normaliseren voor het ontdubbelen over dossiers: kleine letters, zonder leestekens en dubbele spaties
+def normaliseer_uitspraak(uitspraak):
+    return " ".join(re.sub(r'[^\w\s]', '', uitspraak.lower()).split())
+
+# Functie om voor elk dossier een uniek kolomvoorvoegsel te maken uit de bestandsnaam (zonder map en extensie)
+def dossier_voorvoegsels(namen):
+    voorvoegsels = []
+    for naam in namen:
+        basis = os.path.splitext(os.path.basename(naam))[0]
+        voorvoegsel, volgnummer = basis, 1
+        while voorvoegsel in voorvoegsels:
+            volgnummer += 1
+            voorvoegsel = f"{basis} ({volgnummer})"
+        voorvoegsels.append(voorvoegsel)
+    return voorvoegsels
+
+# Functie om de kerntaken van een dossier te groeperen voor parallel koppelen. Kerntaken die een werkproces delen
+# blijven bij elkaar, omdat ze de ronde-robin-teller van de fallback delen; zo is de uitkomst gelijk aan bouw_kruistabel.
+def _kerntaak_groepen(vakkennis_dict, werkprocessen_dict):
+    groepen = []  # (kerntaken, werkprocessen) per groep
+    for kerntaak in vakkennis_dict:
+        if not vakkennis_dict[kerntaak] or not werkprocessen_dict.get(kerntaak):
+            continue  # Niets te koppelen
+        kerntaken, werkprocessen = [kerntaak], set(werkprocessen_dict[kerntaak])
+        for groep in [groep for groep in groepen if groep[1] & werkprocessen]:
+            groepen.remove(groep)
+            kerntaken += groep[0]
+            werkprocessen |= groep[1]
+        groepen.append((kerntaken, werkprocessen))
+    volgorde = {kerntaak: idx for idx, kerntaak in enumerate(vakkennis_dict)}
+    return [sorted(kerntaken, key=volgorde.get) for kerntaken, _ in groepen]
+
+# Functie om een reeks kerntaakgroepen te koppelen (draait in een worker-proces); geeft per groep de koppeling_details terug.
+# Elke groep krijgt alleen zijn eigen werkprocessen mee, plus de stopwoorden van alle werkproces-ID's van het dossier.
+def _koppel_groepen(groepen, model):
+    return [
+        bouw_kruistabel(vakkennis_deel, werkprocessen_deel, werkprocessen_beschrijvingen, model=model, extra_stopwoorden=stopwoorden)[0].koppeling_details
+        for vakkennis_deel, werkprocessen_deel, werkprocessen_beschrijvingen, stopwoorden in groepen
+    ]
+
+# Functie om de kerntaakgroepen over een procespool te verdelen, in een paar blokken per worker zodat het model
+# en de werkprocessen van een dossier maar een paar keer naar de workers gestuurd worden
+def _koppel_parallel(groepen, model, workers):
+    if workers <= 1 or len(groepen) < SAMENVOEGEN_PARALLEL_MIN:
+        return _koppel_groepen(groepen, model)
+    blokken = _verdeel_in_blokken(groepen, workers)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=procespool_context()) as executor:
+            gekoppeld = executor.map(_koppel_groepen, blokken, [model] * len(blokken))
+            return [details for blok in gekoppeld for details in blok]
+    except (BrokenProcessPool, OSError):
+        # Geen procespool beschikbaar (bijv. beperkte omgeving), koppel serieel
+        return _koppel_groepen(groepen, model)
+
+# Functie om één kruistabel over meerdere dossiers te maken. dossiers is een lijst (naam, resultaat) met per dossier
+# vakkennis_dict, werkprocessen_dict en werkprocessen_beschrijvingen (bijv. van analyseer_dossier of uit de index).
+# Kolommen krijgen de dossiernaam als voorvoegsel ("naam/B1-K1"), uitspraken worden na normalisatie ontdubbeld
+# over alle dossiers en het koppelen per kerntaak wordt over een procespool verdeeld.
+def bouw_samengevoegde_kruistabel(dossiers, model=None, workers=None, prestaties=None):
+    if prestaties is None:
+        prestaties = Prestaties()
+    if workers is None:
+        workers = PARALLEL_WORKERS or os.cpu_count() or 1
+    voorvoegsels = dossier_voorvoegsels([naam for naam, _ in dossiers])
+
+    # Ontdubbel de uitspraken met een hash-index op de genormaliseerde tekst; de eerste schrijfwijze wordt getoond
+    with prestaties.stap("ontdubbelen", dossiers=len(dossiers)) as tellers:
+        weergave = {}  # Genormaliseerde tekst -> getoonde uitspraak
+        rij_van = {}  # Uitspraak zoals in het dossier -> getoonde uitspraak
+        for _, resultaat in dossiers:
+            for uitspraken in resultaat["vakkennis_dict"].values():
+                for uitspraak in uitspraken:
+                    if uitspraak not in rij_van:
+                        rij_van[uitspraak] = weergave.setdefault(normaliseer_uitspraak(uitspraak), uitspraak)
+        uitspraken = sorted(weergave.values())
+        uitspraak_rijen = {uitspraak: idx for idx, uitspraak in enumerate(uitspraken)}
+        rij_van = {uitspraak: uitspraak_rijen[getoond] for uitspraak, getoond in rij_van.items()}
+        tellers["uitspraken"] = sum(len(lijst) for _, resultaat in dossiers for lijst in resultaat["vakkennis_dict"].values())
+        tellers["unieke_uitspraken"] = len(uitspraken)
+
+    # Kolommen per dossier: eerst de kerntaken, dan de werkprocessen (gesorteerd), met het dossier als voorvoegsel
+    kolommen = []
+    koppelingen = []
+    groepen = []
+    for voorvoegsel, (_, resultaat) in zip(voorvoegsels, dossiers):
+        vakkennis_dict, werkprocessen_dict = resultaat["vakkennis_dict"], resultaat["werkprocessen_dict"]
+        werkprocessen = sorted(set(wp for wps in werkprocessen_dict.values() for wp in wps))
+        stopwoorden = set(woord for wp in werkprocessen for woord in werkproces_stopwoorden(wp))
+        kolom_start = len(kolommen)
+        kolommen.extend(f"{voorvoegsel}/{kolom}" for kolom in list(vakkennis_dict) + werkprocessen)
+        for kolom_id, kerntaak in enumerate(vakkennis_dict, start=kolom_start):
+            koppelingen.extend((rij_van[uitspraak], kolom_id) for uitspraak in vakkennis_dict[kerntaak])
+        for kerntaken in _kerntaak_groepen(vakkennis_dict, werkprocessen_dict):
+            werkprocessen_deel = {kerntaak: werkprocessen_dict[kerntaak] for kerntaak in kerntaken}
+            beschrijvingen = {
+                wp: resultaat["werkprocessen_beschrijvingen"][wp]
+                for wps in werkprocessen_deel.values() for wp in wps if wp in resultaat["werkprocessen_beschrijvingen"]
+            }
+            groepen.append((voorvoegsel, ({kerntaak: vakkennis_dict[kerntaak] for kerntaak in kerntaken}, werkprocessen_deel, beschrijvingen, stopwoorden)))
+
+    with prestaties.stap("koppelen", groepen=len(groepen), workers=workers):
+        gekoppeld = _koppel_parallel([groep for _, groep in groepen], model, workers)
+
+    with prestaties.stap("samenvoegen", kolommen=len(kolommen)) as tellers:
+        kolom_ids = {kolom: idx for idx, kolom in enumerate(kolommen)}
+        fallback = []
+        details = []
+        for (voorvoegsel, _), groep_details in zip(groepen, gekoppeld):
+            for uitspraak, kerntaak, werkproces, methode, via_fallback, similarity in groep_details:
+                paar = (rij_van[uitspraak], kolom_ids[f"{voorvoegsel}/{werkproces}"])
+                koppelingen.append(paar)
+                if via_fallback:
+                    fallback.append(paar)
+                details.append((uitspraken[paar[0]], f"{voorvoegsel}/{kerntaak}", f"{voorvoegsel}/{werkproces}", methode, via_fallback, similarity))
+        kruistabel = Kruistabel(uitspraken, kolommen, koppelingen, fallback, details)
+        tellers["fallback"] = len(fallback)
+    return kruistabel
+
+# Wachtrij voor de worker-processen, per proces gezet door de initializer van de pool
+_VOORTGANG_WACHTRIJ = None
+
+def _init_taakworker(wachtrij):
+    global _VOORTGANG_WACHTRIJ
+    _VOORTGANG_WACHTRIJ = wachtrij
+
+# Functie die één analyse uitvoert in een worker-proces; de voortgang gaat per procent via de wachtrij naar het hoofdproces
+def _voer_taak_uit(sleutel, pdf_bytes, workers, model, paginafilter, vorige, geheugen=False):
+    meldingen = []
+    laatste_procent = [-1]
+
+    def voortgang(klaar, totaal):
+        procent = 100 * klaar // max(totaal, 1)
+        if procent != laatste_procent[0]:
+            laatste_procent[0] = procent
+            _VOORTGANG_WACHTRIJ.put((sleutel, klaar, totaal))
+
+    _VOORTGANG_WACHTRIJ.put((sleutel, 0, 0))  # Gestart
+    prestaties = Prestaties(geheugen=geheugen)
+    try:
+        resultaat = analyseer_dossier(
+            BytesIO(pdf_bytes), workers=workers, melding=lambda niveau, tekst: meldingen.append((niveau, tekst)),
+            prestaties=prestaties, model=model, paginafilter=paginafilter, voortgang=voortgang, vorige=vorige,
+        )
+    finally:
+        prestaties.stop()
+    return resultaat, meldingen, prestaties.stappen
+
+# Functie om de zware modules te laden en één keer een kleine vectorizer te fitten en te scoren,
+# zodat de eerste analyse niet op imports en de eerste aanroepen van scikit-learn en SciPy hoeft te wachten
+def opwarmen():
+    start = time.perf_counter()
+    for module in ZWARE_MODULES:
+        importlib.import_module(module)
+    from sklearn.feature_extraction.text import CountVectorizer
+    vectorizer = CountVectorizer(stop_words=list(STOPWOORDEN), min_df=1)
+    termen = vectorizer.fit_transform(["kent de eigenschappen van metselmortel", "maakt metselwerk volgens tekening"])
+    batch_similarities(termen[:1], termen[1:])
+    return time.perf_counter() - start
+
+# Pad van de doorzoekbare index over alle geanalyseerde dossiers (SQLite met FTS5)
+INDEX_PAD = os.environ.get("KRUISTABEL_INDEX_PAD") or os.path.join(DATA_DIR, "index.sqlite")
+# Maximaal aantal kandidaten uit de tekstindex dat bij "vergelijkbaar zoeken" opnieuw gescoord wordt
+INDEX_KANDIDATEN = 500
+ZOEKWIJZEN = {"woorden": "Alle woorden", "zin": "Exacte zin", "vergelijkbaar": "Vergelijkbare uitspraken"}
+ZOEK_KOLOMMEN = ["Dossier", "Kerntaak", "Werkproces", "Uitspraak", "Score"]
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dossiers (
+    id INTEGER PRIMARY KEY,
+    inhoud_hash TEXT NOT NULL UNIQUE,
+    naam TEXT NOT NULL,
+    parser_versie TEXT NOT NULL,
+    aantal_paginas INTEGER NOT NULL,
+    toegevoegd TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS werkprocessen (
+    dossier_id INTEGER NOT NULL,
+    kerntaak TEXT NOT NULL,
+    werkproces TEXT NOT NULL,
+    beschrijving TEXT
+);
+CREATE TABLE IF NOT EXISTS uitspraken (
+    id INTEGER PRIMARY KEY,
+    dossier_id INTEGER NOT NULL,
+    kerntaak TEXT NOT NULL,
+    werkproces TEXT,
+    methode TEXT,
+    fallback INTEGER,
+    similarity REAL,
+    uitspraak TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blokken (
+    dossier_id INTEGER NOT NULL,
+    kerntaak TEXT NOT NULL,
+    vingerafdruk TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS werkprocessen_dossier ON werkprocessen (dossier_id);
+CREATE INDEX IF NOT EXISTS blokken_dossier ON blokken (dossier_id);
+CREATE INDEX IF NOT EXISTS uitspraken_dossier ON uitspraken (dossier_id);
+"""
+
+# Functie om de hash van de PDF-inhoud te bepalen (zonder parserversie; identificeert een dossier in de index)
+def inhoud_hash(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+# Functie om een zoekvraag op te splitsen in losse woorden
+def zoekwoorden(tekst):
+    return re.findall(r"\w+", tekst.lower())
+
+# Persistente index over de uitspraken van alle geanalyseerde dossiers, met dossier, kerntaak en werkproces als sleutels.
+# Elk dossier wordt één keer toegevoegd (per inhoud en parserversie); zoeken gaat via SQLite FTS5.
+# De map van de index moet van deze gebruiker zijn en niet door anderen beschrijfbaar, anders volgt PermissionError.
+class UitspraakIndex:
+    def __init__(self, pad=INDEX_PAD):
+        self.pad = pad
+        self.fts = True
+        map_ = os.path.dirname(os.path.abspath(pad))
+        if not prive_map(map_):
+            raise PermissionError(f"De map van de zoekindex ({map_}) is niet van deze gebruiker of door anderen beschrijfbaar.")
+        with self._verbinding() as db:
+            db.execute("PRAGMA journal_mode=WAL")  # Lezers blokkeren niet terwijl een ander proces schrijft
+            db.executescript(INDEX_SCHEMA)
+            try:
+                db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS uitspraken_fts USING fts5(uitspraak, tokenize='unicode61 remove_diacritics 2')")
+            except sqlite3.OperationalError:
+                self.fts = False  # SQLite zonder FTS5: zoeken valt terug op LIKE
+
+    # Open een verbinding die bij succes commit en bij een fout terugdraait
+    @contextmanager
+    def _verbinding(self):
+        db = sqlite3.connect(self.pad, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # Voeg een analyseresultaat toe; geeft False terug als het dossier met deze parserversie al in de index staat
+    def voeg_toe(self, inhoud_sleutel, naam, resultaat):
+        details = {}
+        if resultaat["kruistabel"] is not None:
+            for uitspraak, kerntaak, werkproces, methode, via_fallback, similarity in resultaat["kruistabel"].koppeling_details:
+                details[(uitspraak, kerntaak)] = (werkproces, methode, int(via_fallback), similarity)
+        try:
+            with self._verbinding() as db:
+                bestaand = db.execute("SELECT id, parser_versie FROM dossiers WHERE inhoud_hash = ?", (inhoud_sleutel,)).fetchone()
+                if bestaand is not None and bestaand[1] == PARSER_VERSIE:
+                    return False
+                if bestaand is not None:
+                    self._verwijder(db, bestaand[0])  # Geanalyseerd met een oudere parser: vervang de gegevens
+                dossier_id = db.execute(
+                    "INSERT INTO dossiers (inhoud_hash, naam, parser_versie, aantal_paginas, toegevoegd) VALUES (?, ?, ?, ?, ?)",
+                    (inhoud_sleutel, naam, PARSER_VERSIE, resultaat["aantal_paginas"], datetime.now().isoformat(timespec="seconds")),
+                ).lastrowid
+                db.executemany(
+                    "INSERT INTO werkprocessen (dossier_id, kerntaak, werkproces, beschrijving) VALUES (?, ?, ?, ?)",
+                    [
+                        (dossier_id, kerntaak, wp, resultaat["werkprocessen_beschrijvingen"].get(wp))
+                        for kerntaak, wps in resultaat["werkprocessen_dict"].items() for wp in wps
+                    ],
+                )
+                db.executemany(
+                    "INSERT INTO uitspraken (dossier_id, kerntaak, werkproces, methode, fallback, similarity, uitspraak) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (dossier_id, kerntaak, *details.get((uitspraak, kerntaak), (None, None, None, None)), uitspraak)
+                        for kerntaak, uitspraken in resultaat["vakkennis_dict"].items() for uitspraak in uitspraken
+                    ],
+                )
+                db.executemany(
+                    "INSERT INTO blokken (dossier_id, kerntaak, vingerafdruk) VALUES (?, ?, ?)",
+                    [(dossier_id, kerntaak, vingerafdruk) for kerntaak, vingerafdruk in resultaat["vingerafdrukken"].items()],
+                )
+                if self.fts:
+                    db.execute("INSERT INTO uitspraken_fts (rowid, uitspraak) SELECT id, uitspraak FROM uitspraken WHERE dossier_id = ?", (dossier_id,))
+        except sqlite3.IntegrityError:
+            return False  # Een ander proces heeft hetzelfde dossier net toegevoegd
+        return True
+
+    def _verwijder(self, db, dossier_id):
+        if self.fts:
+            db.execute("DELETE FROM uitspraken_fts WHERE rowid IN (SELECT id FROM uitspraken WHERE dossier_id = ?)", (dossier_id,))
+        db.execute("DELETE FROM uitspraken WHERE dossier_id = ?", (dossier_id,))
+        db.execute("DELETE FROM werkprocessen WHERE dossier_id = ?", (dossier_id,))
+        db.execute("DELETE FROM blokken WHERE dossier_id = ?", (dossier_id,))
+        db.execute("DELETE FROM dossiers WHERE id = ?", (dossier_id,))
+
+    # Het corpus voor een corpusmodel: (hash, aantal dossiers, teksten, werkproces-ID's); teksten zijn de unieke
+    # uitspraken en werkprocesbeschrijvingen per dossier
+    def corpus(self):
+        with self._verbinding() as db:
+            dossiers = db.execute("SELECT inhoud_hash, parser_versie FROM dossiers ORDER BY inhoud_hash").fetchall()
+            uitspraken = [uitspraak for _, uitspraak in db.execute("SELECT DISTINCT dossier_id, uitspraak FROM uitspraken").fetchall()]
+            werkprocessen = db.execute("SELECT DISTINCT dossier_id, werkproces, beschrijving FROM werkprocessen").fetchall()
+        teksten = uitspraken + [beschrijving or wp for _, wp, beschrijving in werkprocessen]
+        return self.corpus_hash(dossiers), len(dossiers), teksten, {wp for _, wp, _ in werkprocessen}
+
+    # Hash van de dossiers (inhoud en parserversie) in de index; verandert zodra er een dossier bijkomt of vervangen wordt
+    def corpus_hash(self, dossiers=None):
+        if dossiers is None:
+            with self._verbinding() as db:
+                dossiers = db.execute("SELECT inhoud_hash, parser_versie FROM dossiers ORDER BY inhoud_hash").fetchall()
+        return woorden_hash(f"{inhoud}:{versie}" for inhoud, versie in dossiers)
+
+    # Alle dossiers in de index, nieuwste eerst
+    def dossiers(self):
+        with self._verbinding() as db:
+            rijen = db.execute("SELECT id, naam, inhoud_hash, toegevoegd FROM dossiers ORDER BY toegevoegd DESC, id DESC").fetchall()
+        return [{"id": id_, "naam": naam, "inhoud_hash": inhoud, "toegevoegd": toegevoegd} for id_, naam, inhoud, toegevoegd in rijen]
+
+    # De meest recente eerdere versie van een dossier: zelfde naam, andere inhoud; None als die er niet is.
+    # Geef dossiers mee (uit dossiers()) als de lijst al opgehaald is
+    def vorige_versie(self, naam, inhoud_sleutel, dossiers=None):
+        dossiers = self.dossiers() if dossiers is None else dossiers
+        return next((dossier for dossier in dossiers if dossier["naam"] == naam and dossier["inhoud_hash"] != inhoud_sleutel), None)
+
+    # Vingerafdruk per kerntaakblok van een dossier
+    def vingerafdrukken(self, dossier_id):
+        with self._verbinding() as db:
+            return dict(db.execute("SELECT kerntaak, vingerafdruk FROM blokken WHERE dossier_id = ?", (dossier_id,)).fetchall())
+
+    # Opgeslagen koppelingen per blok ({vingerafdruk: koppeling_details}), om bij een nieuwe versie te hergebruiken
+    def vorige_koppelingen(self, dossier_id):
+        with self._verbinding() as db:
+            rijen = db.execute(
+                "SELECT b.vingerafdruk, u.uitspraak, u.kerntaak, u.werkproces, u.methode, u.fallback, u.similarity FROM uitspraken u "
+                "JOIN blokken b ON b.dossier_id = u.dossier_id AND b.kerntaak = u.kerntaak WHERE u.dossier_id = ? ORDER BY u.id",
+                (dossier_id,),
+            ).fetchall()
+        koppelingen = {}
+        for vingerafdruk, uitspraak, kerntaak, werkproces, methode, via_fallback, similarity in rijen:
+            koppelingen.setdefault(vingerafdruk, []).append((uitspraak, kerntaak, werkproces, methode, bool(via_fallback), similarity))
+        return koppelingen
+
+    # Koppelingen van een dossier als {kerntaak: {uitspraak: werkproces}}, voor het vergelijken van versies
+    def dossier_koppelingen(self, dossier_id):
+        with self._verbinding() as db:
+            rijen = db.execute("SELECT kerntaak, uitspraak, werkproces FROM uitspraken WHERE dossier_id = ? ORDER BY id", (dossier_id,)).fetchall()
+        koppelingen = {}
+        for kerntaak, uitspraak, werkproces in rijen:
+            koppelingen.setdefault(kerntaak, {})[uitspraak] = werkproces
+        return koppelingen
+
+    # Uitspraken en werkprocessen van een dossier in de vorm van de parser, bijv. om dossiers samen te voegen
+    def geparseerd_dossier(self, dossier_id):
+        with self._verbinding() as db:
+            uitspraken = db.execute("SELECT kerntaak, uitspraak FROM uitspraken WHERE dossier_id = ? ORDER BY id", (dossier_id,)).fetchall()
+            werkprocessen = db.execute(
+                "SELECT kerntaak, werkproces, beschrijving FROM werkprocessen WHERE dossier_id = ? ORDER BY rowid", (dossier_id,)
+            ).fetchall()
+        vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen = {}, {}, {}
+        for kerntaak, uitspraak in uitspraken:
+            vakkennis_dict.setdefault(kerntaak, []).append(uitspraak)
+        for kerntaak, werkproces, beschrijving in werkprocessen:
+            werkprocessen_dict.setdefault(kerntaak, []).append(werkproces)
+            if beschrijving is not None:
+                werkprocessen_beschrijvingen[werkproces] = beschrijving
+        return {"vakkennis_dict": vakkennis_dict, "werkprocessen_dict": werkprocessen_dict, "werkprocessen_beschrijvingen": werkprocessen_beschrijvingen}
+
+    # Aantal dossiers en uitspraken in de index
+    def statistieken(self):
+        with self._verbinding() as db:
+            dossiers = db.execute("SELECT COUNT(*) FROM dossiers").fetchone()[0]
+            uitspraken = db.execute("SELECT COUNT(*) FROM uitspraken").fetchone()[0]
+        return {"dossiers": dossiers, "uitspraken": uitspraken}
+
+    # Haal treffers op als (dossier, kerntaak, werkproces, uitspraak, score); alle woorden (AND), een exacte zin of een willekeurig woord (OR)
+    def _treffers(self, woorden, modus, limiet):
+        if self.fts:
+            if modus == "zin":
+                expressie = '"' + " ".join(woorden) + '"'
+            else:
+                expressie = (" OR " if modus == "vergelijkbaar" else " ").join(f'"{woord}"' for woord in woorden)
+            sql = (
+                "SELECT d.naam, u.kerntaak, u.werkproces, u.uitspraak, -bm25(uitspraken_fts) FROM uitspraken_fts "
+                "JOIN uitspraken u ON u.id = uitspraken_fts.rowid JOIN dossiers d ON d.id = u.dossier_id "
+                "WHERE uitspraken_fts MATCH ? ORDER BY bm25(uitspraken_fts) LIMIT ?"
+            )
+            parameters = (expressie, limiet)
+        else:
+            if modus == "zin":
+                voorwaarde, parameters = "u.uitspraak LIKE ?", ["%" + " ".join(woorden) + "%"]
+            else:
+                voorwaarde = (" OR " if modus == "vergelijkbaar" else " AND ").join("u.uitspraak LIKE ?" for _ in woorden)
+                parameters = [f"%{woord}%" for woord in woorden]
+            sql = (
+                "SELECT d.naam, u.kerntaak, u.werkproces, u.uitspraak, NULL FROM uitspraken u "
+                f"JOIN dossiers d ON d.id = u.dossier_id WHERE {voorwaarde} LIMIT ?"
+            )
+            parameters = (*parameters, limiet)
+        with self._verbinding() as db:
+            return db.execute(sql, parameters).fetchall()
+
+    # Zoek in alle dossiers; geeft een DataFrame met de treffers terug, beste eerst
+    def zoek(self, vraag, modus="woorden", limiet=100):
+        woorden = zoekwoorden(vraag)
+        if not woorden:
+            return pd.DataFrame(columns=ZOEK_KOLOMMEN)
+        if modus != "vergelijkbaar":
+            return pd.DataFrame(self._treffers(woorden, modus, limiet), columns=ZOEK_KOLOMMEN)
+
+        # Vergelijkbaar zoeken: kandidaten met minstens één gedeeld woord, opnieuw gescoord met TF-IDF cosine similarity
+        kandidaten = self._treffers(woorden, modus, INDEX_KANDIDATEN)
+        if not kandidaten:
+            return pd.DataFrame(columns=ZOEK_KOLOMMEN)
+        vraag_normalized = re.sub(r'[^\w\s]', '', vraag.lower())
+        teksten = [re.sub(r'[^\w\s]', '', kandidaat[3].lower()) for kandidaat in kandidaten]
+        from sklearn.feature_extraction.text import CountVectorizer
+        try:
+            vectorizer = CountVectorizer().fit(teksten + [vraag_normalized])
+        except ValueError:
+            return pd.DataFrame(columns=ZOEK_KOLOMMEN)  # Alleen woorden van één teken
+        scores = batch_similarities(vectorizer.transform([vraag_normalized]), vectorizer.transform(teksten))[0]
+        volgorde = [idx for idx in np.argsort(-scores, kind="stable")[:limiet] if scores[idx] > 0]
+        return pd.DataFrame([(*kandidaten[idx][:4], float(scores[idx])) for idx in volgorde], columns=ZOEK_KOLOMMEN)
+
+VERSCHIL_KOLOMMEN = ["Wijziging", "Uitspraak", "Kerntaak oud", "Kerntaak nieuw", "Werkproces oud", "Werkproces nieuw"]
+
+# Functie om de koppelingen van een analyseresultaat als {kerntaak: {uitspraak: werkproces}} op te halen
+def resultaat_koppelingen(resultaat):
+    werkprocessen = {}
+    if resultaat["kruistabel"] is not None:
+        werkprocessen = {(uitspraak, kerntaak): wp for uitspraak, kerntaak, wp, *_ in resultaat["kruistabel"].koppeling_details}
+    return {
+        kerntaak: {uitspraak: werkprocessen.get((uitspraak, kerntaak)) for uitspraak in uitspraken}
+        for kerntaak, uitspraken in resultaat["vakkennis_dict"].items()
+    }
+
+# Functie om twee versies van een dossier te vergelijken: toegevoegde, verwijderde en verplaatste uitspraken
+# (andere kerntaken) en uitspraken waarvan het gekoppelde werkproces binnen dezelfde kerntaak veranderd is
+def vergelijk_versies(oud, nieuw):
+    def plaatsen(koppelingen):
+        resultaat = {}
+        for kerntaak, uitspraken in koppelingen.items():
+            for uitspraak in uitspraken:
+                resultaat.setdefault(uitspraak, []).append(kerntaak)
+        return resultaat
+
+    def werkprocessen(koppelingen, uitspraak, kerntaken):
+        return ", ".join(koppelingen[kerntaak][uitspraak] or "" for kerntaak in kerntaken)
+
+    oude_plaatsen, nieuwe_plaatsen = plaatsen(oud), plaatsen(nieuw)
+    rijen = []
+    for uitspraak in sorted(set(oude_plaatsen) | set(nieuwe_plaatsen)):
+        oude_kerntaken, nieuwe_kerntaken = oude_plaatsen.get(uitspraak, []), nieuwe_plaatsen.get(uitspraak, [])
+        if not oude_kerntaken:
+            rijen.append(("toegevoegd", uitspraak, "", ", ".join(nieuwe_kerntaken), "", werkprocessen(nieuw, uitspraak, nieuwe_kerntaken)))
+        elif not nieuwe_kerntaken:
+            rijen.append(("verwijderd", uitspraak, ", ".join(oude_kerntaken), "", werkprocessen(oud, uitspraak, oude_kerntaken), ""))
+        elif set(oude_kerntaken) != set(nieuwe_kerntaken):
+            rijen.append((
+                "verplaatst", uitspraak, ", ".join(oude_kerntaken), ", ".join(nieuwe_kerntaken),
+                werkprocessen(oud, uitspraak, oude_kerntaken), werkprocessen(nieuw, uitspraak, nieuwe_kerntaken),
+            ))
+        else:
+            for kerntaak in nieuwe_kerntaken:
+                if oud[kerntaak][uitspraak] != nieuw[kerntaak][uitspraak]:
+                    rijen.append(("koppeling gewijzigd", uitspraak, kerntaak, kerntaak, oud[kerntaak][uitspraak] or "", nieuw[kerntaak][uitspraak] or ""))
+    return pd.DataFrame(rijen, columns=VERSCHIL_KOLOMMEN)
+
+# Functie om per kerntaakblok aan te geven of het ongewijzigd, gewijzigd, toegevoegd of verwijderd is
+def vergelijk_blokken(oude_vingerafdrukken, nieuwe_vingerafdrukken):
+    telling = {"ongewijzigd": 0, "gewijzigd": 0, "toegevoegd": 0, "verwijderd": 0}
+    for kerntaak in set(oude_vingerafdrukken) | set(nieuwe_vingerafdrukken):
+        if kerntaak not in oude_vingerafdrukken:
+            telling["toegevoegd"] += 1
+        elif kerntaak not in nieuwe_vingerafdrukken:
+            telling["verwijderd"] += 1
+        elif oude_vingerafdrukken[kerntaak] == nieuwe_vingerafdrukken[kerntaak]:
+            telling["ongewijzigd"] += 1
+        else:
+            telling["gewijzigd"] += 1
+    return telling
+
+# Map met het corpusmodel (vocabulaire en IDF over alle dossiers in de index)
+MODEL_DIR = os.environ.get("KRUISTABEL_MODEL_DIR") or os.path.join(DATA_DIR, "model")
+# Formaat van het corpusmodel op schijf; verhoog bij een wijziging in de opslag of de berekening
+MODEL_FORMAAT = "1"
+
+# Functie om een hash van een verzameling woorden te bepalen (voor het versioneren van het corpusmodel)
+def woorden_hash(woorden):
+    return hashlib.sha256("\n".join(sorted(woorden)).encode("utf-8")).hexdigest()
+
+# TF-IDF-model met een vaste vocabulaire en IDF, één keer gefit op alle dossiers in de index. De IDF staat als .npy
+# op schijf en wordt met memory-mapping geladen; koppelen is daarna alleen nog transform. De versie hangt af van de
+# stopwoorden en het corpus, zodat scores van hetzelfde model vergelijkbaar zijn tussen dossiers.
+class CorpusModel:
+    def __init__(self, termen, idf, meta):
+        self.termen = termen
+        self.idf = idf
+        self.meta = meta
+        self.vocabulaire = {term: idx for idx, term in enumerate(termen)}
+        from sklearn.feature_extraction.text import CountVectorizer
+        self._vectorizer = CountVectorizer(vocabulary=self.vocabulaire)
+
+    @property
+    def versie(self):
+        return self.meta["versie"]
+
+    # Tel de woorden van genormaliseerde teksten in de vaste vocabulaire; extra stopwoorden (bijv. werkproces-ID's) tellen niet mee
+    def transform(self, teksten, stopwoorden=()):
+        termen = self._vectorizer.transform(teksten)
+        weg = [self.vocabulaire[woord] for woord in stopwoorden if woord in self.vocabulaire]
+        if weg:
+            masker = np.ones(len(self.termen))
+            masker[weg] = 0
+            termen = (termen @ sparse.diags(masker)).tocsr()
+        return termen
+
+    # Cosine similarity tussen uitspraken en werkprocessen met de IDF van het corpus
+    def similarities(self, uitspraak_counts, werkproces_counts):
+        from sklearn.preprocessing import normalize
+        gewichten = sparse.diags(np.asarray(self.idf))
+        uitspraken = normalize(uitspraak_counts @ gewichten)
+        werkprocessen = normalize(werkproces_counts @ gewichten)
+        return (uitspraken @ werkprocessen.T).toarray()
+
+    # Fit vocabulaire en IDF op de index en sla het model op; elke unieke uitspraak en werkprocesbeschrijving per dossier is een document
+    @classmethod
+    def train(cls, index, pad=MODEL_DIR):
+        corpus_sleutel, aantal_dossiers, teksten, werkproces_ids = index.corpus()
+        if not teksten:
+            raise ValueError("De index bevat nog geen dossiers om een corpusmodel op te trainen.")
+        stopwoorden = set(STOPWOORDEN)
+        for wp in werkproces_ids:
+            stopwoorden.update(werkproces_stopwoorden(wp))
+        from sklearn.feature_extraction.text import CountVectorizer
+        vectorizer = CountVectorizer(stop_words=list(stopwoorden), min_df=1)
+        termen_matrix = vectorizer.fit_transform([re.sub(r'[^\w\s]', '', tekst.lower()) for tekst in teksten])
+        document_frequentie = np.bincount(termen_matrix.indices, minlength=termen_matrix.shape[1])
+        idf = np.log((1 + termen_matrix.shape[0]) / (1 + document_frequentie)) + 1  # Zelfde smoothing als TfidfVectorizer
+
+        stopwoorden_sleutel = woorden_hash(STOPWOORDEN)
+        meta = {
+            "formaat": MODEL_FORMAAT,
+            "versie": hashlib.sha256(f"{MODEL_FORMAAT}\0{stopwoorden_sleutel}\0{corpus_sleutel}".encode()).hexdigest()[:16],
+            "stopwoorden_hash": stopwoorden_sleutel,
+            "corpus_hash": corpus_sleutel,
+            "aantal_dossiers": aantal_dossiers,
+            "aantal_documenten": termen_matrix.shape[0],
+            "aantal_termen": termen_matrix.shape[1],
+            "getraind": datetime.now().isoformat(timespec="seconds"),
+        }
+        if not prive_map(pad):
+            raise PermissionError(f"De map van het corpusmodel ({pad}) is niet van deze gebruiker of door anderen beschrijfbaar.")
+        # Schrijf de bestanden eerst onder een tijdelijke naam; meta.json als laatste, zodat een lezer nooit een half model laadt
+        with open(os.path.join(pad, "idf.npy.tmp"), "wb") as f:
+            np.save(f, idf)
+        with open(os.path.join(pad, "termen.txt.tmp"), "w", encoding="utf-8") as f:
+            f.write("\n".join(vectorizer.get_feature_names_out()))
+        with open(os.path.join(pad, "meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        for naam in ("idf.npy", "termen.txt", "meta.json"):
+            os.replace(os.path.join(pad, naam + ".tmp"), os.path.join(pad, naam))
+        return laad_corpusmodel(pad)[0]
+
+# Functie om het corpusmodel te laden; geeft (model, None) of (None, melding) terug als er geen geldig model is
+def laad_corpusmodel(pad=MODEL_DIR):
+    if os.path.isdir(pad) and not prive_map(pad):
+        return None, f"De map van het corpusmodel ({pad}) is niet van deze gebruiker of door anderen beschrijfbaar; het model wordt niet geladen."
+    try:
+        with open(os.path.join(pad, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(pad, "termen.txt"), encoding="utf-8") as f:
+            termen = f.read().split("\n")
+        idf = np.load(os.path.join(pad, "idf.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None, "Er is nog geen corpusmodel getraind."
+    if meta.get("formaat") != MODEL_FORMAAT or len(termen) != len(idf) or len(idf) != meta.get("aantal_termen"):
+        return None, "Het corpusmodel heeft een verouderd of onvolledig formaat; train het opnieuw."
+    if meta.get("stopwoorden_hash") != woorden_hash(STOPWOORDEN):
+        return None, "De stopwoorden zijn gewijzigd sinds het trainen van het corpusmodel; train het opnieuw."
+    return CorpusModel(termen, idf, meta), None
+
+# Functie om te controleren of het corpusmodel nog bij de index past; geeft None of een waarschuwing terug.
+# Het model verandert niet vanzelf mee: na het toevoegen of vervangen van dossiers moet het opnieuw getraind worden.
+def corpusmodel_verouderd(model, index):
+    if model.meta["corpus_hash"] == index.corpus_hash():
+        return None
+    return (
+        f"Sinds het trainen van corpusmodel {model.versie} zijn er dossiers aan de index toegevoegd of vervangen; "
+        "er wordt gekoppeld met de vocabulaire en IDF van het oude corpus. Train het model opnieuw om ze mee te nemen."
+    )
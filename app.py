@@ -1,461 +1,610 @@
 import streamlit as st
-import pdfplumber
 import pandas as pd
-import re
-from io import BytesIO
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-# Functie om "Vakkennis en vaardigheden" en werkprocessen te extraheren
-def extract_vakkennis_en_werkprocessen(pdf_file):
-    vakkennis_dict = {}  # Voor kennis/vaardigheden per kerntaak
-    werkprocessen_dict = {}  # Voor werkprocessen per kerntaak
-    werkprocessen_beschrijvingen = {}  # Voor beschrijvingen van werkprocessen
-    current_kerntaak = None
-    in_vakkennis_block = False
-    in_werkproces_block = False
-    aanvullend_block = False
-    raw_text = []  # Voor debugging
-    current_uitspraak = ""  # Voor uitspraken die over meerdere regels lopen
-    current_werkproces = None  # Huidig werkproces
-    current_werkproces_beschrijving = ""  # Beschrijving van het huidige werkproces
-    debug_log = []  # Voor extra debugging-informatie
-    kerntaak_history = []  # Lijst om alle gedetecteerde kerntaken en hun posities bij te houden
-    current_section = None  # Houd bij of we in "Basisdeel" of "Profieldeel" zitten
-
-    # Regex voor kerntaken (zoals B1-K1, P2-K1)
-    kerntaak_pattern = re.compile(r"(B\d+-K\d+|P\d+-K\d+):")
-    # Regex voor werkprocessen (zoals B1-K1-W1)
-    werkproces_pattern = re.compile(r"(B\d+-K\d+-W\d+|P\d+-K\d+-W\d+):")
-    # Regex om ongewenste tekst (zoals "7 van 18" of "P2-K1 Organiseert...") te verwijderen
-    cleanup_pattern = re.compile(r"\d+ van \d+|(?:B|P)\d+-K\d+(?:-W\d+)?(?:[^\n]*Organiseert[^\n]*)?$")
-    target_words = ["heeft", "kan", "kent", "weet", "past", "bezit"]  # Aangepast om "bezit" toe te voegen
-    # Indicatoren om het einde van een "Vakkennis en vaardigheden"-blok te detecteren
-    end_block_indicators = [
-        "Complexiteit", "Verantwoordelijkheid en zelfstandigheid", "Omschrijving",
-        "Profieldeel", "Mbo-niveau", "Typering van het beroep", "Beroepsvereisten",
-        "Generieke onderdelen", "Inhoudsopgave", "Leeswijzer", "Overzicht van het kwalificatiedossier",
-        "Basisdeel", "Resultaat", "Gedrag"
-    ]
-    # Indicatoren om het einde van een werkprocesbeschrijving te detecteren
-    werkproces_end_indicators = [
-        "Complexiteit", "Verantwoordelijkheid en zelfstandigheid", "Omschrijving",
-        "Profieldeel", "Mbo-niveau", "Typering van het beroep", "Beroepsvereisten",
-        "Generieke onderdelen", "Inhoudsopgave", "Leeswijzer", "Overzicht van het kwalificatiedossier",
-        "Basisdeel", "Resultaat", "Gedrag", "Vakkennis en vaardigheden",
-        "Voor Metselaar geldt aanvullend:"
-    ]
+import os
+import importlib.util
+import threading
+import time
+import json
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from analyse import (
+    EXPORT_FORMATEN, MODEL_DIR, ZOEKWIJZEN, CorpusModel, Prestaties, ResultaatCache, UitspraakIndex, _init_taakworker, _voer_taak_uit,
+    analyseer_dossier, bouw_samengevoegde_kruistabel, cache_sleutel, corpusmodel_verouderd, excel_te_breed, exporteer_kruistabel, inhoud_hash, laad_corpusmodel, opwarmen,
+    procespool_context, profileer, resultaat_koppelingen, style_kruistabel, vergelijk_blokken, vergelijk_versies,
+)
+
+# Functie om een melding in de Streamlit-interface te tonen (niveau is "warning" of "error")
+def st_melding(niveau, tekst):
+    getattr(st, niveau)(tekst)
+
+# Eén gedeelde cache per serverproces (Streamlit voert het script bij elke interactie opnieuw uit)
+@st.cache_resource
+def get_resultaat_cache():
+    return ResultaatCache()
+
+# Maximaal aantal analyses dat tegelijk draait (standaard het aantal CPU-kernen) en aantal taken dat daarna nog mag wachten
+MAX_GELIJKTIJDIGE_ANALYSES = int(os.environ.get("KRUISTABEL_MAX_ANALYSES", 0)) or os.cpu_count() or 1
+WACHTRIJ_MAX = 32
+# Aantal afgeronde taken dat bewaard blijft zodat sessies die erop wachten het resultaat nog kunnen ophalen
+TAKEN_BEWAREN = 64
+# Aantal keer dat een taak na een workercrash opnieuw ingediend wordt voordat hij als mislukt telt
+MAX_HERKANSINGEN = 2
+# Zet op 0 om na het starten van de server niet op de achtergrond op te warmen
+OPWARMEN = os.environ.get("KRUISTABEL_OPWARMEN", "1") != "0"
+
+# Wordt gegooid als de wachtrij vol zit
+class WachtrijVol(Exception):
+    pass
+
+# Eén analyse in de achtergrond: status ("wachtend", "bezig", "klaar" of "mislukt"), voortgang in pagina's en het resultaat
+class Taak:
+    def __init__(self, sleutel, naam):
+        self.sleutel = sleutel
+        self.naam = naam
+        self.status = "wachtend"
+        self.klaar = 0
+        self.totaal = 0
+        self.aanvragers = 1  # Aantal sessies dat het resultaat nog moet ophalen (identieke uploads worden samengevoegd)
+        self.resultaat = None
+        self.fout = None
+        self.meldingen = []
+        self.stappen = []
+        self.gereed = threading.Event()
+        self.invoer = None  # Argumenten voor _voer_taak_uit, bewaard om de taak na een workercrash opnieuw in te dienen
+        self.pool = None  # Procespool waarin de taak nu draait of wacht, met de bijbehorende voortgangswachtrij
+        self.wachtrij = None
+        self.herkansingen = 0
+        self.verdacht = False  # Liep samen met andere taken tijdens een workercrash; draait daarna in een eigen pool
+        self.oorzaak = False  # Liep als enige tijdens een workercrash, of crashte in een eigen pool
+
+    @property
+    def percentage(self):
+        return 100 * self.klaar // self.totaal if self.totaal else 0
+
+# Gedeelde planner voor analyses: één procespool voor alle sessies met een begrensd aantal gelijktijdige analyses
+# en een begrensde wachtrij. Identieke uploads (zelfde cachesleutel) die nog lopen worden samengevoegd tot één taak.
+class TaakPlanner:
+    def __init__(self, max_gelijktijdig=MAX_GELIJKTIJDIGE_ANALYSES, max_wachtrij=WACHTRIJ_MAX, cache=None):
+        self.max_gelijktijdig = max_gelijktijdig
+        self.max_wachtrij = max_wachtrij
+        self.cache = cache
+        self._taken = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._wachtrij = None
+        self._apart = deque()  # Verdachte taken die na een workercrash één voor één in een eigen pool draaien
+        self._apart_taak = None
+
+    # Maak een procespool met een eigen voortgangswachtrij en de thread die die wachtrij verwerkt
+    def _nieuwe_pool(self, workers):
+        context = procespool_context()
+        wachtrij = context.Queue()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_taakworker, initargs=(wachtrij,))
+        threading.Thread(target=self._verwerk_voortgang, args=(wachtrij,), daemon=True).start()
+        return pool, wachtrij
+
+    # Start de gedeelde procespool bij de eerste taak (of na een gecrashte pool)
+    def _pool(self):
+        if self._executor is None:
+            self._executor, self._wachtrij = self._nieuwe_pool(self.max_gelijktijdig)
+        return self._executor
+
+    # Ruim een pool op die niet meer gebruikt wordt; None stopt de voortgangsthread
+    def _sluit_pool(self, pool, wachtrij):
+        pool.shutdown(wait=False)
+        wachtrij.put(None)
+
+    def _verwerk_voortgang(self, wachtrij):
+        while True:
+            bericht = wachtrij.get()
+            if bericht is None:
+                return
+            sleutel, klaar, totaal = bericht
+            # Onder de lock en alleen voor taken die nog niet gereed zijn: een late melding mag een afgeronde taak
+            # niet terugzetten naar "bezig", en meldingen uit een gecrashte pool gelden niet voor de nieuwe poging
+            with self._lock:
+                taak = self._taken.get(sleutel)
+                if taak is not None and not taak.gereed.is_set() and wachtrij is taak.wachtrij:
+                    taak.status = "bezig"
+                    taak.klaar, taak.totaal = klaar, totaal
+
+    # Taken die nog lopen of wachten; de aanroeper houdt de lock vast
+    def _actief(self):
+        return [taak for taak in self._taken.values() if not taak.gereed.is_set()]
+
+    @property
+    def actief(self):
+        with self._lock:
+            return self._actief()
+
+    # Positie van een wachtende taak in de wachtrij (1 = als eerste aan de beurt). Sessies roepen dit aan terwijl andere
+    # sessies taken toevoegen en opruimen, dus de taken worden onder de lock overgenomen.
+    def positie(self, taak):
+        with self._lock:
+            wachtend = [t for t in self._actief() if t.status == "wachtend"]
+        return wachtend.index(taak) + 1 if taak in wachtend else 0
+
+    # Dien een analyse in; een identieke lopende taak wordt hergebruikt. Gooit WachtrijVol als er te veel taken wachten.
+    # Met vorige worden de koppelingen van ongewijzigde kerntaakblokken uit een eerdere versie hergebruikt (zie bouw_kruistabel);
+    # met geheugen meet de worker de geheugenpiek per stap.
+    def dien_in(self, sleutel, pdf_bytes, naam, model=None, paginafilter=False, vorige=None, geheugen=False):
+        with self._lock:
+            taak = self._taken.get(sleutel)
+            if taak is not None and not taak.gereed.is_set():
+                taak.aanvragers += 1
+                return taak
+            actief = self._actief()
+            if len(actief) >= self.max_gelijktijdig + self.max_wachtrij:
+                raise WachtrijVol(f"De server is druk: er lopen of wachten al {len(actief)} analyses. Probeer het over een paar minuten opnieuw.")
+            taak = Taak(sleutel, naam)
+            self._taken[sleutel] = taak
+            self._taken.move_to_end(sleutel)
+            self._ruim_op()
+            taak.invoer = (pdf_bytes, model, paginafilter, vorige, geheugen)
+            future = self._dien_taak_in(taak)
+        future.add_done_callback(lambda f: self._afronden(taak, f))
+        return taak
+
+    # Aantal workers voor de PDF-extractie van een taak die nu ingediend wordt: de kernen van de plekken die de andere
+    # actieve taken vrijlaten, zodat één upload op een rustige server alle kernen gebruikt; de aanroeper houdt de lock vast
+    def _workers_voor_taak(self, taak):
+        vrij = max(1, self.max_gelijktijdig - sum(t is not taak for t in self._actief()))
+        return max(1, vrij * (os.cpu_count() or 1) // self.max_gelijktijdig)
+
+    # Zet een taak in de gedeelde pool, of in een opgegeven eigen pool; de aanroeper houdt de lock vast
+    def _dien_taak_in(self, taak, pool=None, wachtrij=None):
+        pdf_bytes, model, paginafilter, vorige, geheugen = taak.invoer
+        if pool is None:
+            pool, wachtrij = self._pool(), self._wachtrij
+        taak.pool, taak.wachtrij = pool, wachtrij
+        workers = self._workers_voor_taak(taak)
+        return taak.pool.submit(_voer_taak_uit, taak.sleutel, pdf_bytes, workers, model, paginafilter, vorige, geheugen)
+
+    # Start de volgende verdachte taak in een eigen pool als er geen apart draait; de aanroeper houdt de lock vast
+    def _start_apart(self):
+        if self._apart_taak is not None or not self._apart:
+            return None
+        taak = self._apart_taak = self._apart.popleft()
+        return taak, self._dien_taak_in(taak, *self._nieuwe_pool(1))
+
+    def _afronden(self, taak, future):
+        try:
+            taak.resultaat, taak.meldingen, taak.stappen = future.result()
+            status, fout = "klaar", None
+            if self.cache is not None and taak.resultaat["vakkennis_dict"]:
+                self.cache.put(taak.sleutel, taak.resultaat)
+        except BrokenProcessPool:
+            if self._opnieuw_indienen(taak):
+                return
+            status, fout = "mislukt", "Het verwerkingsproces is onverwacht gestopt (mogelijk te weinig geheugen)."
+        except Exception as e:
+            status, fout = "mislukt", f"Fout bij het verwerken van de PDF: {e}"
+        # Status en gereed samen onder de lock, zodat de voortgangsthread er niet tussendoor kan schrijven
+        volgende = None
+        with self._lock:
+            taak.status, taak.fout = status, fout
+            taak.invoer = None
+            if taak.aanvragers <= 0:
+                taak.resultaat = None  # Geen sessie wacht er meer op; een bruikbaar resultaat staat in de cache
+            taak.gereed.set()
+            if taak is self._apart_taak:
+                self._sluit_pool(taak.pool, taak.wachtrij)
+                self._apart_taak = None
+                volgende = self._start_apart()
+        if volgende is not None:
+            volgende[1].add_done_callback(lambda f: self._afronden(volgende[0], f))
+
+    # Een gecrashte worker (bijv. door geheugengebrek) maakt de hele pool kapot, waarna ook alle wachtende en andere
+    # lopende taken BrokenProcessPool krijgen. Wachtende taken gaan naar een nieuwe pool. Liep er maar één taak, dan is
+    # die de oorzaak en telt alleen die als mislukt; liepen er meer, dan draaien die daarna één voor één in een eigen
+    # pool, zodat alleen de taak die daar opnieuw crasht mislukt. Geeft True terug als de taak opnieuw is ingediend.
+    def _opnieuw_indienen(self, taak):
+        with self._lock:
+            if taak.pool is self._executor:
+                # Eerste melding van deze crash: bepaal wie er liep; de volgende indiening start een nieuwe pool
+                lopend = [t for t in self._taken.values() if t.pool is taak.pool and not t.gereed.is_set() and t.status == "bezig"]
+                for t in lopend:
+                    t.oorzaak = len(lopend) == 1
+                    t.verdacht = len(lopend) > 1
+                self._sluit_pool(self._executor, self._wachtrij)
+                self._executor = None
+            elif taak is self._apart_taak:
+                taak.oorzaak = True
+            if taak.oorzaak or taak.herkansingen >= MAX_HERKANSINGEN:
+                return False
+            taak.herkansingen += 1
+            taak.status = "wachtend"
+            taak.klaar = taak.totaal = 0
+            if taak.verdacht:
+                self._apart.append(taak)
+                gestart = self._start_apart()
+            else:
+                gestart = taak, self._dien_taak_in(taak)
+        if gestart is not None:
+            gestart[1].add_done_callback(lambda f: self._afronden(gestart[0], f))
+        return True
+
+    # Geef een sessie het resultaat van een taak en meld haar af; ook aanroepen als de sessie niet meer wacht (bijv. bij
+    # een rerun), want de taak laat het resultaat los zodra geen sessie het meer hoeft op te halen
+    def haal_resultaat(self, taak):
+        with self._lock:
+            resultaat = taak.resultaat
+            taak.aanvragers -= 1
+            if taak.aanvragers <= 0:
+                taak.resultaat = None
+        return resultaat
+
+    # Start de procespool alvast en laat de workers opwarmen, zodat de eerste upload niet op het opstarten wacht
+    def start_workers(self):
+        with self._lock:
+            pool = self._pool()
+        for _ in range(self.max_gelijktijdig):
+            pool.submit(opwarmen)
+
+    # Vergeet de oudste afgeronde taken zodra er meer dan TAKEN_BEWAREN zijn
+    def _ruim_op(self):
+        afgerond = [sleutel for sleutel, taak in self._taken.items() if taak.gereed.is_set()]
+        for sleutel in afgerond[:max(0, len(afgerond) - TAKEN_BEWAREN)]:
+            del self._taken[sleutel]
+
+# Eén planner per serverproces, gedeeld door alle sessies
+@st.cache_resource
+def get_taakplanner():
+    return TaakPlanner(cache=get_resultaat_cache())
+
+# Warm één keer per serverproces op: de workers van de taakplanner worden hier gestart en warmen zichzelf op,
+# dit proces importeert in een achtergrondthread zodat de eerste weergave er niet op wacht
+@st.cache_resource
+def start_opwarmen():
+    get_taakplanner().start_workers()
+    thread = threading.Thread(target=opwarmen, daemon=True)
+    thread.start()
+    return thread
+
+# Functie om in de interface op een taak te wachten met een voortgangsbalk; andere sessies lopen intussen gewoon door
+def wacht_op_taak(planner, taak):
+    balk = st.progress(0, text="Analyse in de wachtrij...")
+    while not taak.gereed.wait(0.25):
+        if taak.status == "wachtend":
+            balk.progress(0, text=f"In de wachtrij (positie {planner.positie(taak)})...")
+        else:
+            balk.progress(taak.percentage, text=f"Bezig: pagina {taak.klaar} van {taak.totaal} ({taak.percentage}%)")
+    balk.empty()
 
-    try:
-        with pdfplumber.open(pdf_file) as pdf:
-            full_text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += page_text + "\n"
-                    raw_text.append(page_text)
-
-            if not full_text.strip():
-                st.warning("Geen tekst gevonden in de PDF. Is het bestand leeg of gescand?")
-                return {}, {}, {}, raw_text, debug_log
-
-            # Splits de tekst in regels en verwerk ze
-            lines = full_text.split("\n")
-            for line_idx, line in enumerate(lines):
-                line = line.strip()
-                debug_log.append(f"Verwerk regel: {line}")
-
-                # Detecteer secties (Basisdeel of Profieldeel)
-                if "Basisdeel" in line:
-                    current_section = "Basisdeel"
-                    debug_log.append("Sectie gedetecteerd: Basisdeel")
-                    continue
-                if "Profieldeel" in line:
-                    current_section = "Profieldeel"
-                    debug_log.append("Sectie gedetecteerd: Profieldeel")
-                    continue
-
-                # Detecteer kerntaak
-                kerntaak_match = kerntaak_pattern.search(line)
-                if kerntaak_match:
-                    # Sla de huidige uitspraak op (indien aanwezig)
-                    if current_uitspraak and current_kerntaak and in_vakkennis_block:
-                        if any(current_uitspraak.startswith(word + " ") for word in target_words):
-                            cleaned_uitspraak = cleanup_pattern.sub("", current_uitspraak).strip()
-                            if cleaned_uitspraak not in vakkennis_dict[current_kerntaak]:
-                                vakkennis_dict[current_kerntaak].append(cleaned_uitspraak)
-                                debug_log.append(f"Uitspraak toegevoegd aan {current_kerntaak}: {cleaned_uitspraak}")
-                    # Sla de huidige werkprocesbeschrijving op (indien aanwezig)
-                    if current_werkproces and current_werkproces_beschrijving:
-                        werkprocessen_beschrijvingen[current_werkproces] = current_werkproces_beschrijving.strip()
-                        debug_log.append(f"Werkprocesbeschrijving toegevoegd aan {current_werkproces}: {current_werkproces_beschrijving}")
-                        if not current_werkproces_beschrijving.strip():
-                            debug_log.append(f"Waarschuwing: Geen beschrijving gevonden voor {current_werkproces}, gebruik titel als fallback")
-                            werkprocessen_beschrijvingen[current_werkproces] = current_werkproces
-                    current_uitspraak = ""
-                    current_werkproces = None
-                    current_werkproces_beschrijving = ""
-                    current_kerntaak = kerntaak_match.group(1)
-                    kerntaak_history.append((current_kerntaak, line_idx, current_section))
-                    if current_kerntaak not in vakkennis_dict:
-                        vakkennis_dict[current_kerntaak] = []
-                    if current_kerntaak not in werkprocessen_dict:
-                        werkprocessen_dict[current_kerntaak] = []
-                    debug_log.append(f"Nieuwe kerntaak gedetecteerd: {current_kerntaak} (sectie: {current_section})")
-                    in_vakkennis_block = False
-                    in_werkproces_block = False
-                    aanvullend_block = False
-                    continue
-
-                # Detecteer start van "Vakkennis en vaardigheden"
-                if "Vakkennis en vaardigheden" in line:
-                    # Zoek de meest recente kerntaak vóór deze regel
-                    relevant_kerntaak = None
-                    for kerntaak, idx, section in reversed(kerntaak_history):
-                        if idx < line_idx and section == current_section:
-                            relevant_kerntaak = kerntaak
-                            break
-                    if relevant_kerntaak:
-                        current_kerntaak = relevant_kerntaak
-                        in_vakkennis_block = True
-                        in_werkproces_block = False
-                        debug_log.append(f"Vakkennis en vaardigheden-blok gestart voor {current_kerntaak} (sectie: {current_section})")
-                    else:
-                        debug_log.append("Vakkennis en vaardigheden-blok gedetecteerd, maar geen relevante kerntaak gevonden")
-                    continue
-
-                # Detecteer werkproces
-                werkproces_match = werkproces_pattern.search(line)
-                if werkproces_match and current_kerntaak:
-                    # Sla de huidige werkprocesbeschrijving op (indien aanwezig)
-                    if current_werkproces and current_werkproces_beschrijving:
-                        werkprocessen_beschrijvingen[current_werkproces] = current_werkproces_beschrijving.strip()
-                        debug_log.append(f"Werkprocesbeschrijving toegevoegd aan {current_werkproces}: {current_werkproces_beschrijving}")
-                        if not current_werkproces_beschrijving.strip():
-                            debug_log.append(f"Waarschuwing: Geen beschrijving gevonden voor {current_werkproces}, gebruik titel als fallback")
-                            werkprocessen_beschrijvingen[current_werkproces] = current_werkproces
-                    current_werkproces_beschrijving = ""
-                    current_werkproces = werkproces_match.group(1)
-                    if current_kerntaak not in werkprocessen_dict:
-                        werkprocessen_dict[current_kerntaak] = []
-                    if current_werkproces not in werkprocessen_dict[current_kerntaak]:
-                        werkprocessen_dict[current_kerntaak].append(current_werkproces)
-                    in_werkproces_block = True
-                    in_vakkennis_block = False
-                    debug_log.append(f"Werkproces gedetecteerd: {current_werkproces} onder {current_kerntaak}")
-                    # Voeg de huidige regel (minus de ID) toe aan de beschrijving
-                    werkproces_title = line.replace(current_werkproces + ":", "").strip()
-                    if werkproces_title:
-                        current_werkproces_beschrijving += werkproces_title + " "
-                    continue
-
-                # Detecteer aanvullend blok
-                if "Voor Metselaar geldt aanvullend:" in line and current_kerntaak:
-                    aanvullend_block = True
-                    debug_log.append("Aanvullend blok voor Metselaar gestart")
-                    continue
-
-                # Detecteer einde van "Vakkennis en vaardigheden"-blok
-                if any(indicator in line for indicator in end_block_indicators):
-                    if current_uitspraak and current_kerntaak and in_vakkennis_block:
-                        if any(current_uitspraak.startswith(word + " ") for word in target_words):
-                            cleaned_uitspraak = cleanup_pattern.sub("", current_uitspraak).strip()
-                            if cleaned_uitspraak not in vakkennis_dict[current_kerntaak]:
-                                vakkennis_dict[current_kerntaak].append(cleaned_uitspraak)
-                                debug_log.append(f"Uitspraak toegevoegd aan {current_kerntaak}: {cleaned_uitspraak}")
-                    current_uitspraak = ""
-                    in_vakkennis_block = False
-                    aanvullend_block = False
-                    debug_log.append(f"Vakkennis en vaardigheden-blok beëindigd door indicator: {line}")
-                    continue
-
-                # Detecteer einde van werkprocesbeschrijving
-                if in_werkproces_block and any(indicator in line for indicator in werkproces_end_indicators):
-                    if current_werkproces and current_werkproces_beschrijving:
-                        werkprocessen_beschrijvingen[current_werkproces] = current_werkproces_beschrijving.strip()
-                        debug_log.append(f"Werkprocesbeschrijving toegevoegd aan {current_werkproces}: {current_werkproces_beschrijving}")
-                        if not current_werkproces_beschrijving.strip():
-                            debug_log.append(f"Waarschuwing: Geen beschrijving gevonden voor {current_werkproces}, gebruik titel als fallback")
-                            werkprocessen_beschrijvingen[current_werkproces] = current_werkproces
-                    current_werkproces_beschrijving = ""
-                    in_werkproces_block = False
-                    continue
-
-                # Verwerk werkprocesbeschrijving
-                if in_werkproces_block and current_werkproces:
-                    if line and not line.isspace():  # Alleen niet-lege regels toevoegen
-                        current_werkproces_beschrijving += " " + line
-
-                # Verwerk kennis/vaardigheden
-                if in_vakkennis_block and current_kerntaak:
-                    cleaned_line = line.lstrip("-§ ").strip()
-                    if not cleaned_line:  # Lege regel, sla op en reset
-                        if current_uitspraak:
-                            if any(current_uitspraak.startswith(word + " ") for word in target_words):
-                                cleaned_uitspraak = cleanup_pattern.sub("", current_uitspraak).strip()
-                                if cleaned_uitspraak not in vakkennis_dict[current_kerntaak]:
-                                    vakkennis_dict[current_kerntaak].append(cleaned_uitspraak)
-                                    debug_log.append(f"Uitspraak toegevoegd aan {current_kerntaak}: {cleaned_uitspraak}")
-                            current_uitspraak = ""
-                        continue
-
-                    # Controleer of de regel begint met een target-woord
-                    if any(cleaned_line.startswith(word + " ") for word in target_words):
-                        # Sla de vorige uitspraak op (indien aanwezig)
-                        if current_uitspraak:
-                            if any(current_uitspraak.startswith(word + " ") for word in target_words):
-                                cleaned_uitspraak = cleanup_pattern.sub("", current_uitspraak).strip()
-                                if cleaned_uitspraak not in vakkennis_dict[current_kerntaak]:
-                                    vakkennis_dict[current_kerntaak].append(cleaned_uitspraak)
-                                    debug_log.append(f"Uitspraak toegevoegd aan {current_kerntaak}: {cleaned_uitspraak}")
-                        current_uitspraak = cleaned_line
-                    else:
-                        # Voeg toe aan de huidige uitspraak (voor meerregelige uitspraken)
-                        if current_uitspraak:
-                            current_uitspraak += " " + cleaned_line
-
-            # Sla de laatste uitspraak op
-            if current_uitspraak and current_kerntaak and in_vakkennis_block:
-                if any(current_uitspraak.startswith(word + " ") for word in target_words):
-                    cleaned_uitspraak = cleanup_pattern.sub("", current_uitspraak).strip()
-                    if cleaned_uitspraak not in vakkennis_dict[current_kerntaak]:
-                        vakkennis_dict[current_kerntaak].append(cleaned_uitspraak)
-                        debug_log.append(f"Laatste uitspraak toegevoegd aan {current_kerntaak}: {cleaned_uitspraak}")
-
-            # Sla de laatste werkprocesbeschrijving op
-            if current_werkproces and current_werkproces_beschrijving:
-                werkprocessen_beschrijvingen[current_werkproces] = current_werkproces_beschrijving.strip()
-                debug_log.append(f"Laatste werkprocesbeschrijving toegevoegd aan {current_werkproces}: {current_werkproces_beschrijving}")
-                if not current_werkproces_beschrijving.strip():
-                    debug_log.append(f"Waarschuwing: Geen beschrijving gevonden voor {current_werkproces}, gebruik titel als fallback")
-                    werkprocessen_beschrijvingen[current_werkproces] = current_werkproces
-
-    except Exception as e:
-        st.error(f"Fout bij het verwerken van de PDF: {e}")
-        return {}, {}, {}, raw_text, debug_log
-
-    return vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, raw_text, debug_log
-
-# Functie om kruistabel te maken, inclusief werkprocessen
-def create_kruistabel(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen):
-    if not vakkennis_dict:
-        return None, None, ["Geen vakkennis_dict beschikbaar"]
-
-    # Verzamel alle kerntaken en werkprocessen
-    kerntaken = list(vakkennis_dict.keys())
-    alle_werkprocessen = []
-    for kerntaak in werkprocessen_dict:
-        alle_werkprocessen.extend(werkprocessen_dict[kerntaak])
-    alle_werkprocessen = sorted(list(set(alle_werkprocessen)))  # Unieke werkprocessen, gesorteerd
-
-    # Verzamel alle unieke uitspraken
-    uitspraken = []
-    for kerntaak in vakkennis_dict:
-        for uitspraak in vakkennis_dict[kerntaak]:
-            if uitspraak not in uitspraken:
-                uitspraken.append(uitspraak)
-
-    # Sorteer de uitspraken alfabetisch
-    uitspraken.sort()
-
-    # Maak een DataFrame met zowel weergave- als sorteerdata
-    display_data = {"Uitspraak": uitspraken}
-    sort_data = {"Uitspraak": uitspraken}  # Voor sortering
-
-    # Voeg kolommen toe voor kerntaken
-    for kerntaak in kerntaken:
-        display_data[kerntaak] = ["×" if uitspraak in vakkennis_dict[kerntaak] else "" for uitspraak in uitspraken]
-        sort_data[kerntaak] = [1 if uitspraak in vakkennis_dict[kerntaak] else 0 for uitspraak in uitspraken]
-
-    # Voeg kolommen toe voor werkprocessen
-    for werkproces in alle_werkprocessen:
-        display_data[werkproces] = [""] * len(uitspraken)
-        sort_data[werkproces] = [0] * len(uitspraken)
-
-    # Lijst om koppelingen op te slaan voor debugging
-    koppelingen_log = []
-    # Dictionary om fallback-koppelingen bij te houden: {uitspraak: werkproces}
-    fallback_koppelingen = {}
-
-    # Dynamische stopwoorden genereren op basis van werkproces-ID's
-    stopwoorden = {
-        "en", "de", "het", "een", "voor", "met", "in", "op", "aan", "van", "bij", "is", "zijn",
-        "hij", "zo", "nodig", "of", "werkplek", "allround", "metselaar", "voor", "n", "v", "t",
-        "volgens", "aanbrengen", "materialen", "middelen", "veiligheidsregels", "voorschriften",
-        "wettelijke", "richtlijnen", "gedrag", "resultaat", "omschrijving", "voor", "metselaar",
-        "geldt", "aanvullend", "de", "onderliggende", "competenties", "zijn", "toepassen"
-    }
-    for wp in alle_werkprocessen:
-        stopwoorden.add(wp.lower())  # Voeg werkproces-ID's toe als stopwoorden
-        stopwoorden.add(wp.lower().replace("-", ""))  # Voeg ook zonder streepjes toe (bijv. "b1k1w1")
-
-    # Extraheer trefwoorden uit werkprocesbeschrijvingen voor de fallback
-    werkproces_trefwoorden = {}
-    for werkproces in alle_werkprocessen:
-        beschrijving = werkprocessen_beschrijvingen.get(werkproces, werkproces)
-        # Normaliseer de tekst: verwijder leestekens en converteer naar lowercase
-        beschrijving = re.sub(r'[^\w\s]', '', beschrijving.lower())
-        woorden = beschrijving.split()
-        trefwoorden = [woord for woord in woorden if woord not in stopwoorden and len(woord) > 3]
-        werkproces_trefwoorden[werkproces] = trefwoorden
-
-    # Voor contextuele fallback: geef prioriteit aan werkprocessen met bepaalde trefwoorden
-    contextuele_prioriteiten = {
-        "veiligheid": ["B1-K1-W1", "B1-K1-W8", "B1-K2-W1", "B1-K2-W5"],  # Werkplek inrichten en opruimen
-        "voegwerk": ["B1-K1-W5", "B1-K1-W6"],  # Gevel voegrijp maken en voegwerk aanbrengen
-        "spouwmuren": ["B1-K1-W3", "B1-K1-W4", "B1-K2-W4"],  # Maken van metselwerk, bouwkundige voorzieningen, maken van lijmwerk
-        "tijdelijke ondersteuningen": ["B1-K1-W2", "B1-K1-W3", "B1-K2-W2", "B1-K2-W4"],  # Stelwerk en maken van constructies
-        "kim": ["B1-K2-W2"],  # Stellen van de kim
-    }
+# Eén gedeelde index per serverproces
+@st.cache_resource
+def get_uitspraak_index():
+    return UitspraakIndex()
 
-    # Koppel uitspraken aan werkprocessen
-    vectorizer = TfidfVectorizer(stop_words=list(stopwoorden), min_df=1)
-    fallback_counter = {wp: 0 for wp in alle_werkprocessen}  # Voor ronde-robin fallback
-    for kerntaak in kerntaken:
-        if kerntaak not in werkprocessen_dict or not werkprocessen_dict[kerntaak]:
-            koppelingen_log.append(f"Geen werkprocessen voor kerntaak {kerntaak}")
-            continue  # Geen werkprocessen voor deze kerntaak
-
-        # Verzamel alle uitspraken voor deze kerntaak
-        kerntaak_uitspraken = vakkennis_dict[kerntaak]
-        # Verzamel alle werkprocessen voor deze kerntaak
-        kerntaak_werkprocessen = werkprocessen_dict[kerntaak]
-        # Verzamel de beschrijvingen van de werkprocessen
-        werkproces_texts = [werkprocessen_beschrijvingen.get(wp, wp) for wp in kerntaak_werkprocessen]
-        # Normaliseer de werkprocesbeschrijvingen
-        werkproces_texts = [re.sub(r'[^\w\s]', '', text.lower()) for text in werkproces_texts]
-
-        for uitspraak in kerntaak_uitspraken:
-            # Normaliseer de uitspraak
-            uitspraak_normalized = re.sub(r'[^\w\s]', '', uitspraak.lower())
-            # Maak een lijst van teksten: de uitspraak + alle werkprocesbeschrijvingen
-            texts = [uitspraak_normalized] + werkproces_texts
-            best_werkproces = None
-            used_fallback = False
-
-            # Probeer tekstanalyse
-            try:
-                tfidf_matrix = vectorizer.fit_transform(texts)
-                similarities = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:])[0]
-                max_similarity = max(similarities)
-                if max_similarity > 0.1:  # Verlaagde drempelwaarde voor een goede match
-                    best_match_idx = similarities.argmax()
-                    best_werkproces = kerntaak_werkprocessen[best_match_idx]
-                    koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (similarity: {max_similarity}, scores: {list(similarities)})")
-                else:
-                    # Geen goede match, gebruik fallback
-                    used_fallback = True
-            except ValueError as e:
-                # Tekstanalyse mislukt (bijvoorbeeld door lege teksten), gebruik fallback
-                used_fallback = True
-                koppelingen_log.append(f"Tekstanalyse mislukt voor {uitspraak}: {str(e)}")
-
-            # Fallback: gebruik trefwoorden om een werkproces te kiezen
-            if used_fallback:
-                uitspraak_woorden = [woord for woord in uitspraak_normalized.split() if woord not in stopwoorden and len(woord) > 3]
-                beste_score = 0
-                best_werkproces = None
-
-                # Contextuele check: geef prioriteit aan werkprocessen met relevante trefwoorden
-                for context_trefwoord, prioriteit_werkprocessen in contextuele_prioriteiten.items():
-                    if context_trefwoord in uitspraak_normalized:
-                        for wp in prioriteit_werkprocessen:
-                            if wp in kerntaak_werkprocessen:
-                                best_werkproces = wp
-                                beste_score = 100  # Hoge score om prioriteit te geven
-                                koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (contextuele prioriteit: {context_trefwoord})")
-                                break
-                        if best_werkproces:
-                            break
-
-                # Als er geen contextuele match is, gebruik trefwoordovereenkomst
-                if not best_werkproces:
-                    for wp in kerntaak_werkprocessen:
-                        trefwoorden = werkproces_trefwoorden.get(wp, [])
-                        score = sum(1 for woord in uitspraak_woorden if woord in trefwoorden)
-                        if score > beste_score:
-                            beste_score = score
-                            best_werkproces = wp
-
-                # Als er nog steeds geen match is, gebruik ronde-robin om werkprocessen te verdelen
-                if not best_werkproces or beste_score == 0:
-                    # Kies het werkproces met de minste toewijzingen (ronde-robin)
-                    werkproces_counts = {wp: fallback_counter[wp] for wp in kerntaak_werkprocessen}
-                    best_werkproces = min(werkproces_counts, key=werkproces_counts.get)
-                    koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (fallback, ronde-robin, geen trefwoordmatch)")
-                else:
-                    koppelingen_log.append(f"Koppel {uitspraak} aan {best_werkproces} (fallback, trefwoordscore: {beste_score})")
-
-                fallback_koppelingen[uitspraak] = best_werkproces
-                fallback_counter[best_werkproces] += 1
-
-            # Markeer de uitspraak in de kolom van het beste werkproces
-            uitspraak_idx = uitspraken.index(uitspraak)
-            display_data[best_werkproces][uitspraak_idx] = "×"
-            sort_data[best_werkproces][uitspraak_idx] = 1
-
-    # Maak DataFrames
-    display_df = pd.DataFrame(display_data)
-    sort_df = pd.DataFrame(sort_data)
-
-    # Maak een stijltoepassing om fallback-koppelingen geel te markeren
-    def highlight_fallback(val, row_idx, col_name):
-        uitspraak = display_df.iloc[row_idx]["Uitspraak"]
-        if val == "×" and col_name in alle_werkprocessen:  # Controleer alleen werkproceskolommen
-            if uitspraak in fallback_koppelingen and fallback_koppelingen[uitspraak] == col_name:
-                return "background-color: yellow"
-        return ""
-
-    # Pas de stijl toe op de DataFrame
-    styled_df = display_df.style.apply(
-        lambda x: [highlight_fallback(x[col], idx, col) for idx, col in enumerate(display_df.columns)],
-        axis=1
-    )
+@st.cache_resource(max_entries=1)
+def _laad_corpusmodel_gecached(pad, gewijzigd):
+    return laad_corpusmodel(pad)
 
-    return styled_df, sort_df, koppelingen_log
+# Eén geladen corpusmodel per serverproces; wordt opnieuw geladen zodra het model op schijf opnieuw getraind is
+def get_corpusmodel(pad=MODEL_DIR):
+    try:
+        gewijzigd = os.stat(os.path.join(pad, "meta.json")).st_mtime_ns
+    except OSError:
+        return None, "Er is nog geen corpusmodel getraind."
+    return _laad_corpusmodel_gecached(pad, gewijzigd)
+
+# Functie om een export op aanvraag te maken voor een downloadknop; de duur wordt als losse meting gelogd
+def maak_export(kruistabel, formaat, **context):
+    def export():
+        prestaties = Prestaties()
+        with prestaties.stap("export", formaat=formaat, rijen=len(kruistabel.uitspraken), kolommen=len(kruistabel.kolommen)) as tellers:
+            data = exporteer_kruistabel(kruistabel, formaat)
+            tellers["bytes"] = data.getbuffer().nbytes
+        prestaties.schrijf(**context)
+        return data
+    return export
+
+# Functie om per exportformaat te bepalen waarom het niet kan (None = wel mogelijk): een te brede tabel voor Excel
+# of een ontbrekend pyarrow voor Parquet
+def export_onmogelijk(kruistabel):
+    return {
+        "xlsx": excel_te_breed(kruistabel),
+        "csv": None,
+        "parquet": None if importlib.util.find_spec("pyarrow") else "Parquet-export vereist pyarrow (pip install pyarrow).",
+    }
 
-# Streamlit-interface
-def main():
+# Functie om een downloadknop per exportformaat te tonen; het bestand wordt pas gemaakt als er op de knop wordt geklikt.
+# Kan een formaat niet, dan staat die knop uit met de reden als uitleg.
+def toon_downloadknoppen(kruistabel, bestandsnaam, **context):
+    onmogelijk = export_onmogelijk(kruistabel)
+    for kolom, (formaat, (extensie, mime, label)) in zip(st.columns(len(EXPORT_FORMATEN)), EXPORT_FORMATEN.items()):
+        uit = onmogelijk[formaat] is not None
+        kolom.download_button(
+            label=label,
+            data=b"" if uit else maak_export(kruistabel, formaat, **context),
+            file_name=f"{bestandsnaam}{extensie}",
+            mime=mime,
+            on_click="ignore",
+            disabled=uit,
+            help=onmogelijk[formaat],
+        )
+
+# Streamlit-pagina voor het analyseren van één dossier
+def analyse_pagina():
     st.title("Kwalificatiedossier Analyse")
     st.write("Upload een PDF-bestand van een kwalificatiedossier om een kruistabel te genereren.")
 
     # Bestandsupload
     uploaded_file = st.file_uploader("Kies een PDF-bestand", type="pdf")
+    kolom_prestaties, kolom_profiel, kolom_model, kolom_filter = st.columns(4)
+    toon_prestaties = kolom_prestaties.checkbox("Toon prestaties", help="Tijd, CPU en geheugenpiek (tracemalloc) per verwerkingsstap; het geheugen wordt gemeten bij een nieuwe analyse")
+    profiel_opnemen = kolom_profiel.checkbox("Profiel opnemen", help="Verwerkt het bestand opnieuw (zonder cache) onder een profiler")
+    corpusmodel_gebruiken = kolom_model.checkbox("Corpusmodel gebruiken", help="Koppel met de vocabulaire en IDF van alle dossiers in de index (train het model op de pagina Zoeken)")
+    paginafilter = kolom_filter.checkbox("Alleen kerntaakpagina's", help="Lees alleen de hoofdstukken met kerntaken en werkprocessen volgens de bladwijzers van de PDF (zonder bladwijzers worden alle pagina's gelezen)")
 
     if uploaded_file is not None:
-        # Verwerk het geüploade bestand
-        vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, raw_text, debug_log = extract_vakkennis_en_werkprocessen(uploaded_file)
-
-        if vakkennis_dict:
-            styled_df, sort_df, koppelingen_log = create_kruistabel(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen)
-            if styled_df is not None and not styled_df.data.empty:
-                # Toon de kruistabel
-                st.write("### Kruistabel")
-                st.write("Klik op een kolomkop om te sorteren (oplopend/aflopend). Gele cellen geven aan dat de koppeling via een fallback is gemaakt (geen sterke tekstmatch).")
-                st.dataframe(
-                    styled_df,
-                    use_container_width=True,
-                    column_config={
-                        col: st.column_config.Column(
-                            help=f"Klik om te sorteren op {col}" if col != "Uitspraak" else None
-                        ) for col in styled_df.data.columns
-                    }
-                )
-
-                # Downloadknop voor Excel
-                output = BytesIO()
-                styled_df.data.to_excel(output, index=False)
-                output.seek(0)
-                st.download_button(
-                    label="Download Excel-bestand",
-                    data=output,
-                    file_name="kruistabel_kwalificatiedossier.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        prestaties = Prestaties()
+        profiel = None
+        model = None
+        # Eerdere versie om mee te vergelijken: standaard de nieuwste eerdere analyse met dezelfde bestandsnaam
+        index = get_uitspraak_index()
+        inhoud_sleutel = inhoud_hash(uploaded_file.getvalue())
+        eerdere_versies = [dossier for dossier in index.dossiers() if dossier["inhoud_hash"] != inhoud_sleutel]
+        standaard_versie = index.vorige_versie(uploaded_file.name, inhoud_sleutel, dossiers=eerdere_versies)
+        eerdere_versie = st.selectbox(
+            "Vergelijk met eerdere versie",
+            [None] + eerdere_versies,
+            index=eerdere_versies.index(standaard_versie) + 1 if standaard_versie else 0,
+            format_func=lambda dossier: "Niet vergelijken" if dossier is None else f"{dossier['naam']} ({dossier['toegevoegd']})",
+            help="Ongewijzigde kerntaakblokken nemen hun koppelingen over uit deze versie; de verschillen worden onder de kruistabel getoond",
+        )
+        if corpusmodel_gebruiken:
+            model, model_melding = get_corpusmodel()
+            if model is None:
+                st.warning(f"{model_melding} De kruistabel wordt zonder corpusmodel gemaakt.")
+            else:
+                st.caption(f"Corpusmodel {model.versie}: {model.meta['aantal_termen']} termen uit {model.meta['aantal_dossiers']} dossiers")
+                verouderd = corpusmodel_verouderd(model, index)
+                if verouderd:
+                    st.warning(verouderd)
+        # Haal het resultaat uit de cache of verwerk het geüploade bestand
+        cache = get_resultaat_cache()
+        sleutel = cache_sleutel(uploaded_file.getvalue(), model.versie if model else None, paginafilter)
+        with prestaties.stap("cache_opzoeken"):
+            resultaat = None if profiel_opnemen else cache.get(sleutel)
+        cache_hit = resultaat is not None
+        # De opgeslagen koppelingen van de eerdere versie zijn alleen nodig voor een nieuwe analyse
+        vorige = index.vorige_koppelingen(eerdere_versie["id"]) if eerdere_versie and not cache_hit else None
+        if resultaat is None and profiel_opnemen:
+            # Profileren moet in dit proces gebeuren, dus niet via de achtergrondplanner; tracemalloc staat alleen aan tijdens deze run
+            analyse_prestaties = Prestaties(geheugen=True)
+            try:
+                resultaat, *profiel = profileer(analyseer_dossier, uploaded_file, melding=st_melding, prestaties=analyse_prestaties, model=model, paginafilter=paginafilter, vorige=vorige)
+            finally:
+                analyse_prestaties.stop()
+            prestaties.stappen.extend(analyse_prestaties.stappen)
+            if resultaat["vakkennis_dict"]:
+                cache.put(sleutel, resultaat)
+        elif resultaat is None:
+            # Analyseer in de gedeelde procespool; een identieke upload die al loopt wordt samengevoegd
+            planner = get_taakplanner()
+            try:
+                taak = planner.dien_in(
+                    sleutel, uploaded_file.getvalue(), uploaded_file.name, model=model, paginafilter=paginafilter, vorige=vorige, geheugen=toon_prestaties,
                 )
+            except WachtrijVol as e:
+                st.warning(str(e))
+                return
+            try:
+                wacht_op_taak(planner, taak)
+            finally:
+                resultaat = planner.haal_resultaat(taak)
+            if taak.status == "mislukt":
+                st.error(taak.fout)
+                return
+            prestaties.stappen.extend(taak.stappen)
+            for niveau, tekst in taak.meldingen:
+                st_melding(niveau, tekst)
+        # Voeg een nieuw geanalyseerd dossier toe aan de index voor zoeken over alle dossiers; een cachetreffer is bij zijn eerste analyse al geïndexeerd
+        if not cache_hit and resultaat["vakkennis_dict"]:
+            with prestaties.stap("indexeren") as tellers:
+                tellers["nieuw"] = index.voeg_toe(inhoud_sleutel, uploaded_file.name, resultaat)
+
+        stats = cache.stats
+        st.caption(f"Cache: {stats['geheugen_hits']} treffers in geheugen, {stats['schijf_hits']} op schijf, {stats['misses']} missers")
+
+        if resultaat["vakkennis_dict"]:
+            kruistabel = resultaat["kruistabel"]
+            if kruistabel is not None and not kruistabel.leeg:
+                with prestaties.stap("weergave", rijen=len(kruistabel.uitspraken), kolommen=len(kruistabel.kolommen)):
+                    styled_df = style_kruistabel(kruistabel.display_df, kruistabel.fallback_masker)
+                    # Toon de kruistabel
+                    st.write("### Kruistabel")
+                    st.write("Klik op een kolomkop om te sorteren (oplopend/aflopend). Gele cellen geven aan dat de koppeling via een fallback is gemaakt (geen sterke tekstmatch).")
+                    st.dataframe(
+                        styled_df,
+                        width="stretch",
+                        column_config={
+                            col: st.column_config.Column(
+                                help=f"Klik om te sorteren op {col}" if col != "Uitspraak" else None
+                            ) for col in styled_df.data.columns
+                        }
+                    )
+
+                toon_downloadknoppen(kruistabel, "kruistabel_kwalificatiedossier", bestand=uploaded_file.name, sleutel=sleutel[:16])
+                if eerdere_versie:
+                    toon_verschillen(index, eerdere_versie, resultaat)
             else:
                 st.warning("Geen geldige gegevens gevonden in het PDF-bestand.")
         else:
             st.warning("Geen 'Vakkennis en vaardigheden'-blokken gevonden in de PDF.")
 
+        context = {"bestand": uploaded_file.name, "sleutel": sleutel[:16], "cache_hit": cache_hit, "paginas": resultaat["aantal_paginas"]}
+        if not cache_hit:
+            # Alleen echte analyses loggen; een rerun met een cachetreffer (bijv. na elke klik op een widget) schrijft niets
+            prestaties.schrijf(**context)
+        if toon_prestaties or profiel:
+            with st.expander("Prestaties", expanded=True):
+                st.dataframe(pd.DataFrame(prestaties.stappen), hide_index=True)
+                st.download_button(
+                    label="Download metingen (JSON)",
+                    data=json.dumps(prestaties.als_record(**context), ensure_ascii=False, indent=2),
+                    file_name="prestaties.json",
+                    mime="application/json"
+                )
+                if profiel:
+                    profiel_data, profiel_naam, profiel_mime = profiel
+                    st.download_button(label="Download profiel", data=profiel_data, file_name=profiel_naam, mime=profiel_mime)
+
+# Functie om de verschillen met een eerdere versie van het dossier te tonen: per kerntaakblok en per uitspraak
+def toon_verschillen(index, eerdere_versie, resultaat):
+    st.write(f"### Verschillen met {eerdere_versie['naam']} ({eerdere_versie['toegevoegd']})")
+    blokken = vergelijk_blokken(index.vingerafdrukken(eerdere_versie["id"]), resultaat["vingerafdrukken"])
+    st.caption(
+        f"Kerntaakblokken: {blokken['ongewijzigd']} ongewijzigd, {blokken['gewijzigd']} gewijzigd, "
+        f"{blokken['toegevoegd']} toegevoegd, {blokken['verwijderd']} verwijderd"
+    )
+    verschillen = vergelijk_versies(index.dossier_koppelingen(eerdere_versie["id"]), resultaat_koppelingen(resultaat))
+    if verschillen.empty:
+        st.info("Geen verschillen in uitspraken of koppelingen.")
+        return
+    st.dataframe(verschillen, hide_index=True, width="stretch")
+    st.download_button(
+        label="Download verschillen (CSV)",
+        data=verschillen.to_csv(index=False).encode("utf-8-sig"),
+        file_name="verschillen_kruistabel.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
+
+# Streamlit-pagina voor zoeken in de uitspraken van alle geanalyseerde dossiers
+def zoek_pagina():
+    st.title("Zoeken in alle dossiers")
+    index = get_uitspraak_index()
+    statistieken = index.statistieken()
+    st.write(
+        f"De index bevat {statistieken['dossiers']} dossiers met {statistieken['uitspraken']} uitspraken. "
+        "Elk dossier dat in de app of met batch.py wordt geanalyseerd, wordt automatisch toegevoegd."
+    )
+    vraag = st.text_input("Zoek op uitspraak", placeholder="bijv. kent de eigenschappen van metselmortel")
+    modus = st.radio("Zoekwijze", list(ZOEKWIJZEN), format_func=ZOEKWIJZEN.get, horizontal=True)
+    if vraag:
+        toon_zoekresultaten(index, vraag, modus)
+
+    # Corpusmodel: vocabulaire en IDF over alle dossiers in de index, voor vergelijkbare scores tussen dossiers
+    st.write("### Corpusmodel")
+    model, model_melding = get_corpusmodel()
+    if model is None:
+        st.write(model_melding)
+    else:
+        st.write(
+            f"Versie {model.versie}, getraind op {model.meta['getraind']}: {model.meta['aantal_termen']} termen "
+            f"uit {model.meta['aantal_documenten']} teksten in {model.meta['aantal_dossiers']} dossiers."
+        )
+        verouderd = corpusmodel_verouderd(model, index)
+        if verouderd:
+            st.warning(verouderd)
+    if st.button("Corpusmodel trainen", disabled=not statistieken["dossiers"]):
+        try:
+            with st.spinner("Corpusmodel trainen..."):
+                model = CorpusModel.train(index)
+        except PermissionError as e:
+            st.error(str(e))
+        else:
+            st.success(f"Corpusmodel {model.versie} getraind: {model.meta['aantal_termen']} termen.")
+
+# Functie om de treffers van een zoekopdracht te tonen, samengevat per dossier en kerntaak
+def toon_zoekresultaten(index, vraag, modus):
+    start = time.perf_counter()
+    resultaten = index.zoek(vraag, modus=modus)
+    duur_ms = (time.perf_counter() - start) * 1000
+    if resultaten.empty:
+        st.info("Geen uitspraken gevonden.")
+        return
+    st.caption(f"{len(resultaten)} treffers in {resultaten['Dossier'].nunique()} dossiers ({duur_ms:.0f} ms)")
+    st.write("### Kerntaken per dossier")
+    per_kerntaak = resultaten.groupby(["Dossier", "Kerntaak"], sort=False).size().reset_index(name="Treffers")
+    st.dataframe(per_kerntaak, hide_index=True, width="stretch")
+    st.write("### Uitspraken")
+    st.dataframe(resultaten, hide_index=True, width="stretch", column_config={"Score": st.column_config.NumberColumn(format="%.3f")})
+
+# Eén samengevoegde kruistabel per keuze van dossiers en corpusmodel, gedeeld door alle sessies
+@st.cache_resource(max_entries=4, show_spinner="Kruistabel samenvoegen...")
+def samengevoegde_kruistabel(dossiers, model_versie, _model):
+    index = get_uitspraak_index()
+    prestaties = Prestaties()
+    kruistabel = bouw_samengevoegde_kruistabel(
+        [(naam, index.geparseerd_dossier(dossier_id)) for dossier_id, naam in dossiers], model=_model, prestaties=prestaties
+    )
+    prestaties.schrijf(bestand="samengevoegd", dossiers=len(dossiers), model_versie=model_versie)
+    return kruistabel, prestaties.stappen
+
+# Streamlit-pagina voor één kruistabel over meerdere dossiers uit de index
+def samenvoeg_pagina():
+    st.title("Dossiers samenvoegen")
+    st.write(
+        "Maak één kruistabel over meerdere geanalyseerde dossiers, bijvoorbeeld alle bouwdossiers. "
+        "Gelijke uitspraken uit verschillende dossiers komen op één rij; de kolommen krijgen de dossiernaam als voorvoegsel."
+    )
+    index = get_uitspraak_index()
+    filter_naam = st.text_input("Filter op dossiernaam", placeholder="bijv. bouw")
+    kandidaten = [dossier for dossier in index.dossiers() if filter_naam.lower() in dossier["naam"].lower()]
+    if not kandidaten:
+        st.info("Geen dossiers gevonden in de index. Analyseer eerst dossiers op de pagina Analyse of met batch.py.")
+        return
+    # Standaard de nieuwste versie van elk dossier
+    nieuwste = list({dossier["naam"]: dossier for dossier in reversed(kandidaten)}.values())
+    gekozen = st.multiselect(
+        "Dossiers", kandidaten, default=[dossier for dossier in kandidaten if dossier in nieuwste],
+        format_func=lambda dossier: f"{dossier['naam']} ({dossier['toegevoegd']})",
+    )
+    corpusmodel_gebruiken = st.checkbox("Corpusmodel gebruiken", help="Met het corpusmodel zijn de similarity-scores vergelijkbaar tussen de dossiers")
+    model = None
+    if corpusmodel_gebruiken:
+        model, model_melding = get_corpusmodel()
+        if model is None:
+            st.warning(f"{model_melding} Er wordt zonder corpusmodel gekoppeld.")
+        else:
+            verouderd = corpusmodel_verouderd(model, index)
+            if verouderd:
+                st.warning(verouderd)
+    keuze = (tuple((dossier["id"], dossier["naam"]) for dossier in gekozen), model.versie if model else None)
+    if st.button("Samenvoegen", disabled=not gekozen):
+        st.session_state["samenvoegen"] = keuze
+    if st.session_state.get("samenvoegen") != keuze:
+        return
+    kruistabel, stappen = samengevoegde_kruistabel(*keuze, model)
+    duur = sum(stap["wandtijd_s"] for stap in stappen)
+    st.caption(f"{len(kruistabel.uitspraken)} unieke uitspraken en {len(kruistabel.kolommen)} kolommen uit {len(gekozen)} dossiers ({duur:.1f} s)")
+    toon_samengevoegde_kruistabel(kruistabel)
+
+    toon_downloadknoppen(kruistabel, "kruistabel_samengevoegd", bestand="samengevoegd", dossiers=len(gekozen))
+
+# Functie om een grote kruistabel per pagina te tonen; per pagina worden alleen de kolommen met koppelingen getoond,
+# zodat er nooit duizenden rijen en kolommen tegelijk gestyled en naar de browser gestuurd worden
+def toon_samengevoegde_kruistabel(kruistabel):
+    kolom_zoeken, kolom_rijen = st.columns([3, 1])
+    zoekterm = kolom_zoeken.text_input("Filter uitspraken", placeholder="bijv. metselmortel")
+    rijen_per_pagina = kolom_rijen.selectbox("Rijen per pagina", [50, 100, 250], index=1)
+    rijen = [idx for idx, uitspraak in enumerate(kruistabel.uitspraken) if zoekterm.lower() in uitspraak.lower()]
+    if not rijen:
+        st.info("Geen uitspraken gevonden.")
+        return
+    aantal_paginas = -(-len(rijen) // rijen_per_pagina)
+    pagina = st.number_input(f"Pagina (van {aantal_paginas})", min_value=1, max_value=aantal_paginas, value=1)
+    pagina_rijen = rijen[(pagina - 1) * rijen_per_pagina:pagina * rijen_per_pagina]
+    kolommen = np.flatnonzero(kruistabel.matrix[pagina_rijen].getnnz(axis=0)).tolist()
+    st.caption(f"Rij {(pagina - 1) * rijen_per_pagina + 1}–{(pagina - 1) * rijen_per_pagina + len(pagina_rijen)} van {len(rijen)}, {len(kolommen)} kolommen met koppelingen op deze pagina")
+    st.dataframe(style_kruistabel(*kruistabel.deel(pagina_rijen, kolommen)), width="stretch")
+
+# Streamlit-interface
+def main():
+    if OPWARMEN:
+        start_opwarmen()
+    pagina = st.navigation([
+        st.Page(analyse_pagina, title="Analyse", default=True),
+        st.Page(zoek_pagina, title="Zoeken"),
+        st.Page(samenvoeg_pagina, title="Samenvoegen"),
+    ])
+    pagina.run()
+
 if __name__ == "__main__":
     main()
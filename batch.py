@@ -0,0 +1,256 @@
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from analyse import (
+    EXPORT_FORMATEN, INDEX_PAD, MODEL_DIR, CorpusModel, UitspraakIndex, analyseer_dossier, corpusmodel_verouderd, exporteer_kruistabel, inhoud_hash,
+    laad_corpusmodel, opwarmen, resultaat_koppelingen, vergelijk_blokken, vergelijk_versies,
+)
+
+# Headless verwerking van een map met kwalificatiedossiers, zonder Streamlit-interface.
+# Gebruik: python batch.py INVOERMAP UITVOERMAP [--formaat xlsx|csv|parquet] [--workers N] [--recursief] [--index PAD | --geen-index]
+#   [--corpusmodel] [--train-corpusmodel] [--paginafilter]
+
+# Functie om alle PDF-bestanden in een map te verzamelen (relatieve paden, gesorteerd)
+def zoek_dossiers(invoer_map, recursief=False):
+    bestanden = []
+    for root, dirs, files in os.walk(invoer_map):
+        for naam in files:
+            if naam.lower().endswith(".pdf"):
+                bestanden.append(os.path.relpath(os.path.join(root, naam), invoer_map))
+        if not recursief:
+            break
+    return sorted(bestanden)
+
+# Functie om het samenvattingsrecord van een bestand te beginnen; ook gebruikt voor bestanden waarvan de worker crasht
+def nieuw_record(relatief_pad):
+    return {
+        "bestand": relatief_pad,
+        "status": "ok",
+        "melding": "",
+        "uitvoer": "",
+        "aantal_paginas": 0,
+        "aantal_kerntaken": 0,
+        "aantal_werkprocessen": 0,
+        "aantal_uitspraken": 0,
+        "aantal_fallback": 0,
+        "vorige_versie": "",
+        "kerntaken_gewijzigd": 0,
+        "wijzigingen": 0,
+        "duur_s": 0.0,
+    }
+
+# Functie om één dossier te verwerken en de kruistabel weg te schrijven (draait in een worker-proces).
+# Fouten blijven binnen dit bestand: ze komen als status "fout" in de samenvatting terecht. Een fout bij het bijwerken
+# van de zoekindex komt alleen in de melding, omdat de kruistabel dan al weggeschreven is.
+# Staat een eerdere versie (zelfde relatieve pad, andere inhoud) in de index, dan worden de koppelingen van ongewijzigde
+# kerntaakblokken hergebruikt en komen de verschillen in <naam>.verschillen.csv naast de kruistabel.
+def verwerk_dossier(invoer_map, relatief_pad, uitvoer_map, formaat, index_pad=None, model_dir=None, paginafilter=False):
+    start = time.perf_counter()
+    meldingen = []
+    record = nieuw_record(relatief_pad)
+    try:
+        pad = os.path.join(invoer_map, relatief_pad)
+        model = laad_corpusmodel(model_dir)[0] if model_dir else None  # Memory-mapped, dus goedkoop per bestand
+        index = UitspraakIndex(index_pad) if index_pad else None
+        eerdere_versie = None
+        if index is not None:
+            with open(pad, "rb") as f:
+                inhoud_sleutel = inhoud_hash(f.read())
+            eerdere_versie = index.vorige_versie(relatief_pad, inhoud_sleutel)
+        resultaat = analyseer_dossier(
+            pad,
+            workers=1,  # Parallelisme zit al op bestandsniveau
+            melding=lambda niveau, tekst: meldingen.append((niveau, tekst)),
+            model=model,
+            paginafilter=paginafilter,
+            vorige=index.vorige_koppelingen(eerdere_versie["id"]) if eerdere_versie else None,
+        )
+        record["aantal_paginas"] = resultaat["aantal_paginas"]
+        record["aantal_kerntaken"] = len(resultaat["vakkennis_dict"])
+        record["aantal_werkprocessen"] = len(resultaat["alle_werkprocessen"])
+        kruistabel = resultaat["kruistabel"]
+        if kruistabel is None or kruistabel.leeg:
+            # Een PDF die niet te lezen is telt als fout, een leesbare PDF zonder uitspraken als leeg
+            record["status"] = "fout" if any(niveau == "error" for niveau, _ in meldingen) else "leeg"
+            record["melding"] = " ".join(tekst for _, tekst in meldingen) or "Geen 'Vakkennis en vaardigheden'-blokken gevonden in de PDF."
+        else:
+            record["aantal_uitspraken"] = len(kruistabel.uitspraken)
+            record["aantal_fallback"] = int(kruistabel.fallback.nnz)
+            uitvoer_pad = os.path.join(uitvoer_map, os.path.splitext(relatief_pad)[0] + EXPORT_FORMATEN[formaat][0])
+            os.makedirs(os.path.dirname(uitvoer_pad) or ".", exist_ok=True)
+            # Excel krijgt de ×-weergave met gele fallback-cellen, CSV en Parquet de numerieke 0/1-tabel
+            exporteer_kruistabel(kruistabel, formaat, uitvoer_pad)
+            record["uitvoer"] = os.path.relpath(uitvoer_pad, uitvoer_map)
+            if eerdere_versie:
+                blokken = vergelijk_blokken(index.vingerafdrukken(eerdere_versie["id"]), resultaat["vingerafdrukken"])
+                verschillen = vergelijk_versies(index.dossier_koppelingen(eerdere_versie["id"]), resultaat_koppelingen(resultaat))
+                verschillen.to_csv(os.path.splitext(uitvoer_pad)[0] + ".verschillen.csv", index=False, encoding="utf-8-sig")
+                record["vorige_versie"] = eerdere_versie["toegevoegd"]
+                record["kerntaken_gewijzigd"] = blokken["gewijzigd"] + blokken["toegevoegd"] + blokken["verwijderd"]
+                record["wijzigingen"] = len(verschillen)
+            if index is not None:
+                # Voeg het dossier toe aan de gedeelde zoekindex; SQLite regelt het gelijktijdig schrijven van de workers.
+                # Lukt dat niet (bijv. "database is locked"), dan is de kruistabel wel gemaakt en blijft het bestand ok.
+                try:
+                    index.voeg_toe(inhoud_sleutel, relatief_pad, resultaat)
+                except sqlite3.Error as e:
+                    record["melding"] = f"Niet toegevoegd aan de zoekindex: {type(e).__name__}: {e}"
+    except Exception as e:
+        record["status"] = "fout"
+        record["melding"] = f"{type(e).__name__}: {e}"
+    record["duur_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+# Wachtrij waarin de workers melden welk bestand ze starten, per proces gezet door de initializer van de pool.
+# Een SimpleQueue schrijft direct naar de pipe, dus de melding is er ook als de worker meteen daarna crasht.
+_GESTART = None
+
+def _init_worker(gestart):
+    global _GESTART
+    _GESTART = gestart
+
+# Functie die in een worker meldt dat een bestand gestart is en het daarna verwerkt
+def _verwerk_gemeld(invoer_map, relatief_pad, *args):
+    _GESTART.put(relatief_pad)
+    return verwerk_dossier(invoer_map, relatief_pad, *args)
+
+# Functie om bestanden over één procespool te verwerken; elk afgerond record gaat naar klaar.
+# Crasht een worker, dan is de hele pool kapot en mislukken ook alle andere lopende en wachtende bestanden.
+# Geeft daarom de bestanden terug die bij de crash liepen (verdacht) en de bestanden die nog niet gestart waren.
+def _verwerk_in_pool(bestanden, workers, argumenten, klaar):
+    gestart = multiprocessing.SimpleQueue()
+    onderbroken = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(gestart,)) as executor:
+        futures = {executor.submit(_verwerk_gemeld, argumenten[0], relatief_pad, *argumenten[1:]): relatief_pad for relatief_pad in bestanden}
+        for future in as_completed(futures):
+            try:
+                klaar(future.result())
+            except BrokenProcessPool:
+                onderbroken.append(futures[future])
+    gestarte_bestanden = set()
+    while not gestart.empty():
+        gestarte_bestanden.add(gestart.get())
+    gestart.close()
+    volgorde = {relatief_pad: idx for idx, relatief_pad in enumerate(bestanden)}
+    onderbroken.sort(key=volgorde.get)
+    return [pad for pad in onderbroken if pad in gestarte_bestanden], [pad for pad in onderbroken if pad not in gestarte_bestanden]
+
+# Functie om de voortgang en doorvoer op één regel te tonen
+def toon_voortgang(record, klaar, totaal, paginas, start):
+    verstreken = max(time.perf_counter() - start, 1e-9)
+    regel = (
+        f"[{klaar}/{totaal}] {record['bestand']}: {record['status']} ({record['duur_s']:.1f} s) | "
+        f"{klaar / verstreken:.2f} bestanden/s, {paginas / verstreken:.1f} pagina's/s"
+    )
+    if record["melding"]:
+        regel += f" | {record['melding']}"
+    print(regel, flush=True)
+
+# Functie om alle dossiers in een map over een procespool te verwerken; geeft de samenvatting als DataFrame terug
+def verwerk_map(invoer_map, uitvoer_map, formaat="xlsx", workers=None, recursief=False, index_pad=None, model_dir=None, paginafilter=False):
+    bestanden = zoek_dossiers(invoer_map, recursief=recursief)
+    os.makedirs(uitvoer_map, exist_ok=True)
+    records = []
+    paginas = 0
+    start = time.perf_counter()
+    if bestanden:
+        # Laad de zware modules één keer in dit proces; geforkte workers erven ze in plaats van ze elk zelf te importeren
+        opwarmen()
+    argumenten = (invoer_map, uitvoer_map, formaat, index_pad, model_dir, paginafilter)
+
+    def klaar(record):
+        nonlocal paginas
+        records.append(record)
+        paginas += record["aantal_paginas"]
+        toon_voortgang(record, len(records), len(bestanden), paginas, start)
+
+    def gecrasht(relatief_pad):
+        record = nieuw_record(relatief_pad)
+        record["status"] = "fout"
+        record["melding"] = "Worker gecrasht (bijv. door geheugengebrek)"
+        klaar(record)
+
+    # Na een workercrash gaan de niet gestarte bestanden naar een nieuwe pool. Liep er bij de crash één bestand, dan
+    # telt alleen dat als mislukt; liepen er meer, dan worden die één voor één opnieuw geprobeerd.
+    te_doen = bestanden
+    while te_doen:
+        verdacht, te_doen = _verwerk_in_pool(te_doen, workers or os.cpu_count() or 1, argumenten, klaar)
+        if not verdacht and te_doen:
+            verdacht, te_doen = te_doen, []  # Niet te herleiden welk bestand liep; probeer ze allemaal apart
+        if len(verdacht) == 1:
+            gecrasht(verdacht[0])
+            continue
+        for relatief_pad in verdacht:
+            if any(_verwerk_in_pool([relatief_pad], 1, argumenten, klaar)):
+                gecrasht(relatief_pad)
+
+    verstreken = time.perf_counter() - start
+    samenvatting = pd.DataFrame(records).sort_values("bestand") if records else pd.DataFrame()
+    samenvatting.to_csv(os.path.join(uitvoer_map, "samenvatting.csv"), index=False)
+    if records:
+        mislukt = int((samenvatting["status"] == "fout").sum())
+        print(
+            f"Klaar: {len(records)} bestanden in {verstreken:.1f} s "
+            f"({len(records) / max(verstreken, 1e-9):.2f} bestanden/s, {paginas / max(verstreken, 1e-9):.1f} pagina's/s), {mislukt} mislukt",
+            flush=True,
+        )
+    else:
+        print(f"Geen PDF-bestanden gevonden in {invoer_map}", flush=True)
+    return samenvatting
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genereer kruistabellen voor een map met kwalificatiedossiers (PDF).")
+    parser.add_argument("invoer_map", help="Map met PDF-bestanden")
+    parser.add_argument("uitvoer_map", help="Map voor de kruistabellen en samenvatting.csv")
+    parser.add_argument("--formaat", choices=sorted(EXPORT_FORMATEN), default="xlsx", help="Uitvoerformaat per dossier (standaard: xlsx)")
+    parser.add_argument("--workers", type=int, default=None, help="Aantal worker-processen (standaard: aantal CPU-kernen)")
+    parser.add_argument("--recursief", action="store_true", help="Zoek ook in submappen naar PDF-bestanden")
+    parser.add_argument("--index", default=INDEX_PAD, help=f"Zoekindex waaraan de dossiers worden toegevoegd (standaard: {INDEX_PAD})")
+    parser.add_argument("--geen-index", action="store_true", help="Voeg de dossiers niet toe aan de zoekindex")
+    parser.add_argument("--corpusmodel", action="store_true", help=f"Koppel met het getrainde corpusmodel in {MODEL_DIR} in plaats van per dossier te fitten")
+    parser.add_argument("--train-corpusmodel", action="store_true", help="Train na de verwerking het corpusmodel opnieuw op de zoekindex")
+    parser.add_argument("--paginafilter", action="store_true", help="Lees alleen de kerntaakhoofdstukken volgens de bladwijzers van de PDF")
+    args = parser.parse_args(argv)
+
+    if args.formaat == "parquet" and not importlib.util.find_spec("pyarrow"):
+        parser.error("Parquet-uitvoer vereist pyarrow (pip install pyarrow)")
+    if args.train_corpusmodel and args.geen_index:
+        parser.error("--train-corpusmodel traint op de zoekindex en kan niet samen met --geen-index")
+    index = None
+    if not args.geen_index:
+        try:
+            index = UitspraakIndex(args.index)  # Controleer de map van de index vóórdat de workers starten
+        except PermissionError as e:
+            parser.error(str(e))
+    if args.corpusmodel:
+        model, melding = laad_corpusmodel(MODEL_DIR)
+        if model is None:
+            parser.error(melding)
+        print(f"Corpusmodel {model.versie}: {model.meta['aantal_termen']} termen uit {model.meta['aantal_dossiers']} dossiers", flush=True)
+        verouderd = corpusmodel_verouderd(model, index) if index is not None else None
+        if verouderd:
+            print(f"Waarschuwing: {verouderd}", file=sys.stderr, flush=True)
+
+    samenvatting = verwerk_map(
+        args.invoer_map, args.uitvoer_map, formaat=args.formaat, workers=args.workers, recursief=args.recursief,
+        index_pad=None if args.geen_index else args.index, model_dir=MODEL_DIR if args.corpusmodel else None,
+        paginafilter=args.paginafilter,
+    )
+    if args.train_corpusmodel:
+        model = CorpusModel.train(index)
+        print(f"Corpusmodel {model.versie} getraind: {model.meta['aantal_termen']} termen uit {model.meta['aantal_dossiers']} dossiers", flush=True)
+    if not samenvatting.empty and (samenvatting["status"] == "fout").any():
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
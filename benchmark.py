@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+import analyse
+
+# Benchmark voor de verwerkingsstappen (extractie, kruistabel opbouwen, export) op synthetische kwalificatiedossiers.
+# Gebruik: python benchmark.py --paginas 10 100 500 [--herhalingen 3] [--vergelijk vorige.json]
+
+REGELS_PER_PAGINA = 48
+SYNTHETISCH_DIR = os.path.join(tempfile.gettempdir(), "kruistabel_synthetisch")
+RESULTATEN_DIR = "benchmark_resultaten"
+
+VAKTERMEN = (
+    "metselwerk mortel metselmortel lijmmortel baksteen kalkzandsteen betonblok gevel spouwmuur spouwanker "
+    "isolatie kim lateien dilatatievoegen voegwerk bekisting steigers gereedschap maatvoering waterpas profielen "
+    "lood tekeningen bestekken bouwfysica vochtkering folies prefab elementen hijsmiddelen materieel"
+).split()
+ALGEMEEN = (
+    "communicatie planning rapportage opdrachtgever collega's leidinggevende werkafspraken veiligheid "
+    "arbo-regels instructies kwaliteitseisen duurzaamheid afval milieu"
+).split()
+WERKWOORDEN = ["Richt", "Stelt", "Maakt", "Controleert", "Verwerkt", "Plaatst", "Ruimt", "Bereidt"]
+UITSPRAAK_STARTS = ["heeft kennis van", "heeft inzicht in", "kan", "kent", "weet", "past toe:", "bezit vaardigheid in"]
+
+# Functie om de regels van een synthetisch kwalificatiedossier per pagina te genereren, in de opbouw van een echt
+# dossier: voorwerk, Basisdeel en Profieldeel met kerntaken, werkprocessen en "Vakkennis en vaardigheden"-blokken
+def genereer_dossier_paginas(aantal_paginas, seed=0):
+    rnd = random.Random(seed)
+    regels = [
+        "Kwalificatiedossier mbo Metselaar", "Inhoudsopgave", "Leeswijzer", "Overzicht van het kwalificatiedossier",
+        "Typering van het beroep", "De metselaar werkt in de burgerlijke en utiliteitsbouw.",
+        "Beroepsvereisten", "Er zijn geen wettelijke beroepsvereisten.", "Generieke onderdelen", "",
+    ]
+    # Een deel van de uitspraken komt in meerdere kerntaken terug, zoals in echte dossiers
+    gedeelde_uitspraken = []
+
+    def uitspraak():
+        if gedeelde_uitspraken and rnd.random() < 0.15:
+            return rnd.choice(gedeelde_uitspraken)
+        woorden = VAKTERMEN if rnd.random() < 0.7 else ALGEMEEN
+        tekst = f"{rnd.choice(UITSPRAAK_STARTS)} " + " en ".join(rnd.sample(woorden, rnd.randint(1, 4)))
+        if rnd.random() < 0.3:
+            tekst += " bij het " + rnd.choice(["metselen", "lijmen", "stellen", "voegen", "opruimen"]) + " van " + rnd.choice(VAKTERMEN)
+        gedeelde_uitspraken.append(tekst)
+        return tekst
+
+    max_regels = aantal_paginas * REGELS_PER_PAGINA
+    sectie_wissel = max_regels // 2
+    sectie, prefix, nummer = "Basisdeel", "B1", 0
+    regels.append(sectie)
+    while len(regels) < max_regels:
+        if sectie == "Basisdeel" and len(regels) >= sectie_wissel:
+            sectie, prefix, nummer = "Profieldeel", "P1", 0
+            regels.append(sectie)
+        nummer += 1
+        kerntaak = f"{prefix}-K{nummer}"
+        regels += [
+            f"{kerntaak}: {rnd.choice(WERKWOORDEN)} {rnd.choice(VAKTERMEN)} en {rnd.choice(VAKTERMEN)}",
+            "Complexiteit", "De metselaar voert zijn werkzaamheden uit volgens tekening en planning.",
+            "Verantwoordelijkheid en zelfstandigheid", "Hij is verantwoordelijk voor zijn eigen werk.",
+            "Vakkennis en vaardigheden", "De beginnend beroepsbeoefenaar:",
+        ]
+        for _ in range(rnd.randint(6, 18)):
+            tekst = "- " + uitspraak()
+            # Lange uitspraken lopen over meerdere regels door
+            while len(tekst) > 70:
+                knip = tekst.rfind(" ", 0, 70)
+                regels.append(tekst[:knip])
+                tekst = tekst[knip + 1:]
+            regels.append(tekst)
+        for w in range(1, rnd.randint(3, 8)):
+            regels += [
+                f"{kerntaak}-W{w}: {rnd.choice(WERKWOORDEN)} {rnd.choice(VAKTERMEN)}",
+                "Omschrijving",
+                "De metselaar " + " ".join(rnd.sample(VAKTERMEN, 6)) + ".",
+                " ".join(rnd.sample(VAKTERMEN + ALGEMEEN, 8)) + ".",
+                "Resultaat", f"Het {rnd.choice(VAKTERMEN)} is volgens de eisen opgeleverd.",
+                "Gedrag", "Werkt nauwkeurig en houdt rekening met veiligheid.",
+            ]
+
+    paginas = [regels[i:i + REGELS_PER_PAGINA] for i in range(0, max_regels, REGELS_PER_PAGINA)][:aantal_paginas]
+    # Voettekst zoals "7 van 18" onderaan elke pagina
+    return [pagina + [f"{nr} van {aantal_paginas}"] for nr, pagina in enumerate(paginas, 1)]
+
+# Functie om tekstregels per pagina als minimale PDF te schrijven (Helvetica, zonder externe afhankelijkheden)
+def schrijf_pdf(paginas):
+    objecten = []
+
+    def voeg_toe(inhoud):
+        objecten.append(inhoud)
+        return len(objecten)
+
+    font = voeg_toe(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    pages_id = len(objecten) + 2 * len(paginas) + 1
+    kids = []
+    for regels in paginas:
+        stream = ["BT /F1 10 Tf 14 TL 50 800 Td"]
+        for regel in regels:
+            tekst = regel.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            stream.append(f"({tekst}) Tj T*")
+        stream.append("ET")
+        inhoud = "\n".join(stream).encode("cp1252", errors="replace")
+        content = voeg_toe(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(inhoud), inhoud))
+        kids.append(voeg_toe(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font, content)
+        ))
+    voeg_toe(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    catalog = voeg_toe(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for nummer, inhoud in enumerate(objecten, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (nummer, inhoud)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objecten) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objecten) + 1, catalog, xref)
+    return bytes(pdf)
+
+# Functie om een synthetisch dossier van het gevraagde aantal pagina's te maken (hergebruikt als het al bestaat)
+def synthetisch_dossier(aantal_paginas, seed=0, doelmap=SYNTHETISCH_DIR):
+    os.makedirs(doelmap, exist_ok=True)
+    pad = os.path.join(doelmap, f"dossier_{aantal_paginas}p_seed{seed}.pdf")
+    if not os.path.exists(pad):
+        with open(pad, "wb") as f:
+            f.write(schrijf_pdf(genereer_dossier_paginas(aantal_paginas, seed=seed)))
+    return pad
+
+# Functie om extractie en regelparser na elkaar te draaien in plaats van door elkaar, zodat elke stap een eigen
+# geheugenpiek krijgt (in de gestreamde verwerking vallen beide stappen onder één tracemalloc-piek)
+def _extraheer_los(pad, workers, prestaties):
+    with prestaties.stap("pdf_extractie") as tellers:
+        teksten = [tekst for tekst in analyse.iter_page_texts(pad, workers=workers) if tekst]
+        tellers["paginas"] = len(teksten)
+    parser = analyse.DossierParser()
+    with prestaties.stap("regelparser") as tellers:
+        for tekst in teksten:
+            parser.feed_page(tekst)
+        parser.close()
+        tellers["regels"] = parser.aantal_regels
+        tellers["uitspraken"] = sum(len(uitspraken) for uitspraken in parser.vakkennis_dict.values())
+    return parser.vakkennis_dict, parser.werkprocessen_dict, parser.werkprocessen_beschrijvingen
+
+# Functie om één keer alle stappen te doorlopen en de metingen per stap terug te geven.
+# De tijden komen uit de gestreamde verwerking van de app; de geheugenrun meet extractie en parser los.
+def meet_run(pad, workers=None, geheugen=False):
+    prestaties = analyse.Prestaties(geheugen=geheugen)
+    try:
+        if geheugen:
+            vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen = _extraheer_los(pad, workers, prestaties)
+        else:
+            vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen, _, _ = analyse.extract_vakkennis_en_werkprocessen(
+                pad, workers=workers, bewaar_ruwe_tekst=False, melding=lambda niveau, tekst: None, prestaties=prestaties
+            )
+        with prestaties.stap("kruistabel"):
+            kruistabel, _, _ = analyse.bouw_kruistabel(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen)
+        with prestaties.stap("export") as tellers:
+            tellers["bytes"] = analyse.exporteer_kruistabel(kruistabel, "xlsx").getbuffer().nbytes
+    finally:
+        prestaties.stop()
+    return prestaties.stappen
+
+# Functie om de benchmark voor alle groottes te draaien: de mediaan over een aantal herhalingen voor de tijden,
+# en een aparte run met tracemalloc voor het geheugen (tracemalloc vertraagt de tijdmetingen)
+def draai_benchmark(groottes, herhalingen=3, workers=None, seed=0):
+    resultaten = []
+    for aantal_paginas in groottes:
+        pad = synthetisch_dossier(aantal_paginas, seed=seed)
+        runs = [meet_run(pad, workers=workers) for _ in range(herhalingen)]
+        geheugen_run = {stap["stap"]: stap for stap in meet_run(pad, workers=workers, geheugen=True)}
+        for stap_index, stap in enumerate(runs[0]):
+            record = {k: v for k, v in stap.items() if k not in ("wandtijd_s", "cputijd_s", "piek_geheugen_mb")}
+            record["paginas_dossier"] = aantal_paginas
+            record["wandtijd_s"] = round(statistics.median(run[stap_index]["wandtijd_s"] for run in runs), 4)
+            record["cputijd_s"] = round(statistics.median(run[stap_index]["cputijd_s"] for run in runs), 4)
+            record["piek_geheugen_mb"] = geheugen_run[stap["stap"]]["piek_geheugen_mb"]
+            resultaten.append(record)
+            print(f"{aantal_paginas:>5} p  {record['stap']:<14} {record['wandtijd_s']:>8.3f} s  {record['piek_geheugen_mb']:>8.1f} MB", flush=True)
+    return resultaten
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Functie om de importtijd van app.py in een vers proces te meten (koude start van de server of een batch-worker)
+def _importtijd():
+    code = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+    try:
+        uitvoer = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(analyse.__file__)))
+        return round(float(uitvoer.stdout.strip().splitlines()[-1]), 3)
+    except (OSError, ValueError, IndexError, subprocess.CalledProcessError):
+        return None
+
+# Functie om twee benchmarkresultaten te vergelijken; geeft de stappen terug die meer dan de drempel trager zijn
+def vergelijk(oud, nieuw, drempel=0.2):
+    oude_metingen = {(r["paginas_dossier"], r["stap"]): r for r in oud["resultaten"]}
+    regressies = []
+    for r in nieuw["resultaten"]:
+        vorige = oude_metingen.get((r["paginas_dossier"], r["stap"]))
+        if vorige is None or not vorige["wandtijd_s"]:
+            continue
+        verhouding = r["wandtijd_s"] / vorige["wandtijd_s"]
+        markering = "  REGRESSIE" if verhouding > 1 + drempel else ""
+        print(f"{r['paginas_dossier']:>5} p  {r['stap']:<14} {vorige['wandtijd_s']:>8.3f} -> {r['wandtijd_s']:>8.3f} s  ({verhouding:.2f}x){markering}")
+        if markering:
+            regressies.append((r["paginas_dossier"], r["stap"], verhouding))
+    return regressies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de verwerkingsstappen op synthetische kwalificatiedossiers.")
+    parser.add_argument("--paginas", type=int, nargs="+", default=[10, 100, 500], help="Groottes van de dossiers in pagina's (10 t/m 1000)")
+    parser.add_argument("--herhalingen", type=int, default=3, help="Aantal herhalingen per grootte voor de tijdmeting")
+    parser.add_argument("--workers", type=int, default=None, help="Workers voor PDF-extractie (standaard zoals de app)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed voor de synthetische dossiers")
+    parser.add_argument("--uitvoer", default=None, help="JSON-bestand voor de resultaten (standaard in benchmark_resultaten/)")
+    parser.add_argument("--vergelijk", default=None, help="Eerder resultaat om mee te vergelijken")
+    parser.add_argument("--drempel", type=float, default=0.2, help="Relatieve vertraging die als regressie telt (standaard 0.2)")
+    args = parser.parse_args(argv)
+
+    if any(not 10 <= p <= 1000 for p in args.paginas):
+        parser.error("--paginas moet tussen 10 en 1000 liggen")
+
+    resultaat = {
+        "meta": {
+            "tijdstip": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "parser_versie": analyse.PARSER_VERSIE,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": args.workers,
+            "herhalingen": args.herhalingen,
+            "seed": args.seed,
+            "importtijd_s": _importtijd(),
+            # Laad de zware modules vooraf, zodat hun importtijd niet in de eerste meting valt
+            "opwarmen_s": round(analyse.opwarmen(), 3),
+        },
+        "resultaten": draai_benchmark(args.paginas, herhalingen=args.herhalingen, workers=args.workers, seed=args.seed),
+    }
+
+    uitvoer = args.uitvoer
+    if uitvoer is None:
+        os.makedirs(RESULTATEN_DIR, exist_ok=True)
+        uitvoer = os.path.join(RESULTATEN_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(uitvoer, "w", encoding="utf-8") as f:
+        json.dump(resultaat, f, ensure_ascii=False, indent=2)
+    print(f"Resultaten geschreven naar {uitvoer}")
+
+    if args.vergelijk:
+        with open(args.vergelijk, encoding="utf-8") as f:
+            regressies = vergelijk(json.load(f), resultaat, drempel=args.drempel)
+        if regressies:
+            print(f"{len(regressies)} stap(pen) trager dan {args.drempel:.0%} boven de vorige meting")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
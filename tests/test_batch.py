@@ -0,0 +1,20 @@
+import os
+import sqlite3
+
+import analyse
+import batch
+import benchmark
+
+def test_fout_in_zoekindex_laat_bestand_niet_mislukken(tmp_path, monkeypatch):
+    invoer, uitvoer = tmp_path / "invoer", tmp_path / "uitvoer"
+    invoer.mkdir()
+    (invoer / "dossier.pdf").write_bytes(benchmark.schrijf_pdf(benchmark.genereer_dossier_paginas(6)))
+
+    def vergrendeld(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(analyse.UitspraakIndex, "voeg_toe", vergrendeld)
+    record = batch.verwerk_dossier(str(invoer), "dossier.pdf", str(uitvoer), "csv", index_pad=str(tmp_path / "index.db"))
+    assert record["status"] == "ok"
+    assert os.path.exists(uitvoer / record["uitvoer"])
+    assert "database is locked" in record["melding"]
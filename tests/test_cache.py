@@ -0,0 +1,70 @@
+import os
+import pickle
+
+import pytest
+
+import analyse
+from test_samenvoegen import synthetisch_dossier
+
+def resultaat():
+    dossier = synthetisch_dossier(aantal_kerntaken=3)
+    kruistabel, koppelingen_log, fallback_koppelingen = analyse.bouw_kruistabel(**dossier)
+    return {
+        **dossier,
+        "alle_werkprocessen": kruistabel.kolommen[3:],
+        "aantal_paginas": 12,
+        "kruistabel": kruistabel,
+        "koppelingen_log": koppelingen_log,
+        "fallback_koppelingen": fallback_koppelingen,
+        "model_versie": None,
+        "vingerafdrukken": analyse.blok_vingerafdrukken(**dossier),
+    }
+
+def test_resultaat_van_schijf_gelijk_aan_origineel(tmp_path):
+    origineel = resultaat()
+    analyse.ResultaatCache(cache_dir=str(tmp_path)).put("sleutel", origineel)
+    cache = analyse.ResultaatCache(cache_dir=str(tmp_path))
+    geladen = cache.get("sleutel")
+    assert cache.stats["schijf_hits"] == 1
+    assert {k: v for k, v in geladen.items() if k != "kruistabel"} == {k: v for k, v in origineel.items() if k != "kruistabel"}
+    kruistabel, verwacht = geladen["kruistabel"], origineel["kruistabel"]
+    assert (kruistabel.uitspraken, kruistabel.kolommen, kruistabel.koppeling_details) == (verwacht.uitspraken, verwacht.kolommen, verwacht.koppeling_details)
+    assert (kruistabel.matrix != verwacht.matrix).nnz == 0 and (kruistabel.fallback != verwacht.fallback).nnz == 0
+    assert kruistabel.display_df.equals(verwacht.display_df)
+
+# Iemand anders zet een bestand met de voorspelbare cachesleutel neer; laden mag nooit code uitvoeren
+class Kwaadaardig:
+    def __reduce__(self):
+        return (open, (os.environ["KRUISTABEL_TEST_MARKER"], "w"))
+
+def test_geplant_bestand_voert_geen_code_uit(tmp_path, monkeypatch):
+    marker = tmp_path / "uitgevoerd"
+    monkeypatch.setenv("KRUISTABEL_TEST_MARKER", str(marker))
+    cache_dir = tmp_path / "cache"
+    cache = analyse.ResultaatCache(cache_dir=str(cache_dir))
+    cache.put("andere", resultaat())  # Maakt de map aan
+    for naam in ("sleutel.npz", "sleutel.pkl"):
+        with open(cache_dir / naam, "wb") as f:
+            pickle.dump(Kwaadaardig(), f)
+    assert cache.get("sleutel") is None
+    assert not marker.exists()
+
+def test_map_die_anderen_kunnen_beschrijven_wordt_niet_gebruikt(tmp_path):
+    analyse.ResultaatCache(cache_dir=str(tmp_path)).put("sleutel", resultaat())
+    os.chmod(tmp_path, 0o777)
+    try:
+        cache = analyse.ResultaatCache(cache_dir=str(tmp_path))
+        assert cache.get("sleutel") is None
+        assert cache.stats["misses"] == 1
+    finally:
+        os.chmod(tmp_path, 0o700)
+
+def test_index_en_corpusmodel_niet_in_map_van_anderen(tmp_path):
+    os.chmod(tmp_path, 0o777)
+    try:
+        with pytest.raises(PermissionError):
+            analyse.UitspraakIndex(pad=str(tmp_path / "index.sqlite"))
+        model, melding = analyse.laad_corpusmodel(str(tmp_path))
+        assert model is None and "beschrijfbaar" in melding
+    finally:
+        os.chmod(tmp_path, 0o700)
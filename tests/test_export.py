@@ -0,0 +1,62 @@
+import importlib.util
+
+import openpyxl
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import analyse
+import app
+from test_samenvoegen import synthetisch_dossier
+
+def test_parquet_alleen_met_pyarrow(monkeypatch):
+    kruistabel = analyse.Kruistabel(["kent x"], ["B1-K1", "B1-K1-W1"], [(0, 0), (0, 1)])
+    assert app.export_onmogelijk(kruistabel) == {"xlsx": None, "csv": None, "parquet": None}
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda naam, *args: None if naam == "pyarrow" else find_spec(naam, *args))
+    assert "pyarrow" in app.export_onmogelijk(kruistabel)["parquet"]
+
+# Kruistabel van een synthetisch dossier, met uitspraken die alleen via de fallback gekoppeld worden
+def kruistabel_met_fallback():
+    kruistabel = analyse.bouw_kruistabel(**synthetisch_dossier(aantal_kerntaken=6))[0]
+    assert kruistabel.fallback.nnz > 0
+    return kruistabel
+
+def test_excel_gele_cellen_en_koppelingen():
+    kruistabel = kruistabel_met_fallback()
+    werkmap = openpyxl.load_workbook(analyse.exporteer_kruistabel(kruistabel, "xlsx"))
+    assert werkmap.sheetnames == ["Kruistabel", "Koppelingen"]
+
+    rijen = list(werkmap["Kruistabel"].iter_rows())
+    assert [cel.value for cel in rijen[0]] == ["Uitspraak"] + kruistabel.kolommen
+    assert [rij[0].value for rij in rijen[1:]] == kruistabel.uitspraken
+    gekoppeld = [(rij, kolom) for rij, cellen in enumerate(rijen[1:]) for kolom, cel in enumerate(cellen[1:]) if cel.value == "×"]
+    assert gekoppeld == list(zip(*kruistabel.matrix.nonzero()))
+    geel = [(rij, kolom) for rij, cellen in enumerate(rijen[1:]) for kolom, cel in enumerate(cellen[1:]) if cel.fill.fgColor.rgb.endswith("FFFF00")]
+    assert len(geel) == kruistabel.fallback.nnz
+    assert all(kruistabel.fallback[rij, kolom] for rij, kolom in geel)
+
+    koppelingen = [[cel.value for cel in rij] for rij in werkmap["Koppelingen"].iter_rows()]
+    assert koppelingen[0] == analyse.KOPPELINGEN_KOLOMMEN
+    # Similarity komt via de XML van de werkmap terug, dus op afronding na
+    assert [rij[:5] for rij in koppelingen[1:]] == [
+        [uitspraak, kerntaak, werkproces, methode, "ja" if via_fallback else "nee"]
+        for uitspraak, kerntaak, werkproces, methode, via_fallback, _ in kruistabel.koppeling_details
+    ]
+    assert [rij[5] for rij in koppelingen[1:]] == pytest.approx([detail[5] for detail in kruistabel.koppeling_details])
+    assert any(rij[4] == "ja" for rij in koppelingen[1:]) and any(rij[4] == "nee" for rij in koppelingen[1:])
+
+def test_csv_en_parquet_gelijk(monkeypatch):
+    # Kleine blokken, zodat de schrijvers over meerdere blokken (en Parquet-rijgroepen) lopen
+    monkeypatch.setattr(analyse._iter_blokken, "__defaults__", (7,))
+    kruistabel = kruistabel_met_fallback()
+    csv_df = pd.read_csv(analyse.exporteer_kruistabel(kruistabel, "csv"), encoding="utf-8-sig")
+    parquet_bestand = analyse.exporteer_kruistabel(kruistabel, "parquet")
+    assert pq.ParquetFile(parquet_bestand).num_row_groups == -(-len(kruistabel.uitspraken) // 7)
+    parquet_df = pd.read_parquet(parquet_bestand)
+
+    assert list(csv_df.columns) == list(parquet_df.columns) == ["Uitspraak"] + kruistabel.kolommen
+    assert csv_df["Uitspraak"].tolist() == parquet_df["Uitspraak"].tolist() == kruistabel.uitspraken
+    verwacht = kruistabel.matrix.toarray()
+    assert (csv_df[kruistabel.kolommen].to_numpy() == verwacht).all()
+    assert (parquet_df[kruistabel.kolommen].to_numpy() == verwacht).all()
@@ -0,0 +1,81 @@
+import re
+
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+import analyse
+
+# Kerntaak uit een synthetisch dossier waarin één uitspraak precies even goed bij twee werkprocessen past;
+# in de gebatchte berekening verschillen die scores alleen door afrondingsruis
+GELIJKE_STAND = {
+    "vakkennis_dict": {
+        "B1-K23": [
+            "heeft inzicht in bestekken en metselmortel en kalkzandsteen",
+            "kent de eigenschappen van lijmmortel en lateien",
+            "kan profielen en waterpas gebruiken bij voegwerk",
+        ],
+    },
+    "werkprocessen_dict": {"B1-K23": ["B1-K23-W1", "B1-K23-W2"]},
+    "werkprocessen_beschrijvingen": {
+        "B1-K23-W1": (
+            "Controleert baksteen  De metselaar lijmmortel lateien mortel kalkzandsteen metselmortel materieel. hijsmiddelen "
+            "collega's kwaliteitseisen milieu mortel lijmmortel gereedschap arbo-regels. Het steigers is volgens de eisen "
+            "opgeleverd. Werkt nauwkeurig en houdt rekening met veiligheid."
+        ),
+        "B1-K23-W2": (
+            "Bereidt elementen  De metselaar bestekken profielen betonblok kim waterpas voegwerk. gevel lood profielen "
+            "bouwfysica kwaliteitseisen maatvoering kalkzandsteen voegwerk. Het folies is volgens de eisen opgeleverd. "
+            "Werkt nauwkeurig en houdt rekening met veiligheid."
+        ),
+    },
+}
+
+# Functie om per uitspraak het werkproces te kiezen zoals de oorspronkelijke lus dat deed: een TfidfVectorizer per
+# uitspraak, gefit op [uitspraak] + werkprocesbeschrijvingen, en een gewone argmax. Geeft per uitspraak de keuze en
+# of de beste scores bijna gelijk zijn; alleen daar mag de gebatchte berekening door afrondingsruis anders uitvallen
+def kies_per_uitspraak(vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen):
+    stopwoorden = set(analyse.STOPWOORDEN)
+    for wps in werkprocessen_dict.values():
+        for wp in wps:
+            stopwoorden.update(analyse.werkproces_stopwoorden(wp))
+    keuzes = {}
+    for kerntaak, uitspraken in vakkennis_dict.items():
+        werkprocessen = werkprocessen_dict[kerntaak]
+        teksten = [re.sub(r'[^\w\s]', '', werkprocessen_beschrijvingen.get(wp, wp).lower()) for wp in werkprocessen]
+        for uitspraak in uitspraken:
+            tfidf = TfidfVectorizer(stop_words=list(stopwoorden), min_df=1).fit_transform([re.sub(r'[^\w\s]', '', uitspraak.lower())] + teksten)
+            scores = cosine_similarity(tfidf[0:1], tfidf[1:])[0]
+            if scores.max() > 0.1:
+                bijna_gelijk = (scores >= scores.max() - 1e-9).sum() > 1
+                keuzes[(uitspraak, kerntaak)] = (werkprocessen[scores.argmax()], bijna_gelijk)
+    return keuzes
+
+def test_gebatchte_keuze_gelijk_aan_keuze_per_uitspraak():
+    kruistabel = analyse.bouw_kruistabel(**GELIJKE_STAND)[0]
+    gebatcht = {(uitspraak, kerntaak): wp for uitspraak, kerntaak, wp, methode, *_ in kruistabel.koppeling_details if methode == "tekstanalyse"}
+    referentie = kies_per_uitspraak(**GELIJKE_STAND)
+    assert gebatcht.keys() == referentie.keys()
+    duidelijk = [sleutel for sleutel, (_, bijna_gelijk) in referentie.items() if not bijna_gelijk]
+    assert len(duidelijk) == len(referentie) - 1
+    assert {sleutel: gebatcht[sleutel] for sleutel in duidelijk} == {sleutel: referentie[sleutel][0] for sleutel in duidelijk}
+
+def test_gelijke_stand_kiest_eerste_werkproces():
+    uitspraak = GELIJKE_STAND["vakkennis_dict"]["B1-K23"][0]
+    teksten = [re.sub(r'[^\w\s]', '', tekst.lower()) for tekst in [uitspraak, *GELIJKE_STAND["werkprocessen_beschrijvingen"].values()]]
+    termen = CountVectorizer(stop_words=list(analyse.STOPWOORDEN)).fit_transform(teksten)
+    scores = analyse.batch_similarities(termen[:1], termen[1:])[0]
+    assert abs(scores[0] - scores[1]) <= 1e-12
+    kruistabel = analyse.bouw_kruistabel(**GELIJKE_STAND)[0]
+    assert next(detail for detail in kruistabel.koppeling_details if detail[0] == uitspraak)[2] == "B1-K23-W1"
+
+def test_fallback_cellen_voor_uitspraak_in_meerdere_kerntaken():
+    gedeeld = "werkt samen met xyzzy"
+    kruistabel = analyse.bouw_kruistabel(
+        vakkennis_dict={"B1-K1": [gedeeld], "B1-K2": [gedeeld]},
+        werkprocessen_dict={"B1-K1": ["B1-K1-W1"], "B1-K2": ["B1-K2-W1"]},
+        werkprocessen_beschrijvingen={"B1-K1-W1": "Plant de werkzaamheden", "B1-K2-W1": "Controleert het eindresultaat"},
+    )[0]
+    via_fallback = {(uitspraak, wp) for uitspraak, _, wp, _, fallback, _ in kruistabel.koppeling_details if fallback}
+    assert via_fallback == {(gedeeld, "B1-K1-W1"), (gedeeld, "B1-K2-W1")}
+    masker = kruistabel.fallback_masker
+    assert {(kruistabel.uitspraken[rij], wp) for wp in masker.columns for rij in masker.index[masker[wp]]} == via_fallback
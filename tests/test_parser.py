@@ -0,0 +1,177 @@
+import random
+import re
+from io import BytesIO
+
+import pdfplumber
+import pytest
+
+import analyse
+import benchmark
+
+KERNTAAK_PATTERN = re.compile(r"(B\d+-K\d+|P\d+-K\d+):")
+WERKPROCES_PATTERN = re.compile(r"(B\d+-K\d+-W\d+|P\d+-K\d+-W\d+):")
+
+# Functie om het regeltype te bepalen zoals de oorspronkelijke lus dat deed: losse "indicator in regel"-toetsen in
+# de volgorde van de oorspronkelijke if-keten
+def naief_regel_type(line, heeft_kerntaak, in_werkproces_block, end_block_indicators, werkproces_end_indicators, aanvullend_indicator):
+    if "Basisdeel" in line:
+        return "sectie", "Basisdeel"
+    if "Profieldeel" in line:
+        return "sectie", "Profieldeel"
+    kerntaak_match = KERNTAAK_PATTERN.search(line)
+    if kerntaak_match:
+        return "kerntaak", kerntaak_match.group(1)
+    if "Vakkennis en vaardigheden" in line:
+        return "vakkennis_start", None
+    werkproces_match = WERKPROCES_PATTERN.search(line)
+    if werkproces_match and heeft_kerntaak:
+        return "werkproces", werkproces_match.group(1)
+    if aanvullend_indicator in line and heeft_kerntaak:
+        return "aanvullend", None
+    if any(indicator in line for indicator in end_block_indicators):
+        return "einde_blok", None
+    if in_werkproces_block and any(indicator in line for indicator in werkproces_end_indicators):
+        return "einde_werkproces", None
+    return "tekst", None
+
+# Indicatorlijsten waarvan de indicatoren elkaar overlappen (het einde van de ene is het begin van de andere) of
+# in elkaar voorkomen, zodat de classifier op elke positie moet zoeken
+OVERLAPPENDE_INDICATOREN = {
+    "end_block_indicators": ["abcd", "cdef", "Gedrag", "Gedragscode", "Resultaat"],
+    "werkproces_end_indicators": ["defg", "bc", "Omschrijving", "Vakkennis en vaardigheden"],
+    "aanvullend_indicator": "Let op: abc",
+}
+
+# Willekeurige regel uit stukken van indicatoren (heel of afgekapt), kerntaak- en werkprocescodes en losse woorden
+def willekeurige_regel(rng, indicatoren):
+    stukken = []
+    for _ in range(rng.randint(0, 6)):
+        keuze = rng.random()
+        if keuze < 0.35:
+            indicator = rng.choice(indicatoren)
+            begin = rng.randint(0, len(indicator) - 1) if rng.random() < 0.3 else 0
+            eind = rng.randint(begin + 1, len(indicator)) if rng.random() < 0.3 else len(indicator)
+            stukken.append(indicator[begin:eind])
+        elif keuze < 0.55:
+            code = f"{rng.choice('BPX')}{rng.randint(1, 12)}-K{rng.randint(1, 9)}"
+            if rng.random() < 0.5:
+                code += f"-W{rng.randint(1, 9)}"
+            stukken.append(code + rng.choice([":", ":", " ", ""]))
+        else:
+            stukken.append(rng.choice(["kent", "de", "metselaar", "ab", "cd", "e", "Ged", "rag", "B", "P1", "-K", ""]))
+    return rng.choice(["", " "]).join(stukken)
+
+@pytest.mark.parametrize("instellingen", [{}, OVERLAPPENDE_INDICATOREN], ids=["standaard", "overlappend"])
+def test_classifier_gelijk_aan_losse_toetsen(instellingen):
+    instellingen = {
+        "end_block_indicators": analyse.END_BLOCK_INDICATORS,
+        "werkproces_end_indicators": analyse.WERKPROCES_END_INDICATORS,
+        "aanvullend_indicator": analyse.AANVULLEND_INDICATOR,
+        **instellingen,
+    }
+    classifier = analyse.RegelClassifier(**instellingen)
+    indicatoren = instellingen["end_block_indicators"] + instellingen["werkproces_end_indicators"] + [
+        instellingen["aanvullend_indicator"], "Basisdeel", "Profieldeel", "Vakkennis en vaardigheden",
+    ]
+    rng = random.Random(0)
+    for _ in range(20000):
+        line = willekeurige_regel(rng, indicatoren)
+        heeft_kerntaak, in_werkproces_block = rng.random() < 0.8, rng.random() < 0.5
+        assert classifier.regel_type(line, heeft_kerntaak, in_werkproces_block) == naief_regel_type(
+            line, heeft_kerntaak, in_werkproces_block, **instellingen
+        ), line
+
+# Functie om een lijst regels te verwerken zoals de oorspronkelijke extract_vakkennis_en_werkprocessen dat deed
+# (zonder debug-log): met de volledige kerntaakgeschiedenis en de losse indicatortoetsen
+def oorspronkelijke_parse(lines):
+    vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen = {}, {}, {}
+    current_kerntaak = current_werkproces = current_section = None
+    in_vakkennis_block = in_werkproces_block = False
+    current_uitspraak = current_werkproces_beschrijving = ""
+    kerntaak_history = []
+
+    def bewaar_uitspraak():
+        if any(current_uitspraak.startswith(word + " ") for word in analyse.TARGET_WORDS):
+            cleaned_uitspraak = analyse.CLEANUP_PATTERN.sub("", current_uitspraak).strip()
+            if cleaned_uitspraak not in vakkennis_dict[current_kerntaak]:
+                vakkennis_dict[current_kerntaak].append(cleaned_uitspraak)
+
+    def bewaar_beschrijving():
+        if current_werkproces and current_werkproces_beschrijving:
+            werkprocessen_beschrijvingen[current_werkproces] = current_werkproces_beschrijving.strip() or current_werkproces
+
+    for line_idx, line in enumerate(lines):
+        line = line.strip()
+        regel_type, code = naief_regel_type(
+            line, bool(current_kerntaak), in_werkproces_block,
+            analyse.END_BLOCK_INDICATORS, analyse.WERKPROCES_END_INDICATORS, analyse.AANVULLEND_INDICATOR,
+        )
+        if regel_type == "sectie":
+            current_section = code
+        elif regel_type == "kerntaak":
+            if current_uitspraak and current_kerntaak and in_vakkennis_block:
+                bewaar_uitspraak()
+            bewaar_beschrijving()
+            current_uitspraak = current_werkproces_beschrijving = ""
+            current_werkproces = None
+            current_kerntaak = code
+            kerntaak_history.append((current_kerntaak, line_idx, current_section))
+            vakkennis_dict.setdefault(current_kerntaak, [])
+            werkprocessen_dict.setdefault(current_kerntaak, [])
+            in_vakkennis_block = in_werkproces_block = False
+        elif regel_type == "vakkennis_start":
+            relevant_kerntaak = next((kt for kt, idx, section in reversed(kerntaak_history) if idx < line_idx and section == current_section), None)
+            if relevant_kerntaak:
+                current_kerntaak = relevant_kerntaak
+                in_vakkennis_block, in_werkproces_block = True, False
+        elif regel_type == "werkproces":
+            bewaar_beschrijving()
+            current_werkproces_beschrijving = ""
+            current_werkproces = code
+            werkprocessen = werkprocessen_dict.setdefault(current_kerntaak, [])
+            if current_werkproces not in werkprocessen:
+                werkprocessen.append(current_werkproces)
+            in_werkproces_block, in_vakkennis_block = True, False
+            werkproces_title = line.replace(current_werkproces + ":", "").strip()
+            if werkproces_title:
+                current_werkproces_beschrijving += werkproces_title + " "
+        elif regel_type == "aanvullend":
+            pass
+        elif regel_type == "einde_blok":
+            if current_uitspraak and current_kerntaak and in_vakkennis_block:
+                bewaar_uitspraak()
+            current_uitspraak = ""
+            in_vakkennis_block = False
+        elif regel_type == "einde_werkproces":
+            bewaar_beschrijving()
+            current_werkproces_beschrijving = ""
+            in_werkproces_block = False
+        else:
+            if in_werkproces_block and current_werkproces and line and not line.isspace():
+                current_werkproces_beschrijving += " " + line
+            if in_vakkennis_block and current_kerntaak:
+                cleaned_line = line.lstrip("-§ ").strip()
+                if not cleaned_line:
+                    if current_uitspraak:
+                        bewaar_uitspraak()
+                        current_uitspraak = ""
+                elif any(cleaned_line.startswith(word + " ") for word in analyse.TARGET_WORDS):
+                    if current_uitspraak:
+                        bewaar_uitspraak()
+                    current_uitspraak = cleaned_line
+                elif current_uitspraak:
+                    current_uitspraak += " " + cleaned_line
+
+    if current_uitspraak and current_kerntaak and in_vakkennis_block:
+        bewaar_uitspraak()
+    bewaar_beschrijving()
+    return vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_parse_gelijk_aan_oorspronkelijke_lus(seed):
+    pdf_bytes = benchmark.schrijf_pdf(benchmark.genereer_dossier_paginas(12, seed=seed))
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        full_text = "".join(tekst + "\n" for tekst in (page.extract_text() for page in pdf.pages) if tekst)
+    verwacht = oorspronkelijke_parse(full_text.split("\n"))
+    assert sum(len(uitspraken) for uitspraken in verwacht[0].values()) > 0
+    assert analyse.extract_vakkennis_en_werkprocessen(BytesIO(pdf_bytes), workers=1)[:3] == verwacht
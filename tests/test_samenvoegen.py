@@ -0,0 +1,67 @@
+import random
+import re
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+import analyse
+from benchmark import VAKTERMEN
+
+# Synthetisch dossier met genoeg kerntaken om parallel te koppelen. Elke vijfde kerntaak deelt een werkproces met de
+# vorige (die twee delen de ronde-robin-teller), en elke kerntaak heeft uitspraken zonder enig gedeeld woord, die via
+# de ronde-robin-fallback gekoppeld worden; één daarvan staat in alle kerntaken.
+def synthetisch_dossier(aantal_kerntaken=20, seed=0):
+    rng = random.Random(seed)
+    vakkennis_dict, werkprocessen_dict, werkprocessen_beschrijvingen = {}, {}, {}
+    for nummer in range(1, aantal_kerntaken + 1):
+        kerntaak = f"B1-K{nummer}"
+        werkprocessen = [f"{kerntaak}-W{w}" for w in (1, 2, 3)]
+        if nummer % 5 == 0:
+            werkprocessen.append(f"B1-K{nummer - 1}-W1")
+        werkprocessen_dict[kerntaak] = werkprocessen
+        for wp in werkprocessen:
+            werkprocessen_beschrijvingen.setdefault(wp, "Verwerkt " + " ".join(rng.sample(VAKTERMEN, 8)))
+        vakkennis_dict[kerntaak] = (
+            [f"kent {' '.join(rng.sample(VAKTERMEN, 3))} {nummer}" for _ in range(4)]
+            + [f"kan xyzzy{nummer} plugh{letter}" for letter in "abc"]
+            + ["kan samenwerken met qwerty"]
+        )
+    return {"vakkennis_dict": vakkennis_dict, "werkprocessen_dict": werkprocessen_dict, "werkprocessen_beschrijvingen": werkprocessen_beschrijvingen}
+
+# Corpusmodel met een vaste vocabulaire en IDF, gefit op de teksten van het synthetische dossier
+def corpusmodel(dossier):
+    teksten = [uitspraak for uitspraken in dossier["vakkennis_dict"].values() for uitspraak in uitspraken]
+    teksten += list(dossier["werkprocessen_beschrijvingen"].values())
+    vectorizer = CountVectorizer()
+    termen = vectorizer.fit_transform([re.sub(r'[^\w\s]', '', tekst.lower()) for tekst in teksten])
+    idf = np.log((1 + termen.shape[0]) / (1 + np.bincount(termen.indices, minlength=termen.shape[1]))) + 1
+    return analyse.CorpusModel(list(vectorizer.get_feature_names_out()), idf, {"versie": "test"})
+
+def zonder_voorvoegsel(kolom):
+    return kolom.split("/", 1)[1]
+
+@pytest.mark.parametrize("met_model", [False, True])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_samengevoegd_gelijk_aan_bouw_kruistabel(monkeypatch, workers, met_model):
+    monkeypatch.setattr(analyse, "SAMENVOEGEN_PARALLEL_MIN", 1)
+    dossier = synthetisch_dossier()
+    model = corpusmodel(dossier) if met_model else None
+    enkel = analyse.bouw_kruistabel(**dossier, model=model)[0]
+    samengevoegd = analyse.bouw_samengevoegde_kruistabel([("dossier.pdf", dossier)], model=model, workers=workers)
+
+    assert enkel.fallback.nnz > 0
+    assert [zonder_voorvoegsel(kolom) for kolom in samengevoegd.kolommen] == enkel.kolommen
+    assert samengevoegd.uitspraken == enkel.uitspraken
+    assert (samengevoegd.matrix != enkel.matrix).nnz == 0
+    assert (samengevoegd.fallback != enkel.fallback).nnz == 0
+    details = [(uitspraak, zonder_voorvoegsel(kerntaak), zonder_voorvoegsel(wp), *rest) for uitspraak, kerntaak, wp, *rest in samengevoegd.koppeling_details]
+    assert sorted(details) == sorted(enkel.koppeling_details)
+
+def test_te_brede_tabel_niet_naar_excel():
+    kolommen = [f"K{idx}" for idx in range(analyse.EXCEL_MAX_KOLOMMEN)]
+    assert analyse.excel_te_breed(analyse.Kruistabel(["kent x"], kolommen[:-1], [(0, 0)])) is None
+    te_breed = analyse.Kruistabel(["kent x"], kolommen, [(0, 0)])
+    assert analyse.excel_te_breed(te_breed)
+    with pytest.raises(ValueError):
+        analyse.exporteer_kruistabel(te_breed, "xlsx")
@@ -0,0 +1,205 @@
+import importlib.util
+import io
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import analyse
+import app
+import benchmark
+
+APP_PAD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Streamlit voert app.py bij elke interactie opnieuw uit in een nieuwe module; simuleer zo'n rerun door het script
+# opnieuw te laden onder dezelfde modulenaam, zodat de namen uit een eerdere run naar andere objecten verwijzen
+def rerun_app(monkeypatch):
+    spec = importlib.util.spec_from_file_location("app", APP_PAD)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "app", module)
+    spec.loader.exec_module(module)
+    return module
+
+def test_taak_na_rerun(monkeypatch, tmp_path):
+    eerste_run = rerun_app(monkeypatch)
+    cache = eerste_run.ResultaatCache(cache_dir=str(tmp_path))
+    planner = eerste_run.TaakPlanner(max_gelijktijdig=1, cache=cache)
+    rerun_app(monkeypatch)
+    try:
+        taak = planner.dien_in("dossier", benchmark.schrijf_pdf(benchmark.genereer_dossier_paginas(10)), "dossier.pdf", geheugen=True)
+        assert taak.gereed.wait(120)
+        assert taak.status == "klaar", taak.fout
+        assert not taak.resultaat["kruistabel"].leeg
+        assert all(stap["piek_geheugen_mb"] is not None for stap in taak.stappen)  # Gemeten in de worker
+        assert os.listdir(tmp_path)  # Het resultaat is ook op schijf bewaard
+    finally:
+        planner._sluit_pool(planner._executor, planner._wachtrij)
+
+# Naast de threads van de Streamlit-server mag er niet geforkt worden: de workers starten dan via een forkserver
+def test_procespool_naast_andere_threads():
+    stoppen = threading.Event()
+    thread = threading.Thread(target=stoppen.wait)
+    thread.start()
+    try:
+        assert analyse.procespool_context().get_start_method() == "forkserver"
+        pdf = benchmark.schrijf_pdf(benchmark.genereer_dossier_paginas(8))
+        assert list(analyse.iter_page_texts(io.BytesIO(pdf), workers=2, min_paginas=1)) == list(analyse.iter_page_texts(io.BytesIO(pdf), workers=1))
+    finally:
+        stoppen.set()
+        thread.join()
+
+# Procespool die niets uitvoert: de test rondt de futures zelf af, bijv. met BrokenProcessPool voor een workercrash
+class StubPool:
+    def __init__(self):
+        self.futures = {}  # Per taaksleutel
+        self.argumenten = {}
+        self.gesloten = False
+
+    def submit(self, functie, sleutel, *args):
+        self.argumenten[sleutel] = args
+        self.futures[sleutel] = Future()
+        return self.futures[sleutel]
+
+    def shutdown(self, wait=True):
+        self.gesloten = True
+
+def stub_planner(max_gelijktijdig=1, max_wachtrij=8):
+    planner = app.TaakPlanner(max_gelijktijdig=max_gelijktijdig, max_wachtrij=max_wachtrij)
+    planner.pools = []
+
+    def nieuwe_pool(workers):
+        planner.pools.append(StubPool())
+        return planner.pools[-1], queue.Queue()
+
+    planner._nieuwe_pool = nieuwe_pool
+    return planner
+
+# Laat een taak starten zoals een worker dat meldt via de voortgangswachtrij van zijn pool
+def start(planner, taak):
+    taak.wachtrij.put((taak.sleutel, 0, 10))
+    taak.wachtrij.put(None)
+    planner._verwerk_voortgang(taak.wachtrij)
+
+def klaar(taak):
+    taak.pool.futures[taak.sleutel].set_result(({"vakkennis_dict": {}}, [], []))
+
+# Laat de futures van de taken in deze volgorde mislukken, zoals bij een kapotte pool
+def crash(*taken):
+    for future in [taak.pool.futures[taak.sleutel] for taak in taken]:
+        future.set_exception(BrokenProcessPool())
+
+def test_identieke_upload_wordt_samengevoegd():
+    planner = stub_planner()
+    taak = planner.dien_in("a", b"", "a.pdf")
+    assert planner.dien_in("a", b"", "a.pdf") is taak
+    assert taak.aanvragers == 2
+    assert len(planner.pools[0].futures) == 1
+
+    # Het resultaat blijft bij de taak tot beide sessies het opgehaald hebben
+    klaar(taak)
+    assert planner.haal_resultaat(taak) == {"vakkennis_dict": {}}
+    assert planner.haal_resultaat(taak) == {"vakkennis_dict": {}}
+    assert taak.resultaat is None
+
+def test_resultaat_losgelaten_als_geen_sessie_meer_wacht():
+    planner = stub_planner()
+    taak = planner.dien_in("a", b"", "a.pdf")
+    assert planner.haal_resultaat(taak) is None  # De sessie is weggeklikt voordat de taak klaar was
+    klaar(taak)
+    assert taak.status == "klaar" and taak.resultaat is None
+
+def test_volle_wachtrij():
+    planner = stub_planner(max_gelijktijdig=1, max_wachtrij=1)
+    planner.dien_in("a", b"", "a.pdf")
+    planner.dien_in("b", b"", "b.pdf")
+    with pytest.raises(app.WachtrijVol):
+        planner.dien_in("c", b"", "c.pdf")
+
+def test_positie_in_wachtrij():
+    planner = stub_planner()
+    a, b, c = (planner.dien_in(sleutel, b"", sleutel) for sleutel in "abc")
+    start(planner, a)
+    assert [planner.positie(taak) for taak in (a, b, c)] == [0, 1, 2]
+    klaar(a)
+    assert a.status == "klaar"
+    assert [planner.positie(taak) for taak in (b, c)] == [1, 2]
+
+def test_positie_terwijl_andere_sessies_taken_toevoegen(monkeypatch):
+    monkeypatch.setattr(app, "TAKEN_BEWAREN", 4)
+    planner = stub_planner(max_wachtrij=10000)
+    wachtend = planner.dien_in("wachtend", b"", "wachtend.pdf")
+    fouten = []
+    stoppen = threading.Event()
+
+    def sessie():
+        while not stoppen.is_set():
+            try:
+                planner.positie(wachtend)
+            except RuntimeError as e:
+                fouten.append(e)
+
+    thread = threading.Thread(target=sessie)
+    thread.start()
+    try:
+        for nummer in range(3000):
+            klaar(planner.dien_in(nummer, b"", f"{nummer}.pdf"))
+    finally:
+        stoppen.set()
+        thread.join()
+    assert not fouten
+
+def test_workers_uit_vrije_plekken(monkeypatch):
+    monkeypatch.setattr(app.os, "cpu_count", lambda: 8)
+    planner = stub_planner(max_gelijktijdig=4)
+    a, b = planner.dien_in("a", b"", "a.pdf"), planner.dien_in("b", b"", "b.pdf")
+    # Op een rustige server krijgt één upload alle kernen; de volgende alleen die van de plekken die nog vrij zijn
+    assert [planner.pools[0].argumenten[taak.sleutel][1] for taak in (a, b)] == [8, 6]
+    klaar(a)
+    klaar(b)
+    c = planner.dien_in("c", b"", "c.pdf")
+    assert planner.pools[0].argumenten[c.sleutel][1] == 8
+
+@pytest.mark.parametrize("volgorde", [0, 1])
+def test_crash_van_enige_lopende_taak(volgorde):
+    planner = stub_planner()
+    lopend, wachtend = planner.dien_in("lopend", b"", "lopend.pdf"), planner.dien_in("wachtend", b"", "wachtend.pdf")
+    start(planner, lopend)
+    crash(*[(lopend, wachtend), (wachtend, lopend)][volgorde])
+    assert lopend.status == "mislukt"
+    assert planner.pools[0].gesloten
+    # De wachtende taak was niet de oorzaak en draait opnieuw in een nieuwe gedeelde pool
+    assert wachtend.status == "wachtend" and wachtend.herkansingen == 1
+    assert wachtend.pool is planner.pools[1]
+    klaar(wachtend)
+    assert wachtend.status == "klaar"
+
+def test_crash_met_meerdere_lopende_taken():
+    planner = stub_planner(max_gelijktijdig=2)
+    a, b, c = (planner.dien_in(sleutel, b"", sleutel) for sleutel in "abc")
+    start(planner, a)
+    start(planner, b)
+    crash(a, b, c)
+    # Niet te herleiden welke van a en b de crash veroorzaakte: ze draaien één voor één in een eigen pool
+    assert a.verdacht and b.verdacht and not c.verdacht
+    assert a.pool is not c.pool and b.pool is planner.pools[0]
+    klaar(c)
+    crash(a)  # a crasht ook in zijn eigen pool en is dus de oorzaak
+    assert a.status == "mislukt" and a.pool.gesloten
+    assert b.status == "wachtend" and b.pool not in (planner.pools[0], a.pool, c.pool)
+    klaar(b)
+    assert (b.status, c.status) == ("klaar", "klaar")
+    assert b.pool.gesloten
+
+def test_maximaal_aantal_herkansingen():
+    planner = stub_planner()
+    taak = planner.dien_in("a", b"", "a.pdf")
+    for _ in range(app.MAX_HERKANSINGEN):
+        crash(taak)
+        assert taak.status == "wachtend"
+    crash(taak)
+    assert taak.status == "mislukt" and taak.herkansingen == app.MAX_HERKANSINGEN
+    assert taak.gereed.is_set()
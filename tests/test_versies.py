@@ -0,0 +1,81 @@
+import copy
+
+import pytest
+
+import analyse
+from test_samenvoegen import synthetisch_dossier
+
+# Slaat een versie van het dossier op in de index, zoals de app dat na een analyse doet
+def sla_op(index, inhoud_sleutel, dossier):
+    kruistabel = analyse.bouw_kruistabel(**dossier)[0]
+    index.voeg_toe(inhoud_sleutel, "dossier.pdf", {
+        **dossier,
+        "kruistabel": kruistabel,
+        "aantal_paginas": 12,
+        "vingerafdrukken": analyse.blok_vingerafdrukken(**dossier),
+    })
+
+# Dossier met één gewijzigd kerntaakblok: B1-K2 krijgt er een uitspraak bij
+def gewijzigd(dossier):
+    nieuw = copy.deepcopy(dossier)
+    nieuw["vakkennis_dict"]["B1-K2"].append("kent een nieuwe xyzzy-norm")
+    return nieuw
+
+def test_hergebruik_gelijk_aan_volledige_analyse(tmp_path):
+    index = analyse.UitspraakIndex(pad=str(tmp_path / "index.db"))
+    eerste = synthetisch_dossier(aantal_kerntaken=6)
+    sla_op(index, "v1", eerste)
+    assert index.vorige_versie("dossier.pdf", "v2", dossiers=index.dossiers()) == index.vorige_versie("dossier.pdf", "v2")
+    assert index.vorige_versie("dossier.pdf", "v1") is None
+    vorige = index.vorige_koppelingen(index.vorige_versie("dossier.pdf", "v2")["id"])
+    tweede = gewijzigd(eerste)
+
+    volledig, _, volledig_fallback = analyse.bouw_kruistabel(**tweede)
+    hergebruikt, koppelingen_log, hergebruikt_fallback = analyse.bouw_kruistabel(**tweede, vorige=vorige)
+
+    # B1-K4 en B1-K5 delen een werkproces en B1-K2 is gewijzigd; de rest komt uit de vorige versie, inclusief ronde-robin
+    herbruikbaar = analyse.herbruikbare_blokken(tweede["vakkennis_dict"], tweede["werkprocessen_dict"], analyse.blok_vingerafdrukken(**tweede), vorige)
+    assert sorted(herbruikbaar) == ["B1-K1", "B1-K3", "B1-K6"]
+    assert sum("hergebruikt uit de vorige versie" in regel for regel in koppelingen_log) == len(herbruikbaar)
+    assert any(detail[4] for kerntaak in herbruikbaar for detail in herbruikbaar[kerntaak])
+
+    assert hergebruikt.koppeling_details == volledig.koppeling_details
+    assert (hergebruikt.uitspraken, hergebruikt.kolommen) == (volledig.uitspraken, volledig.kolommen)
+    assert (hergebruikt.matrix != volledig.matrix).nnz == 0
+    assert (hergebruikt.fallback != volledig.fallback).nnz == 0
+    assert hergebruikt_fallback == volledig_fallback
+
+def test_corpusmodel_verouderd_na_nieuw_dossier(tmp_path):
+    index = analyse.UitspraakIndex(pad=str(tmp_path / "index.db"))
+    sla_op(index, "v1", synthetisch_dossier(aantal_kerntaken=3))
+    model = analyse.CorpusModel.train(index, pad=str(tmp_path / "model"))
+    assert analyse.corpusmodel_verouderd(model, index) is None
+    sla_op(index, "v2", gewijzigd(synthetisch_dossier(aantal_kerntaken=3)))
+    assert model.versie in analyse.corpusmodel_verouderd(model, index)
+
+# Zoeken met FTS5 en met de LIKE-terugval (SQLite zonder FTS5) moet dezelfde treffers geven
+@pytest.mark.parametrize("fts", [True, False], ids=["fts5", "like"])
+def test_zoeken_per_modus(tmp_path, fts):
+    index = analyse.UitspraakIndex(pad=str(tmp_path / "index.db"))
+    sla_op(index, "v1", synthetisch_dossier(aantal_kerntaken=3))
+    index.fts = fts and index.fts
+
+    # Woorden: alle woorden, in willekeurige volgorde
+    treffers = index.zoek("PLUGHA xyzzy2", modus="woorden")
+    assert list(treffers.columns) == analyse.ZOEK_KOLOMMEN
+    assert treffers[["Dossier", "Kerntaak", "Uitspraak"]].values.tolist() == [["dossier.pdf", "B1-K2", "kan xyzzy2 plugha"]]
+    assert treffers["Werkproces"].iloc[0].startswith("B1-K2-W")
+
+    # Zin: de woorden in deze volgorde
+    assert index.zoek("plugha xyzzy2", modus="zin").empty
+    assert index.zoek("xyzzy2 plugha", modus="zin")["Uitspraak"].tolist() == ["kan xyzzy2 plugha"]
+
+    # Vergelijkbaar: minstens één gedeeld woord, beste overeenkomst eerst
+    treffers = index.zoek("xyzzy2 plugha", modus="vergelijkbaar")
+    assert sorted(treffers["Uitspraak"]) == sorted(
+        [f"kan xyzzy2 plugh{letter}" for letter in "abc"] + [f"kan xyzzy{nummer} plugha" for nummer in (1, 3)]
+    )
+    assert treffers["Uitspraak"].iloc[0] == "kan xyzzy2 plugha"
+    assert (treffers["Score"] > 0).all() and treffers["Score"].is_monotonic_decreasing
+    assert index.zoek("zzzonbekend", modus="vergelijkbaar").empty
+    assert index.zoek("!?", modus="woorden").empty